@@ -1,7 +1,272 @@
-import yaml
+import argparse
+
+
+# Every command imports what it needs, so short-lived invocations only pay for their own imports
+
+def get(args: argparse.Namespace) -> None:
+    """Print one record as JSON"""
+    import json
+    import sys
+
+    from src.local_git.db import TakocLocalDb
+
+    db = TakocLocalDb(db_root=args.db_root, read_only=True)
+    namespace = db.load_namespace(args.namespace)
+    if namespace is None:
+        sys.exit(f"Namespace '{args.namespace}' not found")
+    try:
+        record = namespace.load_table(args.table).get_record(args.record_id)
+    except ValueError as e:
+        sys.exit(str(e))
+    json.dump(record, sys.stdout, indent=2, ensure_ascii=False, default=str)
+    sys.stdout.write("\n")
+
+
+def verify(args: argparse.Namespace) -> None:
+    """Fully validate the metadata and record indexes"""
+    import sys
+
+    from src.local_git.db import TakocLocalDb
+
+    problems = TakocLocalDb(db_root=args.db_root, read_only=True).verify(checksums=args.checksums)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if problems:
+        sys.exit(f"{len(problems)} invalid files")
+    print("OK")
+
+
+def manifest(args: argparse.Namespace) -> None:
+    """Build the content manifest of tables"""
+    import sys
+
+    from src.local_git.db import TakocLocalDb
+
+    db = TakocLocalDb(db_root=args.db_root)
+    namespaces = [args.namespace] if args.namespace else [ns.name for ns in db.metadata.get_namespaces()]
+    for name in namespaces:
+        namespace = db.load_namespace(name)
+        if namespace is None:
+            sys.exit(f"Namespace '{name}' not found")
+        tables = [args.table] if args.table else [table.name for table in db.metadata.get_tables(name)]
+        for table in tables:
+            try:
+                namespace.load_table(table).build_manifest()
+            except ValueError as e:
+                sys.exit(str(e))
+            print(f"{name}/{table}")
+
+
+def fsck(args: argparse.Namespace) -> None:
+    """Check the record indexes against the record files"""
+    import sys
+
+    from src.local_git.db import TakocLocalDb
+    from src.local_git.fsck import fsck as check
+
+    db = TakocLocalDb(db_root=args.db_root, read_only=not args.repair)
+    report = check(db, workers=args.workers, parse_records=args.parse_records, repair=args.repair,
+                   namespaces=args.namespace or None)
+    if args.json:
+        print(report.model_dump_json(indent=2))
+    for table in report.tables:
+        if table.clean:
+            continue
+        print(f"{table.namespace}/{table.table}: {table.records} records, {table.files} files"
+              f"{' (repaired)' if table.repaired else ''}", file=sys.stderr)
+        for file_name in table.orphan_files:
+            print(f"  orphan file: {file_name}", file=sys.stderr)
+        for record_id in table.missing_files:
+            print(f"  missing file: {record_id}", file=sys.stderr)
+        for record_id, file_names in table.duplicate_ids.items():
+            print(f"  duplicate id: {record_id} -> {', '.join(file_names)}", file=sys.stderr)
+        for file_name in table.ambiguous_files:
+            print(f"  ambiguous file: {file_name}", file=sys.stderr)
+        for error in table.unreadable_files:
+            print(f"  unreadable: {error}", file=sys.stderr)
+    if not report.clean:
+        sys.exit(f"{sum(not table.clean for table in report.tables)} of {len(report.tables)} tables inconsistent")
+    print(f"OK: {len(report.tables)} tables", file=sys.stderr)
+
+
+def export(args: argparse.Namespace) -> None:
+    """Export the records of a table or namespace as JSON Lines"""
+    import sys
+
+    from src.api.export import export_lines, chunked
+    from src.local_git.db import TakocLocalDb
+
+    db = TakocLocalDb(db_root=args.db_root, read_only=True)
+    namespace = db.load_namespace(args.namespace)
+    if namespace is None:
+        sys.exit(f"Namespace '{args.namespace}' not found")
+    if args.table is not None and namespace.get_table(args.table) is None:
+        sys.exit(f"Table '{args.table}' not found in namespace '{args.namespace}'")
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunked(export_lines(namespace, args.table), gzip=args.gzip):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+def import_(args: argparse.Namespace) -> None:
+    """Create the records of a table from a JSON Lines or CSV file"""
+    import sys
+    from functools import partial
+
+    from src.api.bulk_import import gunzip
+    from src.local_git.db import TakocLocalDb
+
+    name = args.file.removesuffix(".gz")
+    format = args.format or ("csv" if name.endswith(".csv") else "ndjson")
+    db = TakocLocalDb(db_root=args.db_root)
+    namespace = db.load_namespace(args.namespace)
+    if namespace is None:
+        sys.exit(f"Namespace '{args.namespace}' not found")
+    if namespace.get_table(args.table) is None:
+        sys.exit(f"Table '{args.table}' not found in namespace '{args.namespace}'")
+    with open(args.file, "rb") if args.file != "-" else sys.stdin.buffer as f:
+        chunks = iter(partial(f.read, 1024 * 1024), b"")
+        if args.file.endswith(".gz"):
+            chunks = gunzip(chunks)
+        try:
+            result = namespace.load_table(args.table).import_records(
+                chunks, format=format, id_field=args.id_field, skip_existing=args.skip_existing,
+                validate=args.validate, workers=args.workers, batch_size=args.batch_size, checkpoint=args.checkpoint)
+        except ValueError as e:
+            sys.exit(str(e))
+    for error in result.errors:
+        print(f"  {error}", file=sys.stderr)
+    print(f"{result.imported} imported, {result.skipped} skipped, {result.failed} failed", file=sys.stderr)
+    if result.failed:
+        sys.exit(1)
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Serve the v1 API on a local git database"""
+    import logging
+    from pathlib import Path
+
+    import uvicorn
+
+    from src.api.metrics import METRICS
+    from src.api.tracing import TRACER
+    from src.api.v1_app import app, get_database
+    from src.local_git.committer import GitCommitter
+    from src.local_git.db import TakocLocalDb
+    from src.local_git.watcher import ChangeWatcher
+
+    committer = None
+    if args.auto_commit:
+        committer = GitCommitter(Path(args.db_root), max_ops=args.commit_max_ops, max_delay=args.commit_max_delay)
+    db = TakocLocalDb(db_root=args.db_root, read_only=args.read_only, committer=committer,
+                      cache_dir=args.cache_dir, record_cache_size=args.record_cache_size, checksums=args.checksums)
+    app.dependency_overrides[get_database] = lambda: db
+    METRICS.enabled = args.metrics
+    TRACER.configure(args.traces, args.trace_sample_rate)
+    logging.basicConfig(level=logging.INFO)
+    if args.warm_up:
+        db.warm_up(workers=args.warm_up_workers, preload_records=args.preload_records)
+    watcher = ChangeWatcher(db, interval=args.watch_interval) if args.watch_interval > 0 else None
+    if watcher is not None:
+        watcher.start()
+    try:
+        uvicorn.run(app, host=args.host, port=args.port)
+    finally:
+        if watcher is not None:
+            watcher.close()
+        db.close()
+
 
 def main():
-    print("Hello from takoc-model!")
+    parser = argparse.ArgumentParser(prog="takoc", description="Takoc local git database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Serve the v1 API")
+    serve_parser.add_argument("--db-root", default=".", help="Database root directory")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--read-only", action="store_true")
+    serve_parser.add_argument("--cache-dir", help="Directory of the warm-start snapshot")
+    serve_parser.add_argument("--record-cache-size", type=int, default=0,
+                              help="Number of parsed records to cache, 0 to disable")
+    serve_parser.add_argument("--warm-up", action="store_true",
+                              help="Load every table before reporting ready on /ready")
+    serve_parser.add_argument("--warm-up-workers", type=int, default=8)
+    serve_parser.add_argument("--preload-records", type=int, default=0,
+                              help="Most recently modified records per table to preload into the record cache")
+    serve_parser.add_argument("--metrics", action="store_true", help="Record metrics exposed on /metrics")
+    serve_parser.add_argument("--traces", type=int, default=0,
+                              help="Keep the span trees of the last N traced requests on /admin/traces, 0 to disable")
+    serve_parser.add_argument("--trace-sample-rate", type=float, default=0.0,
+                              help="Fraction of requests traced without the X-Takoc-Trace header")
+    serve_parser.add_argument("--checksums", action="store_true",
+                              help="Create tables with a manifest of the content hashes of their records")
+    serve_parser.add_argument("--watch-interval", type=float, default=2.0,
+                              help="Seconds between polls of the files for external edits on /changes, 0 to disable")
+    serve_parser.add_argument("--auto-commit", action="store_true", help="Commit every mutation to git")
+    serve_parser.add_argument("--commit-max-ops", type=int, default=100)
+    serve_parser.add_argument("--commit-max-delay", type=float, default=5.0)
+    serve_parser.set_defaults(func=serve)
+
+    get_parser = commands.add_parser("get", help="Print one record as JSON")
+    get_parser.add_argument("--db-root", default=".", help="Database root directory")
+    get_parser.add_argument("namespace")
+    get_parser.add_argument("table")
+    get_parser.add_argument("record_id")
+    get_parser.set_defaults(func=get)
+
+    verify_parser = commands.add_parser("verify", help="Fully validate the metadata and record indexes")
+    verify_parser.add_argument("--db-root", default=".", help="Database root directory")
+    verify_parser.add_argument("--checksums", action="store_true",
+                               help="Also compare the record files with the manifest of their table")
+    verify_parser.set_defaults(func=verify)
+
+    manifest_parser = commands.add_parser("manifest", help="Build the content manifest of tables")
+    manifest_parser.add_argument("--db-root", default=".", help="Database root directory")
+    manifest_parser.add_argument("--namespace", help="Only this namespace")
+    manifest_parser.add_argument("--table", help="Only this table, requires --namespace")
+    manifest_parser.set_defaults(func=manifest)
+
+    fsck_parser = commands.add_parser("fsck", help="Check the record indexes against the record files")
+    fsck_parser.add_argument("--db-root", default=".", help="Database root directory")
+    fsck_parser.add_argument("--namespace", action="append", help="Only this namespace, can be repeated")
+    fsck_parser.add_argument("--workers", type=int, help="Worker processes, default one per CPU, 0 for none")
+    fsck_parser.add_argument("--parse-records", action="store_true", help="Also parse every record file")
+    fsck_parser.add_argument("--repair", action="store_true",
+                             help="Rebuild inconsistent record indexes, stop the server first")
+    fsck_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    fsck_parser.set_defaults(func=fsck)
+
+    export_parser = commands.add_parser("export", help="Export records as JSON Lines")
+    export_parser.add_argument("--db-root", default=".", help="Database root directory")
+    export_parser.add_argument("--gzip", action="store_true", help="Compress the output")
+    export_parser.add_argument("--output", help="Output file, default standard output")
+    export_parser.add_argument("namespace")
+    export_parser.add_argument("table", nargs="?", help="Table to export, every table of the namespace by default")
+    export_parser.set_defaults(func=export)
+
+    import_parser = commands.add_parser("import", help="Import records from JSON Lines or CSV")
+    import_parser.add_argument("--db-root", default=".", help="Database root directory")
+    import_parser.add_argument("--format", choices=["ndjson", "csv"],
+                               help="Input format, default from the file extension")
+    import_parser.add_argument("--id-field", default="id", help="Member or column holding the record ID")
+    import_parser.add_argument("--skip-existing", action="store_true",
+                               help="Skip existing records, to resume an interrupted import")
+    import_parser.add_argument("--validate", action="store_true", help="Validate records against the table schema")
+    import_parser.add_argument("--workers", type=int, help="Worker processes, default one per CPU, 0 for none")
+    import_parser.add_argument("--batch-size", type=int, default=1000, help="Rows per worker task")
+    import_parser.add_argument("--checkpoint", type=int,
+                               help="Write the record index every this many records, default only at the end")
+    import_parser.add_argument("namespace")
+    import_parser.add_argument("table")
+    import_parser.add_argument("file", help="Input file, gzip compressed if it ends with .gz, - for standard input")
+    import_parser.set_defaults(func=import_)
+
+    args = parser.parse_args()
+    args.func(args)
 
 
 if __name__ == "__main__":
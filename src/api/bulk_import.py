@@ -0,0 +1,85 @@
+"""
+Parsing of bulk imports: JSON Lines or CSV bodies, read as a stream of byte chunks.
+
+A JSON line is either an exported record, `{"table": "...", "id": "...", "data": ...}`, or the record itself with its
+ID in the `id_field` member. A CSV row is the record itself, with one string member per column.
+"""
+import codecs
+import csv
+import json
+import zlib
+from typing import Any, Iterable, Iterator, Literal
+
+IMPORT_FORMAT = Literal["ndjson", "csv"]
+# Error messages kept in an import response, the others are only counted
+MAX_ERRORS = 100
+
+
+def gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Decompress a gzip stream chunk by chunk"""
+    decompressor = zlib.decompressobj(wbits=31)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Split a stream into lines, each ending with a newline except maybe the last one"""
+    rest = b""
+    for chunk in chunks:
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if rest:
+        yield rest
+
+
+def iter_rows(chunks: Iterable[bytes], format: IMPORT_FORMAT) -> Iterator[tuple[int, Any]]:
+    """Split a stream into rows still to be parsed by `parse_row`
+
+    JSON lines are left as bytes, so they can be parsed in worker processes. CSV rows are split by the csv module,
+    since quoted values may span several lines.
+
+    Returns:
+        Iterator of (line number, row), blank lines are skipped
+    """
+    lines = iter_lines(chunks)
+    if format == "ndjson":
+        for line_no, line in enumerate(lines, start=1):
+            if line.strip():
+                yield line_no, line
+    elif format == "csv":
+        reader = csv.DictReader(codecs.iterdecode(lines, "utf-8"))
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        raise ValueError(f"Unsupported import format: {format}")
+
+
+def parse_row(row: Any, format: IMPORT_FORMAT, id_field: str = "id") -> tuple[str, Any]:
+    """Get the ID and data of a row from `iter_rows`
+
+    Raises:
+        ValueError: Invalid row or missing ID
+    """
+    if format == "ndjson":
+        data = json.loads(row)
+        if isinstance(data, dict) and "id" in data and "data" in data and set(data) <= {"table", "id", "data"}:
+            record_id, data = data["id"], data["data"]
+        elif isinstance(data, dict) and data.get(id_field) is not None:
+            record_id = data[id_field]
+        else:
+            raise ValueError(f"Missing record ID '{id_field}'")
+    else:
+        data = row
+        record_id = row.get(id_field)
+        if None in data:
+            raise ValueError("More values than columns")
+    if record_id is None or str(record_id) == "":
+        raise ValueError(f"Missing record ID '{id_field}'")
+    return str(record_id), data
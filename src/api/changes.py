@@ -0,0 +1,133 @@
+"""
+In-process bus of change events, fed by the mutations of the store and by the file watcher for external edits.
+
+Every subscriber has a bounded queue. Publishing never blocks: a subscriber whose queue is full is dropped, and its
+consumer is told so it can reconnect and resynchronize, so one slow consumer never slows down writes or other
+consumers.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Literal
+
+from pydantic import BaseModel, Field
+
+from .metrics import METRICS
+
+CHANGE_OP = Literal["create", "update", "delete"]
+CHANGE_SOURCE = Literal["store", "external"]
+# Events queued per subscriber before it is dropped
+DEFAULT_QUEUE_SIZE = 1000
+
+
+class ChangeEventData(BaseModel):
+    seq: int = Field(..., description="Sequence number of the event in this server process")
+    op: CHANGE_OP = Field(..., description="Mutation type")
+    namespace: str = Field(..., description="Namespace name")
+    table: str | None = Field(default=None, description="Table name, None for namespace changes")
+    record_id: str | None = Field(default=None, description="Record ID, None for namespace and table changes")
+    source: CHANGE_SOURCE = Field(default="store", description="'external' for edits of the files outside takoc")
+    timestamp: float = Field(..., description="Time of the event in seconds since the epoch")
+
+
+class Subscription:
+    """Change events of a namespace or table, queued for one consumer"""
+
+    def __init__(self, bus: "ChangeBus", namespace: str, table: str | None, max_queue: int,
+                 notify: Callable[[], None] | None):
+        self._bus = bus
+        self.namespace = namespace
+        self.table = table
+        self._max_queue = max_queue
+        self._notify = notify
+        self._events: deque[ChangeEventData] = deque()
+        self._lock = threading.Lock()
+        self.dropped = False
+
+    def matches(self, event: ChangeEventData) -> bool:
+        """Whether the event is in the subscribed namespace or table"""
+        return event.namespace == self.namespace and (self.table is None or event.table == self.table)
+
+    def offer(self, event: ChangeEventData) -> None:
+        """Queue an event, dropping the subscription if its queue is full"""
+        with self._lock:
+            if self.dropped:
+                return
+            if len(self._events) >= self._max_queue:
+                self.dropped = True
+                self._events.clear()
+            else:
+                self._events.append(event)
+        if self.dropped:
+            self._bus.unsubscribe(self)
+            if METRICS.enabled:
+                METRICS.inc("takoc_change_subscribers_dropped_total")
+        if self._notify is not None:
+            self._notify()
+
+    def drain(self) -> list[ChangeEventData]:
+        """Take the queued events"""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def close(self) -> None:
+        """Stop receiving events"""
+        self._bus.unsubscribe(self)
+
+
+class ChangeBus:
+    """Publish change events to the subscriptions matching them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: list[Subscription] = []
+        self._seq = itertools.count(1)
+        self._store_changes: dict[tuple[str, str | None], int] = {}
+
+    def subscribe(self, namespace: str, table: str | None = None, max_queue: int = DEFAULT_QUEUE_SIZE,
+                  notify: Callable[[], None] | None = None) -> Subscription:
+        """Subscribe to the changes of a namespace, including its tables and records, or of a table
+
+        Args:
+            namespace: Namespace name
+            table: Table name, every table of the namespace if None
+            max_queue: Events queued before the subscription is dropped
+            notify: Called after an event is queued or the subscription dropped, from the publishing thread
+        """
+        subscription = Subscription(self, namespace, table, max_queue, notify)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def store_changes(self) -> dict[tuple[str, str | None], int]:
+        """Count of store changes by (namespace, table), for the watcher to skip the files changed by the store"""
+        with self._lock:
+            return dict(self._store_changes)
+
+    def publish(self, op: CHANGE_OP, namespace: str, table: str | None = None, record_id: str | None = None,
+                source: CHANGE_SOURCE = "store") -> None:
+        """Publish a change to the matching subscriptions, never blocks"""
+        with self._lock:
+            if source == "store":
+                key = (namespace, table)
+                self._store_changes[key] = self._store_changes.get(key, 0) + 1
+            subscriptions = self._subscriptions
+            if not subscriptions:
+                return
+            seq = next(self._seq)
+        event = ChangeEventData(seq=seq, op=op, namespace=namespace, table=table, record_id=record_id, source=source,
+                                timestamp=time.time())
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.offer(event)
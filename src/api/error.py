@@ -1,3 +1,8 @@
 class ReadOnlyError(Exception):
     """Base exception for Takoc errors"""
     pass
+
+
+class TokenExpiredError(ValueError):
+    """The change token is older than the change log, the consumer must re-sync fully"""
+    pass
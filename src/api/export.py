@@ -0,0 +1,72 @@
+"""
+Streaming export of records as JSON Lines.
+
+Every line is one record: `{"table": "...", "id": "...", "data": ...}`. Records are read through
+`ITable.iter_records`, so memory stays constant whatever the size of the table or namespace.
+"""
+import json
+import zlib
+from typing import Iterable, Iterator
+
+from .fields import parse_fields, project
+from .v1 import INamespace
+
+# Bytes buffered before a chunk is emitted
+CHUNK_SIZE = 64 * 1024
+
+
+def export_lines(namespace: INamespace, table: str | None = None, fields: list[str] | None = None) -> Iterator[bytes]:
+    """Export the records of a table, or of every table of a namespace, one JSON line per record
+
+    Args:
+        namespace: Namespace to export
+        table: Table to export, every table of the namespace if None
+        fields: Only export these fields of the records, as dotted paths
+
+    Returns:
+        Iterator of UTF-8 encoded lines, each ending with a newline
+    """
+    field_tree = parse_fields(fields) if fields is not None else None
+    tables = [table] if table is not None else [table_data.name for table_data in namespace.list_tables()]
+    for name in tables:
+        table_obj = namespace.load_table(name)
+        # Keep the prefix constant, only the record varies
+        prefix = '{"table": ' + json.dumps(name, ensure_ascii=False) + ', "id": '
+        for record_id, data in table_obj.iter_records():
+            if field_tree is not None:
+                data = project(data, field_tree)
+            line = (prefix + json.dumps(record_id, ensure_ascii=False) + ', "data": '
+                    + json.dumps(data, ensure_ascii=False, default=str) + "}\n")
+            yield line.encode("utf-8")
+
+
+def chunked(lines: Iterable[bytes], gzip: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Join lines into chunks of about `chunk_size` bytes, optionally compressed as a gzip stream
+
+    Args:
+        lines: Lines to join
+        gzip: Compress the output as one gzip member
+        chunk_size: Bytes buffered before a chunk is emitted
+
+    Returns:
+        Iterator of non-empty chunks
+    """
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            chunk = b"".join(buffer)
+            buffer.clear()
+            size = 0
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    chunk = b"".join(buffer)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
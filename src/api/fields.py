@@ -0,0 +1,206 @@
+"""
+Partial reads and writes of records.
+
+Fields select members with dotted paths, `?fields=name,address.city`; a path going through a list applies to every
+item. Sub-paths address one value with a JSON pointer (RFC 6901), `/address/city` or `/tags/0`.
+
+Records may be shared with the record cache, so nothing here mutates its input: projections share the selected values
+and writes copy the containers along the path only.
+"""
+from typing import Any, Callable, Iterable
+
+# Marks a missing value in projections
+_MISSING = object()
+
+
+def parse_fields(fields: Iterable[str]) -> dict[str, Any]:
+    """Parse dotted paths into a field tree
+
+    Returns:
+        Member -> sub tree, or None to keep the whole value
+    """
+    tree: dict[str, Any] = {}
+    for field in fields:
+        field = field.strip()
+        if not field:
+            continue
+        node = tree
+        *parents, leaf = field.split(".")
+        for name in parents:
+            child = node.get(name, {})
+            if child is None:
+                break
+            node = node.setdefault(name, child)
+        else:
+            node[leaf] = None
+    return tree
+
+
+def _project(data: Any, tree: dict[str, Any]) -> Any:
+    if isinstance(data, dict):
+        result = {}
+        for name, sub_tree in tree.items():
+            if name not in data:
+                continue
+            value = data[name] if sub_tree is None else _project(data[name], sub_tree)
+            if value is not _MISSING:
+                result[name] = value
+        return result
+    if isinstance(data, list):
+        return [value for value in (_project(item, tree) for item in data) if value is not _MISSING]
+    return _MISSING
+
+
+def project(data: Any, fields: dict[str, Any]) -> Any:
+    """Keep only the fields of a record, see `parse_fields`
+
+    Returns:
+        Record with the selected members, sharing their values with `data`
+    """
+    result = _project(data, fields)
+    return result if result is not _MISSING else None
+
+
+def parse_pointer(pointer: str) -> list[str]:
+    """Split a JSON pointer into unescaped reference tokens
+
+    Raises:
+        ValueError: Not a JSON pointer
+    """
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid JSON pointer '{pointer}'")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, pointer: str, append: bool = False) -> int:
+    if append and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise ValueError(f"Path '{pointer}' not found in record")
+    index = int(token)
+    if index >= len(container) + (1 if append else 0):
+        raise ValueError(f"Path '{pointer}' not found in record")
+    return index
+
+
+def get_path(data: Any, pointer: str) -> Any:
+    """Get the value at a JSON pointer
+
+    Raises:
+        ValueError: Invalid pointer or path not found
+    """
+    for token in parse_pointer(pointer):
+        if isinstance(data, dict):
+            if token not in data:
+                raise ValueError(f"Path '{pointer}' not found in record")
+            data = data[token]
+        elif isinstance(data, list):
+            data = data[_index(data, token, pointer)]
+        else:
+            raise ValueError(f"Path '{pointer}' not found in record")
+    return data
+
+
+def _update_parent(data: Any, pointer: str, update: Callable[[dict | list, str], None]) -> Any:
+    """Copy the containers along a JSON pointer and update the copy of its parent
+
+    Args:
+        data: Record, left unchanged
+        pointer: JSON pointer, not empty
+        update: Called with the copied parent and the last token, changes the parent in place
+
+    Returns:
+        New record
+    """
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise ValueError("The whole record has no parent")
+
+    def update_in(container: Any, depth: int) -> Any:
+        if not isinstance(container, (dict, list)):
+            raise ValueError(f"Path '{pointer}' not found in record")
+        copy = dict(container) if isinstance(container, dict) else list(container)
+        token = tokens[depth]
+        if depth == len(tokens) - 1:
+            update(copy, token)
+        elif isinstance(copy, dict):
+            if token not in copy:
+                raise ValueError(f"Path '{pointer}' not found in record")
+            copy[token] = update_in(copy[token], depth + 1)
+        else:
+            index = _index(copy, token, pointer)
+            copy[index] = update_in(copy[index], depth + 1)
+        return copy
+
+    return update_in(data, 0)
+
+
+def set_path(data: Any, pointer: str, value: Any) -> Any:
+    """Set the value at a JSON pointer, the parent must exist
+
+    A member is added or replaced, a list item is replaced, `-` appends to a list.
+
+    Returns:
+        New record, `data` is left unchanged
+
+    Raises:
+        ValueError: Invalid pointer or parent not found
+    """
+    if pointer == "":
+        return value
+
+    def update(parent: dict | list, token: str) -> None:
+        if isinstance(parent, dict):
+            parent[token] = value
+        else:
+            index = _index(parent, token, pointer, append=True)
+            if index == len(parent):
+                parent.append(value)
+            else:
+                parent[index] = value
+
+    return _update_parent(data, pointer, update)
+
+
+def add_path(data: Any, pointer: str, value: Any) -> Any:
+    """Add a value at a JSON pointer like the JSON patch 'add' operation, a list item is inserted
+
+    Returns:
+        New record, `data` is left unchanged
+
+    Raises:
+        ValueError: Invalid pointer or parent not found
+    """
+    if pointer == "":
+        return value
+
+    def update(parent: dict | list, token: str) -> None:
+        if isinstance(parent, dict):
+            parent[token] = value
+        else:
+            parent.insert(_index(parent, token, pointer, append=True), value)
+
+    return _update_parent(data, pointer, update)
+
+
+def remove_path(data: Any, pointer: str) -> Any:
+    """Remove the value at a JSON pointer
+
+    Returns:
+        New record, `data` is left unchanged
+
+    Raises:
+        ValueError: Invalid pointer or path not found
+    """
+
+    def update(parent: dict | list, token: str) -> None:
+        if isinstance(parent, dict):
+            if token not in parent:
+                raise ValueError(f"Path '{pointer}' not found in record")
+            del parent[token]
+        else:
+            del parent[_index(parent, token, pointer)]
+
+    return _update_parent(data, pointer, update)
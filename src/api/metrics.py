@@ -0,0 +1,159 @@
+import functools
+import threading
+import time
+from typing import Callable, TypeVar
+
+from .tracing import TRACER
+
+F = TypeVar("F", bound=Callable)
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus layout"""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Process-wide counters and histograms, rendered in the Prometheus text format.
+
+    Disabled by default, every instrumentation point checks `enabled` first so the disabled cost is one attribute read.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._help: dict[str, tuple[str, str]] = {}
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+
+    def describe(self, name: str, type: str, help: str) -> None:
+        """Register the type and help text of a metric"""
+        self._help[name] = (type, help)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increase a counter
+
+        Args:
+            name: Metric name
+            value: Increment
+            labels: Metric labels
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record a value in a histogram
+
+        Args:
+            name: Metric name
+            value: Observed value, in seconds for latencies
+            labels: Metric labels
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self) -> None:
+        """Drop all recorded values"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _labels(labels: Labels, extra: tuple[tuple[str, str], ...] = ()) -> str:
+        items = labels + extra
+        if not items:
+            return ""
+        escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+                   for k, v in items)
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            lines = []
+            described = set()
+
+            def header(name: str, default_type: str) -> None:
+                if name not in described:
+                    described.add(name)
+                    type, help = self._help.get(name, (default_type, ""))
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {type}")
+
+            for (name, labels), value in counters:
+                header(name, "counter")
+                lines.append(f"{name}{self._labels(labels)} {value:g}")
+            for (name, labels), histogram in histograms:
+                header(name, "histogram")
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum:g}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+METRICS.describe("takoc_operation_seconds", "histogram", "Latency of storage operations")
+METRICS.describe("takoc_http_request_seconds", "histogram", "Latency of HTTP requests including serialization")
+METRICS.describe("takoc_bytes_read_total", "counter", "Bytes of files parsed")
+METRICS.describe("takoc_bytes_written_total", "counter", "Bytes of files written")
+METRICS.describe("takoc_cache_hits_total", "counter", "Parsed file cache hits")
+METRICS.describe("takoc_cache_misses_total", "counter", "Parsed file cache misses")
+METRICS.describe("takoc_lock_wait_seconds", "histogram", "Time spent waiting for index locks")
+METRICS.describe("takoc_change_subscribers_dropped_total", "counter", "Change feed subscribers too slow to keep up")
+
+
+def timed(operation: str) -> Callable[[F], F]:
+    """Decorator recording the latency of a function in 'takoc_operation_seconds' and as a span of the current trace
+
+    Args:
+        operation: Value of the 'operation' label and name of the span
+    """
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if TRACER.enabled:
+                with TRACER.span(operation):
+                    return _observe(operation, func, args, kwargs)
+            return _observe(operation, func, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _observe(operation: str, func: Callable, args: tuple, kwargs: dict):
+    if not METRICS.enabled:
+        return func(*args, **kwargs)
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        METRICS.observe("takoc_operation_seconds", time.perf_counter() - start, operation=operation)
@@ -0,0 +1,102 @@
+"""
+Partial updates of records: JSON Merge Patch (RFC 7396) and JSON Patch (RFC 6902).
+
+Patches are applied without mutating the record, which may be shared with the record cache: unchanged members are
+shared with the new record and only the containers along the patched paths are copied.
+"""
+from typing import Any, Literal
+
+from .fields import add_path, get_path, remove_path, set_path
+
+PATCH_FORMAT = Literal["merge", "json"]
+# Content type of a JSON patch body, other JSON bodies are merge patches
+JSON_PATCH_TYPE = "application/json-patch+json"
+
+
+class PatchError(ValueError):
+    """The patch is invalid or cannot be applied to the record"""
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """Apply a JSON merge patch, null members are removed
+
+    Returns:
+        New record, `target` is left unchanged
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for name, value in patch.items():
+        if value is None:
+            result.pop(name, None)
+        else:
+            result[name] = merge_patch(result.get(name), value)
+    return result
+
+
+def _value(operation: dict, index: int) -> Any:
+    if "value" not in operation:
+        raise PatchError(f"Operation {index}: missing 'value'")
+    return operation["value"]
+
+
+def _from(operation: dict, index: int) -> str:
+    if not isinstance(operation.get("from"), str):
+        raise PatchError(f"Operation {index}: missing 'from'")
+    return operation["from"]
+
+
+def json_patch(target: Any, operations: Any) -> Any:
+    """Apply a JSON patch, all operations or none
+
+    Returns:
+        New record, `target` is left unchanged
+
+    Raises:
+        PatchError: Invalid operation, path not found or failed test
+    """
+    if not isinstance(operations, list):
+        raise PatchError("A JSON patch is a list of operations")
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or not isinstance(operation.get("path"), str):
+            raise PatchError(f"Operation {index}: missing 'path'")
+        op, path = operation.get("op"), operation["path"]
+        try:
+            if op == "add":
+                target = add_path(target, path, _value(operation, index))
+            elif op == "remove":
+                target = remove_path(target, path)
+            elif op == "replace":
+                get_path(target, path)
+                target = set_path(target, path, _value(operation, index))
+            elif op == "move":
+                source = _from(operation, index)
+                if path.startswith(source + "/"):
+                    raise PatchError(f"Operation {index}: cannot move '{source}' into itself")
+                value = get_path(target, source)
+                target = add_path(remove_path(target, source), path, value)
+            elif op == "copy":
+                target = add_path(target, path, get_path(target, _from(operation, index)))
+            elif op == "test":
+                if get_path(target, path) != _value(operation, index):
+                    raise PatchError(f"Operation {index}: test of '{path}' failed")
+            else:
+                raise PatchError(f"Operation {index}: unsupported operation '{op}'")
+        except PatchError:
+            raise
+        except ValueError as e:
+            raise PatchError(f"Operation {index}: {e}") from e
+    return target
+
+
+def apply_patch(target: Any, patch: Any, format: PATCH_FORMAT) -> Any:
+    """Apply a merge patch or a JSON patch
+
+    Raises:
+        PatchError: The patch cannot be applied
+    """
+    if format == "merge":
+        return merge_patch(target, patch)
+    if format == "json":
+        return json_patch(target, patch)
+    raise PatchError(f"Unsupported patch format: {format}")
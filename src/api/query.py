@@ -0,0 +1,109 @@
+"""
+Scan queries: filter, sort, limit and project the records of a table.
+
+Filters are the ones of `aggregate`, `<field><op><value>` over dotted scalar fields. Sorts are comma separated dotted
+fields, descending with a leading `-`: `-amount,customer.name`. Values sort by kind first, missing values, booleans,
+numbers then strings, and records with equal values keep their index order.
+
+A scan runs in two steps so that it can be split: `scan_rows` filters, sorts and limits one partition of the records,
+then `merge_rows` merges the sorted partitions, in index order, and applies the limit again.
+"""
+import heapq
+import itertools
+from typing import Any, Callable, Iterable
+
+from .aggregate import Filter, flatten, kind, matches
+from .fields import parse_fields, project
+
+# (field, descending)
+Sort = tuple[str, bool]
+# (record ID, (kind, value) of every sort field, selected data)
+Row = tuple[str, tuple, Any]
+
+
+def parse_sort(text: str) -> list[Sort]:
+    """Parse `<field>,-<field>,...`
+
+    Raises:
+        ValueError: Empty field
+    """
+    sort = []
+    for field in text.split(","):
+        field = field.strip()
+        descending = field.startswith("-")
+        field = field.removeprefix("-").strip()
+        if not field:
+            raise ValueError(f"Invalid sort '{text}', expected comma separated fields, descending with a leading '-'")
+        sort.append((field, descending))
+    return sort
+
+
+class _Descending:
+    """Sort key in reverse order"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.value == other.value
+
+
+def sort_key(sort: list[Sort]) -> Callable[[Row], tuple]:
+    """Get the sort key of rows"""
+    descending = [desc for _, desc in sort]
+    if not any(descending):
+        return lambda row: row[1]
+    return lambda row: tuple(_Descending(value) if desc else value for value, desc in zip(row[1], descending))
+
+
+def scan_rows(records: Iterable[tuple[str, Any]], filters: list[Filter], sort: list[Sort], limit: int | None,
+              fields: list[str] | None) -> list[Row]:
+    """Filter, sort and limit records
+
+    Args:
+        records: (record ID, data) pairs in index order
+        filters: Filters the records must all match
+        sort: Sort fields, index order if empty
+        limit: Maximum number of rows
+        fields: Dotted paths of the returned fields, whole records if None
+
+    Returns:
+        Matching rows, sorted
+    """
+    field_tree = parse_fields(fields) if fields is not None else None
+    rows: list[Row] = []
+    if limit == 0:
+        return rows
+    for record_id, data in records:
+        scalars = flatten(data) if filters or sort else {}
+        if not all(matches(scalars.get(field), op, value) for field, op, value in filters):
+            continue
+        values = tuple((kind(value), value) for value in (scalars.get(field) for field, _ in sort))
+        rows.append((record_id, values, project(data, field_tree) if field_tree is not None else data))
+        if not sort and limit is not None and len(rows) >= limit:
+            break
+    if sort:
+        key = sort_key(sort)
+        # Both are stable, equal rows keep their index order
+        rows = heapq.nsmallest(limit, rows, key=key) if limit is not None else sorted(rows, key=key)
+    return rows
+
+
+def merge_rows(partitions: Iterable[list[Row]], sort: list[Sort], limit: int | None) -> list[tuple[str, Any]]:
+    """Merge the rows of consecutive partitions of the records
+
+    Args:
+        partitions: Rows of every partition from `scan_rows`, in index order
+        sort: Sort fields of the rows
+        limit: Maximum number of records
+
+    Returns:
+        (record ID, selected data) pairs
+    """
+    rows = heapq.merge(*partitions, key=sort_key(sort)) if sort else itertools.chain.from_iterable(partitions)
+    return [(record_id, data) for record_id, _, data in itertools.islice(rows, limit)]
@@ -0,0 +1,178 @@
+import contextvars
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator
+
+from pydantic import BaseModel, Field
+
+# Request header asking for a trace of the request, any value but '0' enables it
+TRACE_HEADER = "X-Takoc-Trace"
+# Response header carrying the ID of the recorded trace
+TRACE_ID_HEADER = "X-Takoc-Trace-Id"
+
+
+class SpanData(BaseModel):
+    name: str = Field(..., description="Operation name")
+    offset_ms: float = Field(..., description="Start time relative to the start of the trace")
+    duration_ms: float = Field(..., description="Duration including the children")
+    counters: dict[str, int] = Field(..., description="I/O counts of the span itself, e.g. bytes_read, cache_hits")
+    children: list["SpanData"] = Field(..., description="Nested operations in start order")
+
+
+class TraceSummaryData(BaseModel):
+    id: str = Field(..., description="Trace ID")
+    method: str = Field(..., description="HTTP method")
+    path: str = Field(..., description="Request path")
+    status: int = Field(..., description="Response status code")
+    timestamp: float = Field(..., description="Start time in seconds since the epoch")
+    duration_ms: float = Field(..., description="Duration of the request")
+    counters: dict[str, int] = Field(..., description="I/O counts of the whole request")
+
+
+class TraceData(TraceSummaryData):
+    root: SpanData = Field(..., description="Span of the whole request")
+
+
+class Span:
+    """Timed operation in a trace, with the I/O counts made directly within it"""
+
+    __slots__ = ("name", "start", "end", "counters", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.counters: dict[str, int] = {}
+        self.children: list[Span] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def total_counters(self) -> dict[str, int]:
+        """Sum the I/O counts of the span and all its descendants"""
+        totals = dict(self.counters)
+        for child in self.children:
+            for name, value in child.total_counters().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def to_data(self, origin: float) -> SpanData:
+        return SpanData(name=self.name, offset_ms=(self.start - origin) * 1000, duration_ms=self.duration * 1000,
+                        counters=self.counters, children=[child.to_data(origin) for child in self.children])
+
+
+class Trace:
+    """Span tree of one request"""
+
+    __slots__ = ("id", "method", "path", "status", "timestamp", "root")
+
+    def __init__(self, id: str, method: str, path: str):
+        self.id = id
+        self.method = method
+        self.path = path
+        self.status = 0
+        self.timestamp = time.time()
+        self.root = Span(f"{method} {path}")
+
+    def summary(self) -> TraceSummaryData:
+        return TraceSummaryData(id=self.id, method=self.method, path=self.path, status=self.status,
+                                timestamp=self.timestamp, duration_ms=self.root.duration * 1000,
+                                counters=self.root.total_counters())
+
+    def to_data(self) -> TraceData:
+        return TraceData(**self.summary().model_dump(), root=self.root.to_data(self.root.start))
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("takoc_span", default=None)
+
+
+class Tracer:
+    """
+    Request-scoped tracing, finished traces are kept in a ring buffer.
+
+    Disabled by default, every instrumentation point checks `enabled` first so the disabled cost is one attribute read.
+    The current span is held in a context variable, it follows requests into the worker threads of sync endpoints.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._traces: deque[Trace] = deque(maxlen=100)
+
+    def configure(self, buffer_size: int, sample_rate: float = 0.0) -> None:
+        """Enable or disable tracing
+
+        Args:
+            buffer_size: Number of traces kept, 0 to disable tracing
+            sample_rate: Fraction of requests traced without the trace header
+        """
+        with self._lock:
+            self._traces = deque(self._traces, maxlen=max(buffer_size, 1))
+        self.sample_rate = sample_rate
+        self.enabled = buffer_size > 0
+
+    def should_trace(self, header: str | None) -> bool:
+        """Decide whether to trace a request from its trace header and the sample rate"""
+        if header is not None:
+            return header != "0"
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def trace(self, method: str, path: str) -> Iterator[Trace]:
+        """Trace a request, the trace is added to the buffer when the block exits"""
+        trace = Trace(f"{int(time.time() * 1000):x}-{next(self._ids)}", method, path)
+        token = _current_span.set(trace.root)
+        try:
+            yield trace
+        finally:
+            _current_span.reset(token)
+            trace.root.end = time.perf_counter()
+            with self._lock:
+                self._traces.append(trace)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span | None]:
+        """Record a child span of the current span, nothing is recorded outside a trace"""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(name)
+        parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Add to an I/O counter of the current span, ignored outside a trace"""
+        span = _current_span.get()
+        if span is not None:
+            span.counters[name] = span.counters.get(name, 0) + value
+
+    def traces(self) -> list[Trace]:
+        """Get the buffered traces, oldest first"""
+        with self._lock:
+            return list(self._traces)
+
+    def get(self, trace_id: str) -> Trace | None:
+        """Get a buffered trace by ID"""
+        with self._lock:
+            return next((trace for trace in self._traces if trace.id == trace_id), None)
+
+    def clear(self) -> None:
+        """Drop all buffered traces"""
+        with self._lock:
+            self._traces.clear()
+
+
+TRACER = Tracer()
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional
 
 from pydantic import BaseModel, Field
 
+if TYPE_CHECKING:
+    from .changes import ChangeBus
+
 
 # Pydantic model definitions (corresponding to schemas in YAML)
 
@@ -36,8 +39,30 @@ class TableUpdateRequest(BaseModel):
     description: str = Field(..., description="Description of the table")
 
 
+class TableStatsData(BaseModel):
+    count: int = Field(default=0, description="Number of records")
+    bytes: int = Field(default=0, description="Total size of the record files")
+    modified: float | None = Field(default=None, description="Time of the last write in seconds since the epoch")
+    formats: dict[str, int] = Field(default={}, description="Number of record files by format")
+
+
 class TableData(TableBase):
     namespace: str = Field(..., description="Name of the parent namespace")
+    stats: TableStatsData | None = Field(default=None, description="Record count and sizes, None if unknown")
+
+
+class ViewData(BaseModel):
+    namespace: str = Field(..., description="Namespace of the view table")
+    name: str = Field(..., description="Name of the view table")
+    source: str = Field(..., description="Source table, as '<namespace>.<table>'")
+    filter: list[str] = Field(default=[], description="Filters the source records must all match, see `aggregate`")
+    fields: list[str] | None = Field(default=None, description="Dotted paths of the kept fields, all if None")
+    group_by: str | None = Field(default=None, description="Field grouping the records, one view record per source "
+                                                            "record if None")
+
+
+class CountResponse(BaseModel):
+    count: int = Field(..., description="Number of records")
 
 
 class ErrorResponse(BaseModel):
@@ -46,6 +71,42 @@ class ErrorResponse(BaseModel):
     data: Any = Field(description="Additional error data", default=None)
 
 
+class RecordData(BaseModel):
+    id: str = Field(..., description="Record ID")
+    data: Any = Field(default=None, description="Record data, or its selected fields")
+
+
+class SearchHitData(BaseModel):
+    id: str = Field(..., description="Record ID")
+    score: float = Field(..., description="BM25 score, higher is more relevant")
+    data: Any = Field(default=None, description="Selected fields of the record with `fields`")
+
+
+class AggregateRowData(BaseModel):
+    group: dict[str, Any] = Field(default={}, description="Values of the group-by fields, null when missing")
+    values: dict[str, Any] = Field(default={}, description="Metrics by name, e.g. 'count' or 'sum:amount'")
+
+
+class ChangesResponse(BaseModel):
+    token: str = Field(..., description="Token of the current state, for the next request")
+    upserted: list[str] = Field(default=[], description="IDs of the records created or updated since the token")
+    deleted: list[str] = Field(default=[], description="IDs of the records deleted since the token")
+
+
+class ImportResponse(BaseModel):
+    imported: int = Field(default=0, description="Number of records created")
+    skipped: int = Field(default=0, description="Number of existing records skipped")
+    failed: int = Field(default=0, description="Number of rows rejected")
+    errors: list[str] = Field(default=[], description="Reasons of the first rejected rows, by line number")
+
+    def fail(self, line_no: int, message: str) -> None:
+        """Count a rejected row"""
+        from .bulk_import import MAX_ERRORS
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"line {line_no}: {message}")
+
+
 # Main data access layer interface (for backward compatibility)
 class IDatabase(ABC):
     """Main data access layer interface"""
@@ -61,6 +122,16 @@ class IDatabase(ABC):
         """Get table data access object for a specific namespace"""
         pass
 
+    @property
+    def ready(self) -> bool:
+        """Whether the database is ready to serve traffic, e.g. False while caches are warming up"""
+        return True
+
+    @property
+    def changes(self) -> "ChangeBus | None":
+        """Get the bus of change events, None if changes cannot be watched"""
+        return None
+
 
 # Data access layer interfaces
 class INamespaces(ABC):
@@ -157,6 +228,184 @@ class ITable(ABC):
         """Get single record data"""
         pass
 
+    def iter_records(self) -> Iterator[tuple[str, Any]]:
+        """Iterate over all records as (record ID, data), implementations may read ahead"""
+        for record_id in self.list_records():
+            yield record_id, self.get_record(record_id)
+
+    def scan_records(self, prefix: str = "", start: str | None = None, end: str | None = None, reverse: bool = False,
+                     limit: int | None = None) -> list[str]:
+        """List record IDs in ID order within a range
+
+        Implementations may keep the IDs sorted, this one sorts every record ID.
+
+        Args:
+            prefix: Keep the IDs starting with it
+            start: First ID, inclusive
+            end: Last ID, exclusive
+            reverse: Descending order
+            limit: Maximum number of IDs
+        """
+        ids = sorted(record_id for record_id in self.list_records() if record_id.startswith(prefix)
+                     and (start is None or record_id >= start) and (end is None or record_id < end))
+        if reverse:
+            ids.reverse()
+        return ids[:limit] if limit is not None else ids
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[str, float]]:
+        """Rank the records matching the words of a query
+
+        Returns:
+            (record ID, score) by descending score
+
+        Raises:
+            ValueError: The table has no search index
+        """
+        raise ValueError(f"Table '{self.name}' has no search index")
+
+    def aggregate(self, group_by: list[str], metrics: list[tuple[str, str | None]],
+                  filters: list[tuple[str, str, Any]]) -> list[AggregateRowData]:
+        """Aggregate the scalar fields of the records, see `aggregate`
+
+        Implementations may evaluate the query on columns, this one loops over the records.
+
+        Args:
+            group_by: Fields of the group keys, a single group if empty
+            metrics: (function, field) pairs, the field is None for 'count'
+            filters: (field, operator, value) the records must all match
+
+        Returns:
+            One row per group, by group key
+        """
+        from .aggregate import aggregate_records
+        return aggregate_records((data for _, data in self.iter_records()), group_by, metrics, filters)
+
+    def query(self, filters: list[tuple[str, str, Any]], sort: list[tuple[str, bool]], limit: int | None = None,
+              fields: list[str] | None = None) -> list[tuple[str, Any]]:
+        """Filter, sort and limit the records, see `query`
+
+        Implementations may scan the records in parallel, this one loops over them.
+
+        Args:
+            filters: (field, operator, value) the records must all match
+            sort: (field, descending) pairs, index order if empty
+            limit: Maximum number of records
+            fields: Dotted paths of the returned fields, whole records if None
+
+        Returns:
+            (record ID, selected data) pairs
+        """
+        from .query import merge_rows, scan_rows
+        return merge_rows([scan_rows(self.iter_records(), filters, sort, limit, fields)], sort, limit)
+
+    def stats(self) -> TableStatsData:
+        """Get the record count and sizes of the table
+
+        Implementations may keep them up to date on every write, this one lists the records.
+        """
+        return TableStatsData(count=len(self.list_records()))
+
+    def get_record_path(self, record_id: str, pointer: str) -> Any:
+        """Get the value at a JSON pointer of a record
+
+        Raises:
+            ValueError: Record or path not found
+        """
+        from .fields import get_path
+        record = self.get_record(record_id)
+        if record is None:
+            raise ValueError(f"Record '{record_id}' not found in table")
+        return get_path(record, pointer)
+
+    def update_record_path(self, record_id: str, pointer: str, value: Any) -> None:
+        """Set the value at a JSON pointer of a record, see `fields.set_path`
+
+        Implementations should hold their write lock, this one may lose concurrent updates.
+
+        Raises:
+            ValueError: Record or parent path not found
+        """
+        from .fields import set_path
+        record = self.get_record(record_id)
+        if record is None:
+            raise ValueError(f"Record '{record_id}' not found in table")
+        self.update_record(record_id, set_path(record, pointer, value))
+
+    def import_records(self, chunks: Iterable[bytes], format: str = "ndjson", id_field: str = "id",
+                       skip_existing: bool = False, validate: bool = False) -> ImportResponse:
+        """Create records from a JSON Lines or CSV stream, see `bulk_import`
+
+        Implementations may parse in parallel and write in batches, this one creates the records one by one.
+
+        Args:
+            chunks: Stream of the body
+            format: 'ndjson' or 'csv'
+            id_field: Member or column holding the record ID
+            skip_existing: Skip records that already exist instead of rejecting them
+            validate: Validate the records against the JSON schema of the table
+
+        Returns:
+            Counts of imported, skipped and rejected rows
+        """
+        from .bulk_import import iter_rows, parse_row
+        if validate:
+            raise ValueError(f"Table '{self.name}' does not support schema validation")
+        result = ImportResponse()
+        existing = set(self.list_records())
+        for line_no, row in iter_rows(chunks, format):
+            try:
+                record_id, data = parse_row(row, format, id_field)
+            except ValueError as e:
+                result.fail(line_no, str(e))
+                continue
+            if record_id in existing:
+                if skip_existing:
+                    result.skipped += 1
+                else:
+                    result.fail(line_no, f"Record '{record_id}' already exists")
+                continue
+            self.create_record(record_id, data)
+            existing.add(record_id)
+            result.imported += 1
+        return result
+
+    def changes_since(self, token: str) -> ChangesResponse:
+        """Get the records created, updated or deleted since a token
+
+        Args:
+            token: Token of a previous response, empty for every record
+
+        Raises:
+            TokenExpiredError: The token is too old, re-sync fully
+            ValueError: Malformed token, or changes are not tracked
+        """
+        raise ValueError(f"Table '{self.name}' does not track changes")
+
+    def patch_record(self, record_id: str, patch: Any, format: str = "merge") -> Any:
+        """Apply a JSON merge patch or a JSON patch to a record, see `patch.apply_patch`
+
+        Implementations should hold their write lock, this one may lose concurrent updates.
+
+        Args:
+            record_id: Record ID
+            patch: Merge patch, or list of JSON patch operations
+            format: 'merge' (RFC 7396) or 'json' (RFC 6902)
+
+        Returns:
+            Patched record
+
+        Raises:
+            PatchError: The patch cannot be applied
+            ValueError: Record not found
+        """
+        from .patch import apply_patch
+        record = self.get_record(record_id)
+        if record is None:
+            raise ValueError(f"Record '{record_id}' not found in table")
+        record = apply_patch(record, patch, format)
+        self.update_record(record_id, record)
+        return record
+
     @abstractmethod
     def create_record(self, record_id: str, data: Any) -> None:
         """Add a record"""
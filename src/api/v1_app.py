@@ -1,11 +1,30 @@
-from typing import Any
-
-from fastapi import HTTPException, Depends, FastAPI, Request
-from fastapi.responses import JSONResponse
-
+import asyncio
+import queue
+import time
+import zlib
+from email.utils import formatdate
+from typing import Any, AsyncIterator, Iterator
+
+from fastapi import HTTPException, Depends, FastAPI, Request, Body, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .aggregate import parse_filter, parse_metric
+from .bulk_import import IMPORT_FORMAT, gunzip
+from .changes import ChangeBus
+from .error import ReadOnlyError, TokenExpiredError
+from .export import export_lines, chunked
+from .fields import parse_fields, project
+from .patch import JSON_PATCH_TYPE, PatchError
+from .query import parse_sort
+from .metrics import METRICS
+from .tracing import TRACER, TRACE_HEADER, TRACE_ID_HEADER, TraceData, TraceSummaryData
 from .v1 import (
     IDatabase, ITable, NamespaceCreateRequest, NamespaceUpdateRequest, NamespaceData,
-    TableCreateRequest, TableUpdateRequest, TableData, ErrorResponse, INamespace,
+    TableCreateRequest, TableUpdateRequest, TableData, ErrorResponse, INamespace, ImportResponse,
+    RecordData, ChangesResponse, CountResponse, TableStatsData, SearchHitData, AggregateRowData,
 )
 
 app = FastAPI(
@@ -30,11 +49,107 @@ def http_exception_handler(request: Request, exc: HTTPException):
     )
 
 
+class MetricsMiddleware:
+    """
+    Record the latency of every request and the span tree of traced requests.
+
+    Pure ASGI middleware, so requests pass straight through when metrics and tracing are disabled, without the
+    request and response wrapping of `BaseHTTPMiddleware`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (METRICS.enabled or TRACER.enabled):
+            await self.app(scope, receive, send)
+            return
+        if TRACER.enabled and TRACER.should_trace(Headers(scope=scope).get(TRACE_HEADER)):
+            with TRACER.trace(scope["method"], scope["path"]) as trace:
+                async def send_traced(message: Message) -> None:
+                    if message["type"] == "http.response.start":
+                        trace.status = message["status"]
+                        MutableHeaders(scope=message)[TRACE_ID_HEADER] = trace.id
+                    await send(message)
+
+                await self._observe(scope, receive, send_traced)
+            return
+        await self._observe(scope, receive, send)
+
+    async def _observe(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not METRICS.enabled:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_observed(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            route = scope.get("route")
+            METRICS.observe("takoc_http_request_seconds", time.perf_counter() - start,
+                            method=scope["method"], route=route.path if route else "unmatched", status=str(status))
+
+
+app.add_middleware(MetricsMiddleware)
+
+
 def get_database() -> IDatabase:
     """Placeholder for database dependency injection"""
     raise NotImplementedError("Database provider not configured")
 
 
+@app.get("/ready", tags=["Health"])
+def ready(
+        db: IDatabase = Depends(get_database)
+):
+    """Readiness probe, fails until the database has finished warming up"""
+    if not db.ready:
+        raise HTTPException(
+            status_code=503, detail=ErrorResponse(
+                message="Database is warming up",
+                type="string",
+                data="warming_up"))
+    return {"ready": True}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+def metrics():
+    """Metrics in the Prometheus text format, empty unless metrics are enabled"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/traces", response_model=list[TraceSummaryData], tags=["Admin"])
+def list_traces(min_ms: float = 0, limit: int = 100):
+    """List buffered request traces, newest first
+
+    Args:
+        min_ms: Only traces of requests slower than this
+        limit: Maximum number of traces
+    """
+    traces = [trace.summary() for trace in reversed(TRACER.traces())]
+    return [trace for trace in traces if trace.duration_ms >= min_ms][:limit]
+
+
+@app.get("/admin/traces/{trace_id}", response_model=TraceData, tags=["Admin"])
+def get_trace(trace_id: str):
+    """Get the span tree of a buffered request trace"""
+    trace = TRACER.get(trace_id)
+    if trace is None:
+        raise HTTPException(
+            status_code=404, detail=ErrorResponse(
+                message=f"Trace '{trace_id}' not found",
+                type="string",
+                data=trace_id))
+    return trace.to_data()
+
+
 # Namespace endpoints
 
 
@@ -178,6 +293,22 @@ def update_table(
     return None
 
 
+@app.get("/table/{namespace}/{table}/count", response_model=CountResponse, tags=["Table"])
+def count_records(
+        namespace: str,
+        table: str,
+        db: IDatabase = Depends(get_database)
+):
+    """Count the records of a table without listing them"""
+    return CountResponse(count=table_stats(db, namespace, table).count)
+
+
+def table_stats(db: IDatabase, namespace: str, table: str) -> TableStatsData:
+    """Get the statistics of a table, from its metadata if kept there"""
+    namespace_obj, table_data = get_table_meta(db, namespace, table)
+    return table_data.stats if table_data.stats is not None else namespace_obj.load_table(table).stats()
+
+
 @app.delete("/table/{namespace}/{table}", status_code=204, tags=["Table"])
 def delete_table(
         namespace: str,
@@ -209,78 +340,458 @@ def load_table(db: IDatabase, namespace: str, table: str) -> ITable:
     return table_obj
 
 
-@app.post("/data/{namespace}/{table}/{record_id}", status_code=201, tags=["Record"])
+def check_record_id(namespace: str, table: str, record_id: str) -> None:
+    """Reject an empty record ID or an ID with an empty segment, e.g. from a trailing or a double slash"""
+    if "" in record_id.split("/"):
+        raise HTTPException(
+            status_code=422, detail=ErrorResponse(
+                message=f"Invalid record ID '{record_id}', neither the ID nor its segments may be empty",
+                type="object",
+                data={"namespace": namespace, "table": table, "record_id": record_id}))
+
+
+@app.post("/data/{namespace}/{table}/{record_id:path}", status_code=201, tags=["Record"])
 def create_record(
         namespace: str,
         table: str,
         record_id: str,
-        data: Any,
+        data: Any = Body(...),
         db: IDatabase = Depends(get_database)
 ):
+    check_record_id(namespace, table, record_id)
     load_table(db, namespace, table).create_record(
         record_id=record_id, data=data)
     return None
 
 
-@app.get("/data/{namespace}/{table}", response_model=list[str], tags=["Record"])
+@app.head("/data/{namespace}/{table}", tags=["Record"])
+def head_records(
+        namespace: str,
+        table: str,
+        db: IDatabase = Depends(get_database)
+):
+    """Get the record count and total size of a table in headers, without listing the records"""
+    stats = table_stats(db, namespace, table)
+    headers = {"X-Total-Count": str(stats.count), "X-Total-Bytes": str(stats.bytes)}
+    if stats.modified is not None:
+        headers["Last-Modified"] = formatdate(stats.modified, usegmt=True)
+    return Response(headers=headers)
+
+
+def get_records(table_obj: ITable, record_ids: list[str]) -> Iterator[tuple[str, Any]]:
+    """Get records by ID, skipping the records without a file like `iter_records`"""
+    for record_id in record_ids:
+        try:
+            yield record_id, table_obj.get_record(record_id)
+        except ValueError:
+            continue
+
+
+def split_fields(fields: str | None) -> list[str] | None:
+    """Split the `fields` query parameter, None to select whole records"""
+    return fields.split(",") if fields is not None else None
+
+
+@app.get("/data/{namespace}/{table}", response_model=list[str] | list[RecordData] | ChangesResponse, tags=["Record"])
 def list_records(
         namespace: str,
         table: str,
+        fields: str | None = None,
+        since: str | None = None,
+        prefix: str | None = None,
+        start: str | None = None,
+        end: str | None = None,
+        reverse: bool = False,
+        limit: int | None = Query(default=None, ge=0),
         db: IDatabase = Depends(get_database)
 ):
+    """List record IDs, or the selected fields of every record with `fields`, or the records changed `since` a token
+
+    With `prefix`, `start`, `end`, `reverse` or `limit`, only the records in the range are listed, in ID order.
+    """
     table_obj = load_table(db, namespace, table)
-    return table_obj.list_records()
+    if since is not None:
+        try:
+            return table_obj.changes_since(since)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=410 if isinstance(e, TokenExpiredError) else 400, detail=ErrorResponse(
+                    message=str(e),
+                    type="object",
+                    data={"namespace": namespace, "table": table, "since": since}))
+    if prefix is not None or start is not None or end is not None or reverse or limit is not None:
+        record_ids = table_obj.scan_records(prefix or "", start, end, reverse, limit)
+        if fields is None:
+            return record_ids
+        field_tree = parse_fields(split_fields(fields))
+        return [RecordData(id=record_id, data=project(data, field_tree))
+                for record_id, data in get_records(table_obj, record_ids)]
+    if fields is None:
+        return table_obj.list_records()
+    field_tree = parse_fields(split_fields(fields))
+    return [RecordData(id=record_id, data=project(data, field_tree)) for record_id, data in table_obj.iter_records()]
 
 
 def load_table_get_record(db: IDatabase, namespace: str,
                           table: str,
                           record_id: str) -> tuple[ITable, Any]:
     table_obj = load_table(db, namespace, table)
-    record_data = table_obj.get_record(record_id)
+    try:
+        record_data = table_obj.get_record(record_id)
+    except ValueError:
+        record_data = None
     if record_data is None:
-        raise HTTPException(
-            status_code=404, detail=ErrorResponse(
-                message=f"Record '{record_id}' not found in table '{table}' in namespace '{namespace}'",
-                type="object",
-                data={"namespace": namespace, "table": table, "record_id": record_id}))
+        raise record_not_found(namespace, table, record_id)
     return table_obj, record_data
 
 
-@app.get("/data/{namespace}/{table}/{record_id}", response_model=dict, tags=["Record"])
+def record_not_found(namespace: str, table: str, record_id: str, error: ValueError | None = None) -> HTTPException:
+    return HTTPException(
+        status_code=404, detail=ErrorResponse(
+            message=str(error) if error is not None else
+            f"Record '{record_id}' not found in table '{table}' in namespace '{namespace}'",
+            type="object",
+            data={"namespace": namespace, "table": table, "record_id": record_id}))
+
+
+@app.get("/data/{namespace}/{table}/{record_id:path}", tags=["Record"])
 def get_record(
         namespace: str,
         table: str,
         record_id: str,
+        fields: str | None = None,
+        path: str | None = None,
         db: IDatabase = Depends(get_database)
 ):
+    """Get a record, the listed fields of a record, or the value at the JSON pointer `path`"""
+    check_record_id(namespace, table, record_id)
+    if path is not None:
+        if fields is not None:
+            raise HTTPException(
+                status_code=400, detail=ErrorResponse(
+                    message="Cannot read both fields and a path of a record",
+                    type="object",
+                    data={"namespace": namespace, "table": table, "record_id": record_id}))
+        table_obj = load_table(db, namespace, table)
+        try:
+            return table_obj.get_record_path(record_id, path)
+        except ValueError as e:
+            raise record_not_found(namespace, table, record_id, e)
     _, record_data = load_table_get_record(db, namespace, table, record_id)
+    if fields is not None:
+        return project(record_data, parse_fields(split_fields(fields)))
     return record_data
 
 
-@app.put("/data/{namespace}/{table}/{record_id}", tags=["Record"])
+@app.put("/data/{namespace}/{table}/{record_id:path}", tags=["Record"])
 def update_record(
         namespace: str,
         table: str,
         record_id: str,
-        data: Any,
+        path: str | None = None,
+        data: Any = Body(...),
         db: IDatabase = Depends(get_database)
 ):
-    table_obj, _ = load_table_get_record(db, namespace, table, record_id)
-    table_obj.update_record(
-        record_id=record_id,
-        data=data
-    )
+    """Replace a record, or set the value at the JSON pointer `path`, whose parent must exist"""
+    check_record_id(namespace, table, record_id)
+    table_obj = load_table(db, namespace, table)
+    # The update checks the record exists, reading it first would parse the file for nothing
+    try:
+        if path is not None:
+            table_obj.update_record_path(record_id, path, data)
+        else:
+            table_obj.update_record(
+                record_id=record_id,
+                data=data
+            )
+    except ValueError as e:
+        raise record_not_found(namespace, table, record_id, e)
 
     return None
 
 
-@app.delete("/data/{namespace}/{table}/{record_id}", status_code=204, tags=["Record"])
+@app.patch("/data/{namespace}/{table}/{record_id:path}", response_model=Any, tags=["Record"])
+def patch_record(
+        namespace: str,
+        table: str,
+        record_id: str,
+        request: Request,
+        patch: Any = Body(...),
+        db: IDatabase = Depends(get_database)
+):
+    """Apply a JSON merge patch, or a JSON patch with the application/json-patch+json content type"""
+    check_record_id(namespace, table, record_id)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    format = "json" if content_type == JSON_PATCH_TYPE else "merge"
+    table_obj = load_table(db, namespace, table)
+    try:
+        return table_obj.patch_record(record_id, patch, format)
+    except PatchError as e:
+        raise HTTPException(
+            status_code=422, detail=ErrorResponse(
+                message=str(e),
+                type="object",
+                data={"namespace": namespace, "table": table, "record_id": record_id}))
+    except ValueError as e:
+        raise record_not_found(namespace, table, record_id, e)
+
+
+@app.delete("/data/{namespace}/{table}/{record_id:path}", status_code=204, tags=["Record"])
 def delete_record(
         namespace: str,
         table: str,
         record_id: str,
         db: IDatabase = Depends(get_database)
 ):
-    table_obj, _ = load_table_get_record(db, namespace, table, record_id)
-    table_obj.delete_record(record_id)
+    check_record_id(namespace, table, record_id)
+    table_obj = load_table(db, namespace, table)
+    try:
+        table_obj.delete_record(record_id)
+    except ValueError as e:
+        raise record_not_found(namespace, table, record_id, e)
     return None
+
+
+# Search endpoints
+
+@app.get("/search/{namespace}/{table}", response_model=list[SearchHitData], tags=["Search"])
+def search_records(
+        namespace: str,
+        table: str,
+        q: str,
+        limit: int = Query(default=20, ge=1, le=1000),
+        fields: str | None = None,
+        db: IDatabase = Depends(get_database)
+):
+    """Rank the records matching the words of `q`, with the selected `fields` of every record"""
+    table_obj = load_table(db, namespace, table)
+    try:
+        hits = table_obj.search(q, limit)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail=ErrorResponse(
+                message=str(e),
+                type="object",
+                data={"namespace": namespace, "table": table}))
+    if fields is None:
+        return [SearchHitData(id=record_id, score=score) for record_id, score in hits]
+    field_tree = parse_fields(split_fields(fields))
+    scores = dict(hits)
+    return [SearchHitData(id=record_id, score=scores[record_id], data=project(data, field_tree))
+            for record_id, data in get_records(table_obj, [record_id for record_id, _ in hits])]
+
+
+# Aggregate endpoints
+
+@app.get("/aggregate/{namespace}/{table}", response_model=list[AggregateRowData], tags=["Analytics"])
+def aggregate_records(
+        namespace: str,
+        table: str,
+        group_by: str | None = None,
+        metric: list[str] = Query(default=["count"]),
+        filters: list[str] = Query(default=[], alias="filter"),
+        db: IDatabase = Depends(get_database)
+):
+    """Count and sum the scalar fields of the records by group, see `aggregate` for the syntax"""
+    table_obj = load_table(db, namespace, table)
+    try:
+        return table_obj.aggregate(split_fields(group_by) or [], [parse_metric(text) for text in metric],
+                                   [parse_filter(text) for text in filters])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail=ErrorResponse(
+                message=str(e),
+                type="object",
+                data={"namespace": namespace, "table": table}))
+
+
+@app.get("/query/{namespace}/{table}", response_model=list[RecordData], tags=["Analytics"])
+def query_records(
+        namespace: str,
+        table: str,
+        filters: list[str] = Query(default=[], alias="filter"),
+        sort: str | None = None,
+        limit: int | None = Query(default=None, ge=0),
+        fields: str | None = None,
+        db: IDatabase = Depends(get_database)
+):
+    """Scan the records matching every filter, sorted and limited, see `query` for the syntax"""
+    table_obj = load_table(db, namespace, table)
+    try:
+        records = table_obj.query([parse_filter(text) for text in filters], parse_sort(sort) if sort else [], limit,
+                                  split_fields(fields))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail=ErrorResponse(
+                message=str(e),
+                type="object",
+                data={"namespace": namespace, "table": table}))
+    return [RecordData(id=record_id, data=data) for record_id, data in records]
+
+
+# Export endpoints
+
+def export_response(namespace_obj: INamespace, table: str | None, gzip: bool,
+                    fields: str | None = None) -> StreamingResponse:
+    file_name = namespace_obj.name + (f".{table}" if table is not None else "") + ".ndjson"
+    if gzip:
+        file_name += ".gz"
+    return StreamingResponse(
+        chunked(export_lines(namespace_obj, table, split_fields(fields)), gzip=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'})
+
+
+@app.get("/export/{namespace}", response_class=StreamingResponse, tags=["Export"])
+def export_namespace(
+        namespace: str,
+        gzip: bool = False,
+        fields: str | None = None,
+        db: IDatabase = Depends(get_database)
+):
+    """Stream the records of every table of a namespace as JSON Lines"""
+    return export_response(load_namespace(db, namespace), None, gzip, fields)
+
+
+@app.get("/export/{namespace}/{table}", response_class=StreamingResponse, tags=["Export"])
+def export_table(
+        namespace: str,
+        table: str,
+        gzip: bool = False,
+        fields: str | None = None,
+        db: IDatabase = Depends(get_database)
+):
+    """Stream the records of a table as JSON Lines"""
+    namespace_obj, _ = get_table_meta(db, namespace, table)
+    return export_response(namespace_obj, table, gzip, fields)
+
+
+# Import endpoints
+
+# Body chunks buffered while the import is busy, the request is read no faster than it is imported
+IMPORT_QUEUE_SIZE = 16
+
+
+@app.post("/import/{namespace}/{table}", response_model=ImportResponse, tags=["Export"])
+async def import_table(
+        namespace: str,
+        table: str,
+        request: Request,
+        format: IMPORT_FORMAT = "ndjson",
+        gzip: bool = False,
+        id_field: str = "id",
+        skip_existing: bool = False,
+        validate: bool = False,
+        db: IDatabase = Depends(get_database)
+):
+    """Create records from a streamed JSON Lines or CSV body"""
+    namespace_obj, _ = await run_in_threadpool(get_table_meta, db, namespace, table)
+    table_obj = await run_in_threadpool(namespace_obj.load_table, table)
+    chunks = queue.Queue(maxsize=IMPORT_QUEUE_SIZE)
+
+    def run_import() -> ImportResponse:
+        body = iter(chunks.get, None)
+        try:
+            return table_obj.import_records(gunzip(body) if gzip else body, format=format, id_field=id_field,
+                                            skip_existing=skip_existing, validate=validate)
+        finally:
+            # Keep reading until the end of the body, so the request never blocks on a full queue
+            for _ in body:
+                pass
+
+    task = asyncio.ensure_future(run_in_threadpool(run_import))
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(chunks.put, chunk)
+    finally:
+        await run_in_threadpool(chunks.put, None)
+    try:
+        return await task
+    except ReadOnlyError as e:
+        raise HTTPException(
+            status_code=403, detail=ErrorResponse(
+                message=str(e),
+                type="object",
+                data={"namespace": namespace, "table": table}))
+    except (ValueError, zlib.error) as e:
+        raise HTTPException(
+            status_code=400, detail=ErrorResponse(
+                message=str(e),
+                type="object",
+                data={"namespace": namespace, "table": table}))
+
+
+# Change feed endpoints
+
+# Seconds without events before a keep-alive comment is sent
+HEARTBEAT_SECONDS = 15.0
+
+
+async def change_events(bus: ChangeBus, namespace: str, table: str | None,
+                        heartbeat: float = HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+    """Stream the change events of a namespace or table as Server-Sent Events
+
+    The stream ends with a 'dropped' event when the consumer is too slow to keep up.
+    """
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+
+    def notify() -> None:
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # The event loop is closed, the stream is gone
+            pass
+
+    subscription = bus.subscribe(namespace, table, notify=notify)
+    try:
+        # Sent at once, so clients know the subscription is active
+        yield ": subscribed\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            wakeup.clear()
+            for event in subscription.drain():
+                yield f"id: {event.seq}\nevent: change\ndata: {event.model_dump_json()}\n\n"
+            if subscription.dropped:
+                yield 'event: dropped\ndata: {"reason": "slow consumer"}\n\n'
+                return
+    finally:
+        subscription.close()
+
+
+def change_response(db: IDatabase, namespace: str, table: str | None) -> StreamingResponse:
+    bus = db.changes
+    if bus is None:
+        raise HTTPException(
+            status_code=501, detail=ErrorResponse(
+                message="The database does not support change feeds",
+                type="object",
+                data={"namespace": namespace}))
+    return StreamingResponse(change_events(bus, namespace, table), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/changes/{namespace}", response_class=StreamingResponse, tags=["Changes"])
+async def namespace_changes(
+        namespace: str,
+        db: IDatabase = Depends(get_database)
+):
+    """Stream the changes of a namespace, its tables and records as Server-Sent Events"""
+    await run_in_threadpool(load_namespace, db, namespace)
+    return change_response(db, namespace, None)
+
+
+@app.get("/changes/{namespace}/{table}", response_class=StreamingResponse, tags=["Changes"])
+async def table_changes(
+        namespace: str,
+        table: str,
+        db: IDatabase = Depends(get_database)
+):
+    """Stream the changes of a table and its records as Server-Sent Events"""
+    await run_in_threadpool(get_table_meta, db, namespace, table)
+    return change_response(db, namespace, table)
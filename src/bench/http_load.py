@@ -0,0 +1,192 @@
+"""
+Load test of the v1 HTTP API against a local uvicorn server.
+
+Starts `v1_app` with a `TakocLocalDb` on a synthetic (or existing) repository and runs a weighted mix of routes
+from concurrent keep-alive clients, e.g.:
+
+    uv run python -m src.bench.http_load --records 10000 --concurrency 16 --duration 30 \
+        --mix get=70,list=10,create=10,update=10
+"""
+import argparse
+import http.client
+import json
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from .local_git import generate_repo, record_data, NAMESPACE, TABLE
+from .stats import summarize
+
+# Route name -> function building (method, path template, body) from a random generator and the record count
+Route = Callable[[random.Random, int, Callable[[], int]], tuple[str, str, dict | None]]
+
+ROUTES: dict[str, tuple[str, Route]] = {
+    "get": ("GET /data/{namespace}/{table}/{record_id}",
+            lambda rng, records, new_id: ("GET", f"/data/{NAMESPACE}/{TABLE}/r{rng.randrange(records)}", None)),
+    "list": ("GET /data/{namespace}/{table}",
+             lambda rng, records, new_id: ("GET", f"/data/{NAMESPACE}/{TABLE}", None)),
+    "create": ("POST /data/{namespace}/{table}/{record_id}",
+               lambda rng, records, new_id: ("POST", f"/data/{NAMESPACE}/{TABLE}/n{new_id()}", record_data(0))),
+    "update": ("PUT /data/{namespace}/{table}/{record_id}",
+               lambda rng, records, new_id: (
+                   "PUT", f"/data/{NAMESPACE}/{TABLE}/r{rng.randrange(records)}", record_data(rng.randrange(100)))),
+    "tables": ("GET /table/{namespace}",
+               lambda rng, records, new_id: ("GET", f"/table/{NAMESPACE}", None)),
+    "namespaces": ("GET /namespace",
+                   lambda rng, records, new_id: ("GET", "/namespace", None)),
+}
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """Parse a route mix such as 'get=70,list=10,create=20'
+
+    Raises:
+        ValueError: Unknown route or invalid weight
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise ValueError(f"Unknown route '{name}', expected one of {', '.join(ROUTES)}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalServer:
+    """Run `v1_app` on uvicorn in a background thread"""
+
+    def __init__(self, db_root: str, **db_options):
+        import uvicorn
+
+        from ..api.v1_app import app, get_database
+        from ..local_git.db import TakocLocalDb
+
+        self.db = TakocLocalDb(db_root=db_root, **db_options)
+        self.port = free_port()
+        app.dependency_overrides[get_database] = lambda: self.db
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name="takoc-load-server", daemon=True)
+
+    def __enter__(self) -> "LocalServer":
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+        self.db.close()
+
+
+def run_load(port: int, records: int, weights: dict[str, int], concurrency: int, duration: float,
+             seed: int) -> dict[str, dict]:
+    """Run the route mix from concurrent clients
+
+    Returns:
+        Summary per route, including the error count and rate
+    """
+    names = list(weights)
+    latencies: dict[str, list[float]] = {name: [] for name in names}
+    errors: dict[str, int] = {name: 0 for name in names}
+    lock = threading.Lock()
+    counter = iter(range(sys.maxsize))
+    deadline = time.monotonic() + duration
+
+    def new_id() -> int:
+        with lock:
+            return next(counter)
+
+    def client(worker: int) -> None:
+        rng = random.Random(seed + worker)
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            method, path, body = ROUTES[name][1](rng, records, new_id)
+            payload = json.dumps(body) if body is not None else None
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                failed = response.status >= 400
+            except (OSError, http.client.HTTPException):
+                failed = True
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[name].append(elapsed)
+                if failed:
+                    errors[name] += 1
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    results = {}
+    for name in names:
+        summary = summarize(latencies[name], wall)
+        summary["errors"] = errors[name]
+        summary["error_rate"] = errors[name] / summary["ops"] if summary["ops"] else 0.0
+        results[ROUTES[name][0]] = summary
+    return results
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(prog="src.bench.http_load", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db-root", help="Existing repository, it must contain the bench namespace and table")
+    parser.add_argument("--records", type=int, default=1000, help="Records of the synthetic repository")
+    parser.add_argument("--tables", type=int, default=10, help="Tables of the synthetic repository")
+    parser.add_argument("--format", choices=["yaml", "json"], default="yaml")
+    parser.add_argument("--mix", default="get=70,list=10,create=10,update=10")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--record-cache-size", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    weights = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory(prefix="takoc-load-") as tmp_dir:
+        db_root = args.db_root
+        if db_root is None:
+            db_root = tmp_dir
+            generate_repo(Path(tmp_dir), args.format, args.records, args.tables)
+        with LocalServer(db_root, record_cache_size=args.record_cache_size) as server:
+            routes = run_load(server.port, args.records, weights, args.concurrency, args.duration, args.seed)
+
+    for route, result in routes.items():
+        print(f"{route:48} {result['throughput']:9.1f} req/s p50={result['p50_ms']:8.3f}ms "
+              f"p95={result['p95_ms']:8.3f}ms p99={result['p99_ms']:8.3f}ms "
+              f"errors={result['errors']} ({result['error_rate']:.2%})", file=sys.stderr)
+
+    report = {"concurrency": args.concurrency, "duration": args.duration, "mix": weights,
+              "records": args.records, "format": args.format, "routes": routes}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
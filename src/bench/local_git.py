@@ -0,0 +1,213 @@
+"""
+Benchmark of the local_git storage hot paths.
+
+Generates synthetic repositories in temporary directories and measures throughput, latency percentiles and
+peak memory of every operation, e.g.:
+
+    uv run python -m src.bench.local_git --records 1000 10000 100000 --tables 10 1000 --output bench.json
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+from .stats import summarize
+from ..local_git.db import TakocLocalDb
+from ..local_git.file_io import Files, FILE_FORMAT
+from ..local_git.global_config import GlobalConfig
+from ..local_git.metadata import NamespaceMetadata, NamespacesMetadata, TableMetadata, TablesMetadata
+from ..local_git.table import TableMeta, Records, RecordPos, RecordIndex
+
+NAMESPACE = "bench"
+# The table holding all records, the other tables are empty
+TABLE = "t0"
+
+
+def record_data(i: int) -> dict:
+    """Synthetic record of a few hundred bytes"""
+    return {
+        "id": i,
+        "name": f"record {i}",
+        "owner": f"owner-{i % 97}",
+        "value": i * 1.5,
+        "active": i % 3 == 0,
+        "tags": [f"tag-{i % 7}", f"tag-{i % 11}"],
+        "note": f"Synthetic note for record {i}, long enough to look like a description.",
+    }
+
+
+def generate_repo(root: Path, format: FILE_FORMAT, records: int, tables: int) -> None:
+    """Write a synthetic repository directly, without the O(n) index rewrite per created record
+
+    Args:
+        root: Database root directory
+        format: Format of every file
+        records: Number of records in the first table
+        tables: Number of tables in the namespace
+    """
+    GlobalConfig(default_format=format).save(Files(dir=root, read_only=False, format=format))
+
+    metadata_files = Files(dir=root / "takoc", read_only=False, format=format)
+    metadata_files.write_file("namespaces", NamespacesMetadata(
+        namespaces=[NamespaceMetadata(name=NAMESPACE, path=NAMESPACE)]).model_dump())
+    metadata_files.write_file(f"{NAMESPACE}_tables", TablesMetadata(
+        tables=[TableMetadata(name=f"t{i}", path=f"t{i}") for i in range(tables)]).model_dump())
+
+    for i in range(tables):
+        table_files = Files(dir=root / NAMESPACE / f"t{i}", read_only=False, format=format)
+        table_files.write_file("takoc", TableMeta(records_format=format).model_dump())
+        count = records if i == 0 else 0
+        for j in range(count):
+            table_files.write_file(f"r{j}", record_data(j))
+        table_files.write_file("records", Records(
+            records=[RecordPos(id=f"r{j}", file=f"r{j}") for j in range(count)]).model_dump())
+
+
+def measure(operation: Callable[[], Any], ops: int, memory_ops: int) -> dict:
+    """Measure an operation
+
+    Latencies are measured without tracing, peak memory is measured in a second, shorter traced pass.
+
+    Args:
+        operation: Operation to run
+        ops: Number of timed runs
+        memory_ops: Number of runs traced for peak memory
+
+    Returns:
+        Summary of the runs
+    """
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(ops):
+        op_start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - op_start)
+    result = summarize(latencies, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        for _ in range(memory_ops):
+            operation()
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def retained_bytes_per_record(files: Files, parse: Callable[[Any], Any], records: int) -> float:
+    """Measure the memory kept by a parsed records file, divided by the number of records
+
+    The raw file content is released before measuring, so only the parsed form and what it references are counted.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        data = files.read_file("records")
+        parsed = parse(data)
+        if isinstance(parsed, RecordIndex) and records > 0:
+            # Build the lookup table, it is part of a cached index after the first lookup
+            parsed.file_of("r0")
+        del data
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del parsed
+    return retained / records if records else 0.0
+
+
+def run_case(format: FILE_FORMAT, records: int, tables: int, ops: int, seed: int) -> list[dict]:
+    """Benchmark every operation on one synthetic repository
+
+    Returns:
+        One result per operation
+    """
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix="takoc-bench-") as tmp_dir:
+        root = Path(tmp_dir)
+        generate_start = time.perf_counter()
+        generate_repo(root, format, records, tables)
+        generate_seconds = time.perf_counter() - generate_start
+        index_files = Files(dir=root / NAMESPACE / TABLE, read_only=True, format=format)
+        memory = {
+            "index_bytes_per_record": retained_bytes_per_record(index_files, RecordIndex.parse, records),
+            "model_bytes_per_record": retained_bytes_per_record(index_files, Records.parse, records),
+        }
+
+        db = TakocLocalDb(db_root=tmp_dir)
+        table = db.load_namespace(NAMESPACE).load_table(TABLE)
+        created = iter(range(records, records + 2 * ops + 2))
+
+        operations: dict[str, Callable[[], Any]] = {
+            "metadata_get_table": lambda: db.metadata.get_table(NAMESPACE, f"t{rng.randrange(tables)}"),
+            "load_table": lambda: db.load_namespace(NAMESPACE).load_table(TABLE),
+            "list_records": lambda: table.list_records(),
+            "list_records_cold": lambda: TakocLocalDb(db_root=tmp_dir).load_namespace(NAMESPACE)
+            .load_table(TABLE).list_records(),
+        }
+        if records > 0:
+            operations["get_record"] = lambda: table.get_record(f"r{rng.randrange(records)}")
+        # Mutating operations last, they grow the table
+        operations["create_record"] = lambda: table.create_record(f"r{next(created)}", record_data(0))
+
+        results = []
+        for name, operation in operations.items():
+            # Cold operations and writes are expensive at scale, run fewer of them
+            cached = name in ("metadata_get_table", "load_table", "list_records", "get_record")
+            count = ops if cached else max(1, ops // 10)
+            if cached:
+                # Fill the cache first, the cold path is measured by its own operation
+                operation()
+            result = measure(operation, count, memory_ops=max(1, min(count, 20)))
+            results.append({"operation": name, "format": format, "records": records, "tables": tables,
+                            "generate_seconds": generate_seconds, **memory, **result})
+        return results
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(prog="src.bench.local_git", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 10000], help="Records per table")
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 1000], help="Tables per namespace")
+    parser.add_argument("--formats", nargs="+", choices=["yaml", "json"], default=["yaml", "json"])
+    parser.add_argument("--ops", type=int, default=200, help="Timed runs of the cheap operations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for format in args.formats:
+        for records in args.records:
+            for tables in args.tables:
+                case = run_case(format, records, tables, args.ops, args.seed)
+                print(f"{format:4} records={records:<7} tables={tables:<5} index memory "
+                      f"{case[0]['index_bytes_per_record']:.1f} B/record "
+                      f"(pydantic models {case[0]['model_bytes_per_record']:.1f} B/record)", file=sys.stderr)
+                for result in case:
+                    results.append(result)
+                    print(f"{result['format']:4} records={result['records']:<7} tables={result['tables']:<5} "
+                          f"{result['operation']:20} {result['throughput']:10.1f} ops/s "
+                          f"p50={result['p50_ms']:8.3f}ms p95={result['p95_ms']:8.3f}ms "
+                          f"p99={result['p99_ms']:8.3f}ms peak={result['peak_memory_bytes'] / 1024:8.1f}KiB",
+                          file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import math
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Get a percentile with the nearest-rank method
+
+    Args:
+        sorted_values: Values in ascending order
+        q: Percentile between 0 and 100
+
+    Returns:
+        The percentile, 0 if there are no values
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict:
+    """Summarize the latencies of a run
+
+    Args:
+        latencies: Latency of every operation in seconds
+        elapsed: Wall time of the run in seconds
+
+    Returns:
+        Operation count, throughput in operations per second and latency percentiles in milliseconds
+    """
+    values = sorted(latencies)
+    return {
+        "ops": len(values),
+        "throughput": len(values) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
@@ -0,0 +1,21 @@
+import pytest
+
+from .http_load import main, parse_mix
+
+
+def test_parse_mix():
+    """Test route mix parsing"""
+    assert parse_mix("get=70, list=10,create") == {"get": 70, "list": 10, "create": 1}
+    with pytest.raises(ValueError):
+        parse_mix("unknown=1")
+
+
+def test_mixed_load_has_no_errors():
+    """Test a short mixed read/write load against a local server"""
+    report = main(["--records", "20", "--concurrency", "4", "--duration", "0.5", "--format", "json",
+                   "--mix", "get=4,list=1,create=2,update=2,tables=1,namespaces=1"])
+
+    assert len(report["routes"]) == 6
+    for route, result in report["routes"].items():
+        assert result["ops"] > 0, route
+        assert result["errors"] == 0, route
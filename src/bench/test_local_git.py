@@ -0,0 +1,32 @@
+import json
+import tempfile
+from pathlib import Path
+
+from .local_git import generate_repo, main, NAMESPACE, TABLE
+from ..local_git.db import TakocLocalDb
+
+
+def test_generate_repo():
+    """Test the synthetic repository is readable by the store"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        generate_repo(Path(tmp_dir), "json", records=5, tables=3)
+        db = TakocLocalDb(db_root=tmp_dir)
+        assert db.global_config.default_format == "json"
+        assert len(db.load_namespace(NAMESPACE).list_tables()) == 3
+        table = db.load_namespace(NAMESPACE).load_table(TABLE)
+        assert len(table.list_records()) == 5
+        assert table.get_record("r3")["id"] == 3
+
+
+def test_main_writes_results():
+    """Test a tiny benchmark run emits one result per operation and format"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        output = Path(tmp_dir) / "bench.json"
+        main(["--records", "5", "--tables", "2", "--ops", "3", "--output", str(output)])
+
+        report = json.loads(output.read_text())
+        operations = {(r["format"], r["operation"]) for r in report["results"]}
+        assert ("yaml", "get_record") in operations
+        assert ("json", "create_record") in operations
+        assert all(r["p99_ms"] >= r["p50_ms"] for r in report["results"])
+        assert all(r["index_bytes_per_record"] < r["model_bytes_per_record"] for r in report["results"])
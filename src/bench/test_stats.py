@@ -0,0 +1,19 @@
+from .stats import percentile, summarize
+
+
+def test_percentile():
+    """Test nearest-rank percentiles"""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([], 50) == 0.0
+
+
+def test_summarize():
+    """Test run summary"""
+    summary = summarize([0.002, 0.001, 0.003, 0.004], elapsed=0.5)
+    assert summary["ops"] == 4
+    assert summary["throughput"] == 8.0
+    assert summary["p50_ms"] == 2.0
+    assert summary["max_ms"] == 4.0
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+
+class _Written:
+    """Entry value of a file written by takoc and not parsed yet"""
+
+
+class FileCache:
+    """
+    Cache of parsed file contents.
+
+    Every entry remembers the modification time and size of the file it was parsed from,
+    a lookup with a different stat is a miss, so files edited outside takoc are parsed again.
+    Files written by takoc are remembered the same way until they are parsed, see `mark_written`.
+    Cached values are shared and must not be mutated.
+
+    Readers take the cache `version` before the stat and pass it to `put`, which is then skipped if the entry changed in
+    between, so a reader never replaces the entry of a newer write with the value of the file it read before.
+    """
+
+    # Bump when the cached values change shape, older snapshots are ignored
+    FORMAT_VERSION = 4
+
+    # Files edited outside takoc less than this before a reader puts their value are not cached: the kernel stamps
+    # files with a coarse clock, so a second edit within the same tick and of the same size would leave the stat as is
+    RACY_NS = 20_000_000
+
+    def __init__(self, max_entries: int | None = None):
+        """Initialize cache
+
+        Args:
+            max_entries: Evict the least recently used entries above this size, unbounded if None
+        """
+        # (modification time, size, value, version of the change), the value of an invalidated file is None
+        self._entries: OrderedDict[str, tuple[int, int, Any, int]] = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._version = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def max_entries(self) -> int | None:
+        """Get the maximum number of entries, None if unbounded"""
+        return self._max_entries
+
+    @staticmethod
+    def _key(file: Path) -> str:
+        return os.path.abspath(file)
+
+    def version(self) -> int:
+        """Get the version of the cache, increased by every change of an entry
+
+        Returns:
+            Version to pass to `put` by a reader, taken before the stat of the file
+        """
+        return self._version
+
+    def get(self, file: Path, stat: os.stat_result) -> Any:
+        """Get the cached value of a file
+
+        Args:
+            file: File path
+            stat: Current stat of the file
+
+        Returns:
+            Cached value, None if missing or stale
+        """
+        key = self._key(file)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size or isinstance(entry[2], _Written):
+            return None
+        if self._max_entries is not None:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+        return entry[2]
+
+    def put(self, file: Path, stat: os.stat_result, value: Any, version: int | None = None) -> None:
+        """Cache the value of a file
+
+        Args:
+            file: File path
+            stat: Stat of the file taken before it was parsed
+            value: Parsed value
+            version: Cache `version` taken by a reader before the stat, the value is not cached if the entry changed
+                since or if the file was edited too recently to tell a later edit apart; None for writers, which hold
+                the lock of the file
+        """
+        key = self._key(file)
+        with self._lock:
+            if version is not None:
+                entry = self._entries.get(key)
+                if entry is not None and entry[3] > version:
+                    return
+                # Files written by takoc are replaced by their writers, which update the entry
+                written = (entry is not None and isinstance(entry[2], _Written)
+                           and entry[:2] == (stat.st_mtime_ns, stat.st_size))
+                if not written and time.time_ns() - stat.st_mtime_ns < self.RACY_NS:
+                    return
+            self._set(key, (stat.st_mtime_ns, stat.st_size, value))
+
+    def _set(self, key: str, entry: tuple[int, int, Any]) -> None:
+        """Replace an entry, must be called with the lock held"""
+        self._version += 1
+        self._entries[key] = (*entry, self._version)
+        if self._max_entries is not None:
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def mark_written(self, file: Path, stat: os.stat_result) -> None:
+        """Remember a file has just been written by takoc, replacing its cached value
+
+        Args:
+            file: File path
+            stat: Stat of the file after it was written
+        """
+        self.put(file, stat, _Written())
+
+    def is_written(self, file: Path, stat: os.stat_result) -> bool:
+        """Whether a file is unchanged since takoc wrote it, and not parsed since
+
+        Args:
+            file: File path
+            stat: Current stat of the file
+        """
+        entry = self._entries.get(self._key(file))
+        return (entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size
+                and isinstance(entry[2], _Written))
+
+    def invalidate(self, file: Path) -> None:
+        """Drop the cached value of a file
+
+        The entry is kept without value, so a reader of the previous content does not cache it again.
+
+        Args:
+            file: File path
+        """
+        with self._lock:
+            self._set(self._key(file), (-1, -1, None))
+
+    def save(self, file: Path) -> None:
+        """Write all entries to a snapshot file
+
+        Args:
+            file: Snapshot file path
+        """
+        import pickle
+        with self._lock:
+            snapshot = {"version": self.FORMAT_VERSION,
+                        "entries": {key: entry[:3] for key, entry in self._entries.items() if entry[2] is not None}}
+        file.parent.mkdir(parents=True, exist_ok=True)
+        # Replace atomically, a concurrent loader never sees a partial snapshot
+        tmp_file = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, file)
+
+    def load(self, file: Path) -> bool:
+        """Load entries from a snapshot file
+
+        Entries are validated lazily against the file stat on lookup.
+
+        Args:
+            file: Snapshot file path
+
+        Returns:
+            True if the snapshot has been loaded
+        """
+        import pickle
+        try:
+            with open(file, "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return False
+        if not isinstance(snapshot, dict) or snapshot.get("version") != self.FORMAT_VERSION:
+            return False
+        with self._lock:
+            # Older than any version taken by a reader of this process
+            self._entries.update((key, (*entry, 0)) for key, entry in snapshot["entries"].items())
+            while self._max_entries is not None and len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return True
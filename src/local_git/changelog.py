@@ -0,0 +1,220 @@
+"""
+Per-table sequence log of the record mutations, for consumers re-syncing with `changes since token`.
+
+The log is the `changes.log` file next to the records file. Its first line is a JSON header, every other line is one
+mutation: `<seq> <u|d> <JSON encoded record ID>`. Mutations are appended, so logging one costs one small write
+whatever the size of the table. When the file has doubled since it was last compacted, it is rewritten with only the
+latest entry of every record, and the oldest deletions beyond `MAX_TOMBSTONES` are forgotten: tokens older than the
+forgotten deletions are expired and their consumers must re-sync fully.
+
+A token is `<epoch>:<seq>`. The epoch is drawn when the log is created, so tokens of a deleted or replaced log expire.
+"""
+import bisect
+import json
+import os
+import secrets
+from pathlib import Path
+from typing import Iterable, Literal
+
+from .cache import FileCache
+from ..api.error import TokenExpiredError
+
+LOG_OP = Literal["u", "d"]
+# Size below which the log is never compacted
+COMPACT_MIN_BYTES = 1024 * 1024
+# Deletions kept by a compaction, at least as many as the records of the table
+MAX_TOMBSTONES = 10000
+# Bytes read from the end of the log to find the last sequence number
+TAIL_BYTES = 4096
+
+
+class ChangeLogState:
+    """Parsed change log, shared with the cache and never mutated"""
+
+    __slots__ = ("epoch", "horizon", "seq", "size", "_seqs", "_entries")
+
+    def __init__(self, epoch: str, horizon: int, seq: int, size: int, entries: list[tuple[int, LOG_OP, str]]):
+        """Initialize state
+
+        Args:
+            epoch: Epoch of the tokens
+            horizon: Tokens before this sequence number are expired
+            seq: Last sequence number
+            size: Size of the entries after the last compaction
+            entries: Latest (seq, op, record ID) of every record, by sequence number
+        """
+        self.epoch = epoch
+        self.horizon = horizon
+        self.seq = seq
+        self.size = size
+        self._entries = entries
+        self._seqs = [entry[0] for entry in entries]
+
+    @classmethod
+    def parse(cls, content: bytes) -> "ChangeLogState":
+        """Parse a change log, skipping incomplete or malformed lines
+
+        Raises:
+            ValueError: Invalid header
+        """
+        lines = content.split(b"\n")
+        header = json.loads(lines[0])
+        latest: dict[str, tuple[int, LOG_OP]] = {}
+        seq = header["seq"]
+        # The last element is empty, or an incomplete line being written
+        for line in lines[1:-1]:
+            try:
+                seq_text, op, record_id = line.split(b" ", 2)
+                entry_seq = int(seq_text)
+                latest[json.loads(record_id)] = (entry_seq, op.decode())
+                seq = max(seq, entry_seq)
+            except ValueError:
+                continue
+        entries = sorted((entry_seq, op, record_id) for record_id, (entry_seq, op) in latest.items())
+        return cls(header["epoch"], header["horizon"], seq, header["size"], entries)
+
+    @property
+    def token(self) -> str:
+        """Token of the current state"""
+        return f"{self.epoch}:{self.seq}"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def since(self, token: str) -> tuple[list[str], list[str]]:
+        """Get the records changed after a token, in O(changes)
+
+        Args:
+            token: Token of a previous state, empty for every record
+
+        Returns:
+            Tuple of (upserted record IDs, deleted record IDs), in order of their last change
+
+        Raises:
+            TokenExpiredError: The token is older than the log or from another epoch
+            ValueError: Malformed token
+        """
+        if token == "":
+            seq = 0
+        else:
+            epoch, _, seq_text = token.partition(":")
+            if not seq_text.isdigit():
+                raise ValueError(f"Invalid change token '{token}'")
+            seq = int(seq_text)
+            if epoch != self.epoch or seq > self.seq:
+                raise TokenExpiredError(f"Change token '{token}' is from another change log, re-sync fully")
+            if seq < self.horizon:
+                raise TokenExpiredError(f"Change token '{token}' has expired, re-sync fully")
+        upserted, deleted = [], []
+        for _, op, record_id in self._entries[bisect.bisect_right(self._seqs, seq):]:
+            (upserted if op == "u" else deleted).append(record_id)
+        return upserted, deleted
+
+    def compacted(self) -> bytes:
+        """Get the content of the compacted log"""
+        tombstones = [entry for entry in self._entries if entry[1] == "d"]
+        drop = len(tombstones) - max(MAX_TOMBSTONES, len(self._entries) - len(tombstones))
+        horizon = tombstones[drop - 1][0] if drop > 0 else self.horizon
+        dropped = {entry[2] for entry in tombstones[:max(drop, 0)]}
+        body = b"".join(_line(seq, op, record_id) for seq, op, record_id in self._entries
+                        if not (op == "d" and record_id in dropped))
+        header = {"epoch": self.epoch, "horizon": horizon, "seq": self.seq}
+        return _header(header, len(body)) + body
+
+
+def _line(seq: int, op: LOG_OP, record_id: str) -> bytes:
+    return f"{seq} {op} {json.dumps(record_id, ensure_ascii=False)}\n".encode("utf-8")
+
+
+def _header(header: dict, body_size: int) -> bytes:
+    return json.dumps({**header, "size": body_size}).encode("utf-8") + b"\n"
+
+
+class ChangeLog:
+    """Change log of one table, appended and compacted under the table lock"""
+
+    FILE_NAME = "changes.log"
+
+    def __init__(self, dir: Path, cache: FileCache | None = None):
+        """Initialize change log
+
+        Args:
+            dir: Directory of the records file
+            cache: Cache of the parsed log
+        """
+        self._path = dir / self.FILE_NAME
+        self._cache = cache
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def exists(self) -> bool:
+        return self._path.exists()
+
+    def create(self, record_ids: Iterable[str]) -> None:
+        """Create the log with a new epoch, every record upserted once"""
+        body = b"".join(_line(seq, "u", record_id) for seq, record_id in enumerate(record_ids, start=1))
+        seq = body.count(b"\n")
+        self._write(_header({"epoch": secrets.token_hex(8), "horizon": 0, "seq": seq}, len(body)) + body)
+
+    def append(self, changes: list[tuple[LOG_OP, str]]) -> str:
+        """Log mutations, the log must exist
+
+        Args:
+            changes: (op, record ID) pairs, 'u' for a created or updated record and 'd' for a deleted one
+
+        Returns:
+            Token after the mutations
+        """
+        with open(self._path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            header, seq, complete = self._tail(f, size)
+            content = b"" if complete else b"\n"
+            content += b"".join(_line(seq + i, op, record_id) for i, (op, record_id) in enumerate(changes, start=1))
+            f.write(content)
+        if size + len(content) > max(COMPACT_MIN_BYTES, 2 * header["size"]):
+            self._write(self.read().compacted())
+        return f"{header['epoch']}:{seq + len(changes)}"
+
+    @staticmethod
+    def _tail(f, size: int) -> tuple[dict, int, bool]:
+        """Read the header, the last sequence number and whether the file ends with a complete line"""
+        f.seek(0)
+        header = json.loads(f.readline())
+        start = max(0, size - TAIL_BYTES)
+        f.seek(start)
+        tail = f.read()
+        lines = tail.split(b"\n")
+        # Skip the incomplete last line, and the first one if the tail starts in the middle of a line
+        for line in reversed(lines[1 if start > 0 else 0:-1]):
+            seq_text = line.split(b" ", 1)[0]
+            if seq_text.isdigit():
+                return header, int(seq_text), tail.endswith(b"\n")
+        return header, header["seq"], tail.endswith(b"\n")
+
+    def read(self) -> ChangeLogState:
+        """Read the log, through the cache
+
+        Raises:
+            FileNotFoundError: No log
+        """
+        version = self._cache.version() if self._cache is not None else None
+        stat = os.stat(self._path)
+        state = self._cache.get(self._path, stat) if self._cache is not None else None
+        if state is None:
+            with open(self._path, "rb") as f:
+                state = ChangeLogState.parse(f.read())
+            if self._cache is not None:
+                self._cache.put(self._path, stat, state, version)
+        return state
+
+    def _write(self, content: bytes) -> None:
+        tmp_file = self._path.with_name(f".{self._path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_file, "wb") as f:
+                f.write(content)
+            os.replace(tmp_file, self._path)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
@@ -0,0 +1,255 @@
+"""
+Columnar copy of the scalar fields of a table, to evaluate aggregations with NumPy.
+
+Every scalar field, see `aggregate.flatten`, is a column of three arrays: its numbers, as int64 while the field holds
+only integers and as float64 once it holds a float, a mask of the rows holding a number, and its strings and booleans
+as codes into the list of their distinct values, -1 elsewhere. Rows are the records in index
+order, then the records created since; a deleted record keeps its row, skipped through the `live` mask, until more
+than half of the rows are deleted.
+
+The columns of a table are built on its first aggregation and kept in memory by the database. The writes of the store
+update them in place, in O(fields) per record, and they are built again when the records file is changed outside of
+the store, e.g. by a git pull.
+
+NumPy is an optional dependency, installed with the `analytics` extra.
+"""
+import threading
+from typing import Any, Iterable
+
+import numpy as np
+
+from ..api.aggregate import Filter, Metric, OPERATORS, flatten, group_order, kind, metric_name, number
+from ..api.v1 import AggregateRowData
+
+INITIAL_CAPACITY = 1024
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class Column:
+    """Values of one field, numbers and distinct strings or booleans"""
+
+    __slots__ = ("numbers", "present", "codes", "categories", "_codes_of")
+
+    def __init__(self, capacity: int):
+        self.numbers = np.zeros(capacity, dtype=np.int64)
+        self.present = np.zeros(capacity, dtype=bool)
+        self.codes = np.full(capacity, -1, dtype=np.int32)
+        self.categories: list[Any] = []
+        self._codes_of: dict[tuple[int, Any], int] = {}
+
+    def set(self, row: int, value: Any) -> None:
+        if kind(value) == 2:
+            if self.numbers.dtype == np.int64 and (isinstance(value, float) or not INT64_MIN <= value <= INT64_MAX):
+                # Mixed types, integers beyond 2**53 lose their precision from then on
+                self.numbers = self.numbers.astype(np.float64)
+            self.numbers[row] = value
+            self.present[row] = True
+            self.codes[row] = -1
+        else:
+            key = (kind(value), value)
+            code = self._codes_of.get(key)
+            if code is None:
+                code = self._codes_of[key] = len(self.categories)
+                self.categories.append(value)
+            self.codes[row] = code
+            self.present[row] = False
+
+    def clear(self, row: int) -> None:
+        self.present[row] = False
+        self.codes[row] = -1
+
+    def take(self, rows: np.ndarray, capacity: int) -> None:
+        """Keep only some rows, in a new capacity"""
+        numbers = np.zeros(capacity, dtype=self.numbers.dtype)
+        present = np.zeros(capacity, dtype=bool)
+        codes = np.full(capacity, -1, dtype=np.int32)
+        numbers[:len(rows)] = self.numbers[rows]
+        present[:len(rows)] = self.present[rows]
+        codes[:len(rows)] = self.codes[rows]
+        self.numbers, self.present, self.codes = numbers, present, codes
+
+
+class TableColumns:
+    """Columns of one table, updated and queried under their own lock"""
+
+    def __init__(self, version: tuple | None):
+        """Initialize empty columns
+
+        Args:
+            version: Version of the records file the columns are built from
+        """
+        self.version = version
+        self._lock = threading.Lock()
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._capacity = INITIAL_CAPACITY
+        self._live = np.zeros(self._capacity, dtype=bool)
+        self._columns: dict[str, Column] = {}
+        self._deleted = 0
+
+    @classmethod
+    def build(cls, records: Iterable[tuple[str, Any]], version: tuple | None) -> "TableColumns":
+        """Build the columns of records
+
+        Args:
+            records: (record ID, data) pairs
+            version: Version of the records file
+        """
+        columns = cls(version)
+        columns.apply(records)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _column(self, field: str) -> Column:
+        column = self._columns.get(field)
+        if column is None:
+            column = self._columns[field] = Column(self._capacity)
+        return column
+
+    def _append(self, record_id: str) -> int:
+        row = len(self._ids)
+        if row == self._capacity:
+            self._resize(np.arange(row), 2 * self._capacity)
+        self._ids.append(record_id)
+        self._rows[record_id] = row
+        self._live[row] = True
+        return row
+
+    def _resize(self, rows: np.ndarray, capacity: int) -> None:
+        """Keep only some rows, in a new capacity"""
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(rows)] = self._live[rows]
+        self._live = live
+        for column in self._columns.values():
+            column.take(rows, capacity)
+        self._capacity = capacity
+
+    def apply(self, changes: Iterable[tuple[str, Any]]) -> None:
+        """Update the rows of written records
+
+        Args:
+            changes: (record ID, data) pairs, data is None for a deleted record
+        """
+        with self._lock:
+            for record_id, data in changes:
+                row = self._rows.get(record_id)
+                if data is None:
+                    if row is not None:
+                        del self._rows[record_id]
+                        self._live[row] = False
+                        self._deleted += 1
+                    continue
+                if row is None:
+                    row = self._append(record_id)
+                else:
+                    for column in self._columns.values():
+                        column.clear(row)
+                for field, value in flatten(data).items():
+                    self._column(field).set(row, value)
+            if self._deleted > INITIAL_CAPACITY and 2 * self._deleted > len(self._ids):
+                self._compact()
+
+    def _compact(self) -> None:
+        """Drop the rows of the deleted records"""
+        rows = np.flatnonzero(self._live[:len(self._ids)])
+        self._ids = [self._ids[row] for row in rows.tolist()]
+        self._rows = {record_id: row for row, record_id in enumerate(self._ids)}
+        self._resize(rows, max(INITIAL_CAPACITY, 2 * len(rows)))
+        self._deleted = 0
+
+    def _filter(self, field: str, op: str, value: Any, size: int) -> np.ndarray:
+        column = self._columns.get(field)
+        if value is None:
+            present = np.zeros(size, dtype=bool) if column is None else \
+                column.present[:size] | (column.codes[:size] >= 0)
+            return ~present if op == "=" else present
+        if column is None:
+            return np.zeros(size, dtype=bool)
+        if kind(value) == 2:
+            return OPERATORS[op](column.numbers[:size], value) & column.present[:size]
+        # Strings and booleans are compared once per distinct value, the missing code -1 takes the last False
+        allowed = np.array([kind(category) == kind(value) and OPERATORS[op](category, value)
+                            for category in column.categories] + [False], dtype=bool)
+        return allowed[column.codes[:size]]
+
+    def _group_key(self, field: str, rows: np.ndarray) -> tuple[np.ndarray, list[Any]]:
+        """Get the group codes of rows for a field, 0 for missing values, and the value of every code"""
+        key = np.zeros(len(rows), dtype=np.int64)
+        column = self._columns.get(field)
+        if column is None:
+            return key, [None]
+        has_number = column.present[rows]
+        distinct, inverse = np.unique(column.numbers[rows][has_number], return_inverse=True)
+        key[has_number] = inverse.reshape(-1) + 1
+        codes = column.codes[rows]
+        has_code = codes >= 0
+        key[has_code] = len(distinct) + 1 + codes[has_code]
+        return key, [None] + [number(value) for value in distinct.tolist()] + column.categories
+
+    def aggregate(self, group_by: list[str], metrics: list[Metric], filters: list[Filter]) -> list[AggregateRowData]:
+        """Aggregate the rows, with the same results as `aggregate.aggregate_records`"""
+        with self._lock:
+            size = len(self._ids)
+            mask = self._live[:size].copy()
+            for field, op, value in filters:
+                mask &= self._filter(field, op, value, size)
+            rows = np.flatnonzero(mask)
+
+            if group_by:
+                keys, decoders = zip(*(self._group_key(field, rows) for field in group_by))
+                if len(rows):
+                    distinct, group_ids = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True)
+                    group_ids = group_ids.reshape(-1)
+                else:
+                    distinct, group_ids = np.zeros((0, len(group_by)), dtype=np.int64), np.zeros(0, dtype=np.int64)
+                group_keys = [tuple(decoder[code] for decoder, code in zip(decoders, key))
+                              for key in distinct.tolist()]
+            else:
+                group_ids = np.zeros(len(rows), dtype=np.int64)
+                group_keys = [()]
+
+            groups = len(group_keys)
+            counts = np.bincount(group_ids, minlength=groups).tolist()
+            results: list[dict[str, Any]] = [{} for _ in range(groups)]
+            for metric in metrics:
+                for result, value in zip(results, self._metric(metric, rows, group_ids, groups, counts)):
+                    result[metric_name(metric)] = value
+
+        order = sorted(range(groups), key=lambda i: group_order(group_keys[i]))
+        return [AggregateRowData(group=dict(zip(group_by, group_keys[i])), values=results[i]) for i in order]
+
+    def _metric(self, metric: Metric, rows: np.ndarray, group_ids: np.ndarray, groups: int,
+                counts: list[int]) -> list[Any]:
+        func, field = metric
+        if func == "count":
+            return counts
+        column = self._columns.get(field)
+        if column is None:
+            return [None] * groups
+        valid = column.present[rows]
+        ids, numbers = group_ids[valid], column.numbers[rows][valid]
+        found = np.bincount(ids, minlength=groups)
+        if func in ("sum", "mean"):
+            if numbers.dtype != np.int64:
+                values = np.bincount(ids, weights=numbers, minlength=groups).tolist()
+            elif len(numbers) and max(-int(numbers.min()), int(numbers.max())) * len(numbers) <= INT64_MAX:
+                totals = np.zeros(groups, dtype=np.int64)
+                np.add.at(totals, ids, numbers)
+                values = totals.tolist()
+            else:
+                # The int64 sums could overflow, sum exactly in Python
+                values = [0] * groups
+                for group, value in zip(ids.tolist(), numbers.tolist()):
+                    values[group] += value
+            if func == "mean":
+                values = [value / max(n, 1) for value, n in zip(values, found.tolist())]
+        else:
+            if numbers.dtype == np.int64:
+                extremes = np.full(groups, INT64_MAX if func == "min" else INT64_MIN, dtype=np.int64)
+            else:
+                extremes = np.full(groups, np.inf if func == "min" else -np.inf)
+            (np.minimum if func == "min" else np.maximum).at(extremes, ids, numbers)
+            values = extremes.tolist()
+        return [number(value) if n else None for value, n in zip(values, found.tolist())]
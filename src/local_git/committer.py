@@ -0,0 +1,203 @@
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, ContextManager
+
+from pydantic import BaseModel
+
+from .changelog import ChangeLog
+from .db import TakocLocalDb
+from .search import SearchIndex
+from ..api.changes import CHANGE_OP
+
+logger = logging.getLogger(__name__)
+
+# Files derived from the records and rebuilt when missing, never committed: change logs, search indexes, the cache
+# snapshot and the temporary files of atomic writes
+DERIVED_FILES = (ChangeLog.FILE_NAME, SearchIndex.FILE_NAME, TakocLocalDb.SNAPSHOT_FILE, ".*.tmp")
+
+
+class ChangeData(BaseModel):
+    """A single mutation made through the store"""
+    op: CHANGE_OP
+    namespace: str
+    table: str | None = None
+    record_id: str | None = None
+    # Lock held by the writer, held again while the written paths are staged so a commit never sees half a write
+    lock: str | None = None
+    # Files or directories written by the change, the whole committed directory if empty
+    paths: list[str] = []
+
+    def describe(self) -> str:
+        """Describe the change as one line of a commit message"""
+        target = "/".join(part for part in [self.namespace, self.table, self.record_id] if part is not None)
+        return f"{self.op} {target}"
+
+
+class GitCommitter:
+    """
+    Group mutations into git commits on a background thread.
+
+    Changes are queued by the request path and committed when either `max_ops` changes are pending
+    or `max_delay` seconds have passed since the first pending change.
+    """
+
+    def __init__(self, repo_dir: Path, max_ops: int = 100, max_delay: float = 5.0):
+        """Initialize committer
+
+        Args:
+            repo_dir: Directory inside the git work tree, only files under it are committed
+            max_ops: Commit when this many changes are pending
+            max_delay: Commit when the oldest pending change is older than this many seconds
+        """
+        self._repo_dir = Path(repo_dir)
+        self._max_ops = max_ops
+        self._max_delay = max_delay
+        self._queue: queue.Queue[ChangeData | threading.Event | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock: Callable[[str], ContextManager[None]] | None = None
+
+    @property
+    def repo_dir(self) -> Path:
+        """Get the committed directory"""
+        return self._repo_dir
+
+    def start(self, lock: Callable[[str], ContextManager[None]] | None = None) -> None:
+        """Start the background thread, no-op if already started
+
+        Args:
+            lock: Get the writer lock of a key, e.g. `TakocLocalDb.lock`, held while staging the paths of a change
+        """
+        if lock is not None:
+            self._lock = lock
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="takoc-git-committer", daemon=True)
+        self._thread.start()
+
+    def add(self, change: ChangeData) -> None:
+        """Queue a change, never blocks on git
+
+        Args:
+            change: The mutation to record
+        """
+        self._queue.put(change)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Commit all pending changes now and wait for it
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the pending changes have been committed
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """Commit pending changes and stop the background thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        pending: list[ChangeData] = []
+        deadline: float | None = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if isinstance(item, ChangeData):
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self._max_delay
+                if len(pending) < self._max_ops:
+                    continue
+
+            # Timeout (False), size limit, flush or close: commit what we have
+            if pending:
+                self._commit(pending)
+                pending = []
+                deadline = None
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _commit(self, changes: list[ChangeData]) -> None:
+        """Stage the paths of the changes, except derived files, and commit them with a message listing the changes
+
+        The commit is built in a separate index, so files staged by the user, inside or outside the directory, are
+        neither committed nor unstaged.
+        """
+        # Paths by lock, each group is staged under its lock only, never holding two locks at once
+        groups: dict[str | None, list[str]] = {}
+        for change in changes:
+            groups.setdefault(change.lock if change.paths else None, []).extend(change.paths or ["."])
+        paths = list(dict.fromkeys(path for group in groups.values() for path in group))
+        excludes = [f":(exclude,glob)**/{name}" for name in DERIVED_FILES]
+        try:
+            with tempfile.TemporaryDirectory() as index_dir:
+                index = Path(index_dir) / "index"
+                env = {**os.environ, "GIT_INDEX_FILE": str(index)}
+                if self._git("rev-parse", "--verify", "-q", "HEAD", check=False).returncode == 0:
+                    # A copy of the user's index keeps the file stats, so unchanged files are not hashed again
+                    user_index = self._repo_dir / self._git("rev-parse", "--git-path", "index").stdout.strip()
+                    if user_index.exists():
+                        shutil.copyfile(user_index, index)
+                    self._git("reset", "-q", env=env)
+                for key, group in groups.items():
+                    with self._lock(key) if key is not None and self._lock is not None else nullcontext():
+                        self._stage(list(dict.fromkeys(group)), excludes, env)
+                # Nothing staged, e.g. the changes were reverted before the commit
+                if self._git("diff", "--cached", "--quiet", check=False, env=env).returncode == 0:
+                    return
+                self._git("commit", "-q", "-m", self.commit_message(changes), env=env)
+            # The committed paths are up to date in the user's index too
+            self._git("reset", "-q", "--", *paths)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error("Failed to commit %d takoc changes: %s", len(changes), e)
+
+    def _stage(self, paths: list[str], excludes: list[str], env: dict[str, str]) -> None:
+        """Stage existing paths and the removal of deleted ones"""
+        existing = [path for path in paths if (self._repo_dir / path).exists()]
+        missing = [path for path in paths if path not in existing]
+        if existing:
+            self._git("add", "-A", "--", *existing, *excludes, env=env)
+        if missing:
+            self._git("rm", "-r", "-q", "--cached", "--ignore-unmatch", "--", *missing, env=env)
+
+    def _git(self, *args: str, check: bool = True, env: dict[str, str] | None = None) -> subprocess.CompletedProcess:
+        return subprocess.run(["git", *args], cwd=self._repo_dir, check=check, capture_output=True, text=True,
+                              env=env)
+
+    @staticmethod
+    def commit_message(changes: list[ChangeData]) -> str:
+        """Build the commit message for a batch of changes
+
+        Args:
+            changes: Changes in the commit
+
+        Returns:
+            Commit message, the subject summarizes and the body lists every change
+        """
+        namespaces = list(dict.fromkeys(change.namespace for change in changes))
+        subject = f"takoc: {len(changes)} change{'s' if len(changes) > 1 else ''} in {', '.join(namespaces)}"
+        return subject + "\n\n" + "\n".join(change.describe() for change in changes)
@@ -1,22 +1,55 @@
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator
 
+from .cache import FileCache
 from .file_io import Files
 from .global_config import GlobalConfig
+from ..api.changes import CHANGE_OP, ChangeBus
+from ..api.metrics import METRICS, timed
+from ..api.tracing import TRACER
 from ..api.v1 import IDatabase, INamespace
 
+if TYPE_CHECKING:
+    # Git tooling is only loaded when auto commit is enabled
+    from .committer import GitCommitter
+
 
 class TakocLocalDb(IDatabase):
     """Local Git Database"""
 
-    def __init__(self, db_root: str = ".", read_only: bool = False):
+    SNAPSHOT_FILE = "snapshot.pickle"
+
+    def __init__(self, db_root: str = ".", read_only: bool = False, committer: "GitCommitter | None" = None,
+                 cache_dir: str | None = None, record_cache_size: int = 0, checksums: bool = False):
         """Initialize configuration manager
 
         Args:
             db_root: Git repository path, default current directory
+            committer: Optional committer to record every mutation in git
+            cache_dir: Optional directory of the warm-start snapshot, loaded here and written by `save_snapshot`
+            record_cache_size: Number of parsed record files to cache, 0 to disable the record cache
+            checksums: Create new tables with a manifest of the content hashes of their record files
         """
         from .namespaces import Namespaces
         from .metadata import Metadata
-        self._files = Files(dir=Path(db_root), read_only=read_only)
+        self._cache = FileCache()
+        self._record_cache = FileCache(max_entries=record_cache_size) if record_cache_size > 0 else None
+        self._warm_up = None
+        self._locks: dict[str, threading.RLock] = {}
+        self._locks_lock = threading.Lock()
+        self._cache_dir = Path(cache_dir) if cache_dir else None
+        if self._cache_dir is not None:
+            self._cache.load(self._cache_dir / self.SNAPSHOT_FILE)
+        self._files = Files(dir=Path(db_root), read_only=read_only, cache=self._cache)
+        self._committer = committer
+        self._checksums = checksums
+        self._changes = ChangeBus()
+        self._columns: dict[str, Any] = {}
+        if committer is not None:
+            committer.start(self.lock)
         self._global_config = GlobalConfig.load(self._files)
         self._namespaces = Namespaces(self)
         self._metadata = Metadata(self)
@@ -41,11 +74,180 @@ class TakocLocalDb(IDatabase):
         """Get read-only status"""
         return self._files.read_only
 
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """Hold the lock serializing the read-modify-write of an index file
+
+        Args:
+            key: Lock name, e.g. the table directory or 'metadata'; locks are reentrant
+        """
+        lock = self._locks.get(key)
+        if lock is None:
+            with self._locks_lock:
+                lock = self._locks.setdefault(key, threading.RLock())
+        if METRICS.enabled or TRACER.enabled:
+            start = time.perf_counter()
+            lock.acquire()
+            wait = time.perf_counter() - start
+            if METRICS.enabled:
+                METRICS.observe("takoc_lock_wait_seconds", wait)
+            if TRACER.enabled:
+                TRACER.count("lock_wait_us", int(wait * 1_000_000))
+        else:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    @property
+    def cache(self) -> FileCache:
+        """Get the cache of parsed metadata and record indexes"""
+        return self._cache
+
+    @property
+    def columns(self) -> dict[str, Any]:
+        """Get the columnar copies of the aggregated tables by records directory, see `columnar`"""
+        return self._columns
+
+    @property
+    def record_cache(self) -> FileCache | None:
+        """Get the cache of parsed record files, None if disabled"""
+        return self._record_cache
+
+    @property
+    def ready(self) -> bool:
+        """Whether the database is ready to serve, False while warming up"""
+        return self._warm_up is None or self._warm_up.done
+
+    def warm_up(self, workers: int = 8, preload_records: int = 0, background: bool = True):
+        """Load the metadata and record indexes of every table into the cache
+
+        Args:
+            workers: Number of tables loaded in parallel
+            preload_records: Number of most recently modified records per table to load into the record cache
+            background: Return immediately and run on a background thread
+
+        Returns:
+            The WarmUp instance
+        """
+        from .warmup import WarmUp
+        if self._record_cache is None:
+            preload_records = 0
+        self._warm_up = WarmUp(self, workers=workers, preload_records=preload_records)
+        if background:
+            self._warm_up.start()
+        else:
+            self._warm_up.run()
+        return self._warm_up
+
+    def save_snapshot(self) -> None:
+        """Write the parsed metadata and record indexes to the warm-start snapshot
+
+        Raises:
+            ValueError: No cache directory configured
+        """
+        if self._cache_dir is None:
+            raise ValueError("No cache directory configured for the snapshot")
+        self._cache.save(self._cache_dir / self.SNAPSHOT_FILE)
+
+    @property
+    def checksums(self) -> bool:
+        """Whether new tables are created with a manifest"""
+        return self._checksums
+
+    @property
+    def committer(self) -> "GitCommitter | None":
+        """Get the git committer, None if auto commit is disabled"""
+        return self._committer
+
+    @property
+    def changes(self) -> ChangeBus:
+        """Get the bus of change events"""
+        return self._changes
+
+    def record_change(self, op: CHANGE_OP, namespace: str, table: str | None = None,
+                      record_id: str | None = None, lock: str | None = None,
+                      paths: list[Path] | None = None) -> None:
+        """Record a mutation made through the store
+
+        Args:
+            op: Mutation type
+            namespace: Namespace name
+            table: Table name, None for namespace changes
+            record_id: Record ID, None for namespace and table changes
+            lock: Lock key held while writing, the committer holds it again while staging the paths
+            paths: Files or directories written, the whole database if None
+        """
+        if self._committer is not None:
+            from .committer import ChangeData
+            self._committer.add(ChangeData(op=op, namespace=namespace, table=table, record_id=record_id, lock=lock,
+                                           paths=[str(path) for path in paths or []]))
+        self._changes.publish(op, namespace, table, record_id)
+
+    def close(self) -> None:
+        """Commit pending changes, save the snapshot and release background resources"""
+        if self._committer is not None:
+            self._committer.close()
+        if self._cache_dir is not None:
+            self.save_snapshot()
+
+    def verify(self, checksums: bool = False) -> list[str]:
+        """Fully validate the metadata and record indexes, bypassing the cache and the trusted load path
+
+        Args:
+            checksums: Also hash the record files of the tables with a manifest and compare them
+
+        Returns:
+            Problems found, one message per invalid or unreadable file
+        """
+        from pydantic import ValidationError
+
+        from .metadata import NamespacesMetadata, TablesMetadata, ViewsMetadata
+        from .table import TableMeta, Records
+
+        problems = []
+
+        def check(files: Files, file_name: str, parse) -> Any:
+            try:
+                return parse(files.read_file(file_name))
+            except (ValidationError, ValueError, TypeError, OSError) as e:
+                problems.append(f"{files.dir / file_name}: {e}")
+                return None
+
+        metadata_files = Files(dir=self._global_config.data_dir / "takoc", read_only=True)
+        namespaces = check(metadata_files, "namespaces", NamespacesMetadata.parse)
+        check(metadata_files, "views", ViewsMetadata.parse)
+        for namespace in namespaces.namespaces if namespaces else []:
+            tables = check(metadata_files, f"{namespace.name}_tables", TablesMetadata.parse)
+            for table in tables.tables if tables else []:
+                table_dir = self._files.dir / namespace.name / table.path
+                meta = check(Files(dir=table_dir, read_only=True), "takoc",
+                             lambda data: TableMeta(**data) if data else TableMeta())
+                if meta is None:
+                    continue
+                records_dir = table_dir / meta.path if meta.path else table_dir
+                records = check(Files(dir=records_dir, read_only=True), "records", Records.parse)
+                if checksums and records is not None:
+                    table_obj = self.load_namespace(namespace.name).load_table(table.name)
+                    if not table_obj.has_manifest:
+                        continue
+                    diff = table_obj.verify()
+                    for state, record_ids in (("changed since the manifest", diff.changed),
+                                              ("has no file", diff.missing),
+                                              ("is not listed in the manifest", diff.unlisted)):
+                        problems.extend(f"{records_dir}: record '{record_id}' {state}" for record_id in record_ids)
+        return problems
+
     def save_global_config(self, global_config: GlobalConfig) -> "TakocLocalDb":
         """Save global configuration file"""
         global_config.save(self._files)
-        return TakocLocalDb(db_root=self._files.dir, read_only=self.read_only)
+        return TakocLocalDb(db_root=self._files.dir, read_only=self.read_only, committer=self._committer,
+                            cache_dir=self._cache_dir,
+                            record_cache_size=self._record_cache.max_entries if self._record_cache is not None else 0,
+                            checksums=self._checksums)
 
+    @timed("db.load_namespace")
     def load_namespace(self, namespace: str) -> INamespace | None:
         """Get table data access object for a specific namespace"""
         # Check if this is the special 'takoc' metadata namespace
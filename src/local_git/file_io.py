@@ -1,14 +1,23 @@
 import json
 import os
+import threading
 import time
 from pathlib import Path
-from typing import Any, Literal
+from typing import Any, Callable, Literal, TypeVar
 
 import yaml
 
+from .cache import FileCache
+from .manifest import content_hash
 from ..api.error import ReadOnlyError
+from ..api.metrics import METRICS, timed
+from ..api.tracing import TRACER
 
 FILE_FORMAT = Literal["yaml", "json"]
+# The libyaml emitter writes the same documents as the pure Python one, several times faster
+YAML_DUMPER = getattr(yaml, "CDumper", yaml.Dumper)
+
+T = TypeVar("T")
 
 
 class Files:
@@ -17,15 +26,17 @@ class Files:
     This class will handle the extension of files.
     """
 
-    def __init__(self, dir: Path, read_only: bool, format: FILE_FORMAT = "yaml"):
+    def __init__(self, dir: Path, read_only: bool, format: FILE_FORMAT = "yaml", cache: FileCache | None = None):
         """Initialize file manager
 
         Args:
             dir: Base directory, all file operations are based on this directory
+            cache: Cache used by `read_cached`, no caching if None
         """
         self.__dir = dir
         self.__read_only = read_only
         self.__format = format
+        self.__cache = cache
 
     @property
     def dir(self) -> Path:
@@ -42,6 +53,7 @@ class Files:
         """Get default file format"""
         return self.__format
 
+    @timed("files.file_info")
     def file_info(self, file_name: str) -> tuple[Path, FILE_FORMAT] | None:
         """Get file format
 
@@ -87,6 +99,7 @@ class Files:
             return file, "json"
         return None
 
+    @timed("files.read_file")
     def read_file(self, file_name: str) -> Any:
         """
         read the file content.
@@ -102,36 +115,150 @@ class Files:
             return None
 
         file, format = file_info
+        return self._parse(file, format)
 
+    @staticmethod
+    def _parse(file: Path, format: FILE_FORMAT) -> Any:
         with open(file, "r", encoding="utf-8") as f:
+            if METRICS.enabled or TRACER.enabled:
+                size = os.fstat(f.fileno()).st_size
+                if METRICS.enabled:
+                    METRICS.inc("takoc_bytes_read_total", size, format=format)
+                if TRACER.enabled:
+                    TRACER.count("files_read")
+                    TRACER.count("bytes_read", size)
             if format == "yaml":
                 return yaml.safe_load(f)
             elif format == "json":
                 return json.load(f)
 
-        raise ValueError(f"Unsupported file format for {file_name}")
+        raise ValueError(f"Unsupported file format for {file}")
+
+    @timed("files.read_cached")
+    def read_cached(self, file_name: str, convert: Callable[[Any], T],
+                    trusted: Callable[[Any], T] | None = None) -> T | None:
+        """
+        read the file content and convert it, the converted value is reused while the file is unchanged.
+
+        A file must always be read with the same convert function.
+        The returned value may be shared with other callers and must not be mutated.
+
+        Args:
+            file_name: file name without extension
+            convert: function to convert the parsed file content
+            trusted: function to convert the content of files unchanged since takoc wrote them, usually skipping
+                validation; `convert` is used if None
+
+        Returns:
+            converted file content, None if the file does not exist
+        """
+        file_info = self.file_info(file_name)
+        if file_info is None:
+            return None
+
+        file, format = file_info
+        if self.__cache is None:
+            return convert(self._parse(file, format))
+
+        version = self.__cache.version()
+        stat = file.stat()
+        value = self.__cache.get(file, stat)
+        if value is None:
+            if trusted is not None and self.__cache.is_written(file, stat):
+                value = trusted(self._parse(file, format))
+            else:
+                value = convert(self._parse(file, format))
+            self.__cache.put(file, stat, value, version)
+            if METRICS.enabled:
+                METRICS.inc("takoc_cache_misses_total")
+            if TRACER.enabled:
+                TRACER.count("cache_misses")
+        else:
+            if METRICS.enabled:
+                METRICS.inc("takoc_cache_hits_total")
+            if TRACER.enabled:
+                TRACER.count("cache_hits")
+        return value
+
+    @staticmethod
+    def serialize(data: Any, format: FILE_FORMAT) -> bytes:
+        """
+        serialize file content.
+
+        Args:
+            data: file content
+            format: file format
 
-    def write_file(self, file_name: str, data: Any) -> None:
+        Returns:
+            UTF-8 encoded file content
+        """
+        if format == "yaml":
+            text = yaml.dump(data, Dumper=YAML_DUMPER, default_flow_style=False, sort_keys=False, allow_unicode=True)
+        elif format == "json":
+            text = json.dumps(data, indent=2, ensure_ascii=False)
+        else:
+            raise ValueError(f"Unsupported file format: {format}")
+        return text.encode("utf-8")
+
+    @timed("files.write_file")
+    def write_file(self, file_name: str, data: Any, checksum: bool = False, cached: Any = None) -> str | None:
         """
         write the file content.
 
         Args:
             file_name: file name without extension
             data: file content
+            checksum: hash the written content
+            cached: value `read_cached` would convert the content to, cached for the written file if not None
+
+        Returns:
+            blake2b hash of the written content if `checksum`, otherwise None
+        """
+        if self.read_only:
+            raise ReadOnlyError("Read-only mode, cannot write files")
+        return self.write_content(file_name, self.serialize(data, self.format), checksum=checksum, cached=cached)
+
+    def write_content(self, file_name: str, content: bytes, checksum: bool = False, cached: Any = None) -> str | None:
+        """
+        write content already serialized in the default format, see `serialize`.
+
+        Args:
+            file_name: file name without extension
+            content: serialized file content
+            checksum: hash the written content
+            cached: value `read_cached` would convert the content to, cached for the written file if not None
+
+        Returns:
+            blake2b hash of the written content if `checksum`, otherwise None
         """
         if self.read_only:
             raise ReadOnlyError("Read-only mode, cannot write files")
 
         file = self.dir / (file_name + self.default_ext)
         os.makedirs(file.parent, exist_ok=True)
-
-        # Determine file format
-        with open(file, "w", encoding="utf-8") as f:
-            if self.format == "yaml":
-                yaml.dump(data, f, default_flow_style=False,
-                          sort_keys=False, allow_unicode=True)
-            elif self.format == "json":
-                json.dump(data, f, indent=2, ensure_ascii=False)
+        if self.__cache is not None:
+            self.__cache.invalidate(file)
+        if METRICS.enabled:
+            METRICS.inc("takoc_bytes_written_total", len(content), format=self.format)
+        if TRACER.enabled:
+            TRACER.count("files_written")
+            TRACER.count("bytes_written", len(content))
+
+        # Write a temporary file and rename it, so readers never see a partially written file
+        tmp_file = file.with_name(f".{file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_file, "wb") as f:
+                f.write(content)
+            os.replace(tmp_file, file)
+            if self.__cache is not None:
+                if cached is not None:
+                    self.__cache.put(file, file.stat(), cached)
+                else:
+                    self.__cache.mark_written(file, file.stat())
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        return content_hash(content) if checksum else None
 
     def delete_file(self, file_name: str) -> None:
         """delete the file.
@@ -145,6 +272,8 @@ class Files:
         file_info = self.file_info(file_name)
         if file_info:
             file, _ = file_info
+            if self.__cache is not None:
+                self.__cache.invalidate(file)
             if os.path.exists(file):
                 os.remove(file)
 
@@ -0,0 +1,185 @@
+"""
+Consistency check of the record indexes against the record files on disk.
+
+Tables are scanned in parallel worker processes: every worker lists a records directory with `os.scandir` and parses
+its records file, optionally parsing the record files too. Nothing is read through the caches, so the check sees the
+files exactly as they are on disk.
+"""
+import os
+from concurrent.futures import Future
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from .db import TakocLocalDb
+from .file_io import Files, FILE_FORMAT
+from .pool import process_pool
+from .table import RecordIndex, Records, Table
+
+RECORD_EXTENSIONS: dict[str, FILE_FORMAT] = {".yaml": "yaml", ".yml": "yaml", ".json": "json"}
+# Record files parsed per task with `parse_records`
+PARSE_CHUNK_SIZE = 1000
+
+
+class TableCheckData(BaseModel):
+    """Inconsistencies of one table"""
+    namespace: str
+    table: str
+    records: int = 0
+    files: int = 0
+    # Record files not referenced by the index, without extension
+    orphan_files: list[str] = []
+    # Record IDs whose file does not exist
+    missing_files: list[str] = []
+    # Record IDs listed more than once -> their files in index order
+    duplicate_ids: dict[str, list[str]] = {}
+    # Record files existing with more than one extension, without extension
+    ambiguous_files: list[str] = []
+    # Files that cannot be parsed, with the error
+    unreadable_files: list[str] = []
+    repaired: bool = False
+
+    @property
+    def clean(self) -> bool:
+        return not (self.orphan_files or self.missing_files or self.duplicate_ids or self.ambiguous_files
+                    or self.unreadable_files)
+
+
+class FsckReportData(BaseModel):
+    tables: list[TableCheckData] = []
+
+    @property
+    def clean(self) -> bool:
+        """Whether no table has inconsistencies"""
+        return all(table.clean for table in self.tables)
+
+
+def scan_table(records_dir: str) -> tuple[list[tuple[str, str]] | None, dict[str, list[str]], str | None]:
+    """List the record files of a table and parse its records file, runs in a worker process
+
+    Args:
+        records_dir: Directory of the record files
+
+    Returns:
+        Tuple of (index entries as (record ID, file name), record file names by name without extension, error of the
+        records file)
+    """
+    files: dict[str, list[str]] = {}
+    try:
+        with os.scandir(records_dir) as entries:
+            for entry in entries:
+                # Skip the temporary files of in-flight writes
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                name, ext = os.path.splitext(entry.name)
+                if ext in RECORD_EXTENSIONS and name not in Table.RESERVED_FILES:
+                    files.setdefault(name, []).append(entry.name)
+    except OSError as e:
+        return None, files, f"records directory: {e}"
+    try:
+        data = Files(dir=Path(records_dir), read_only=True).read_file("records")
+        # Keep every entry as written, the compact index cannot hold an ID twice
+        return [(record.id, record.file) for record in Records.parse(data).records], files, None
+    except Exception as e:
+        return None, files, f"records: {e}"
+
+
+def parse_files(records_dir: str, file_names: list[str]) -> list[str]:
+    """Parse record files, runs in a worker process
+
+    Returns:
+        One message per file that cannot be parsed
+    """
+    errors = []
+    for file_name in file_names:
+        file = Path(records_dir) / file_name
+        try:
+            Files._parse(file, RECORD_EXTENSIONS[file.suffix])
+        except Exception as e:
+            errors.append(f"{file_name}: {e}")
+    return errors
+
+
+def check_table(check: TableCheckData, entries: list[tuple[str, str]], files: dict[str, list[str]]) -> None:
+    """Compare the index entries of a table with its record files"""
+    check.records = len(entries)
+    check.files = sum(len(names) for names in files.values())
+    referenced = set()
+    files_by_id: dict[str, list[str]] = {}
+    for record_id, file_name in entries:
+        referenced.add(file_name)
+        files_by_id.setdefault(record_id, []).append(file_name)
+        if file_name not in files:
+            check.missing_files.append(record_id)
+    check.duplicate_ids = {record_id: names for record_id, names in files_by_id.items() if len(names) > 1}
+    check.orphan_files = sorted(name for name in files if name not in referenced)
+    check.ambiguous_files = sorted(name for name, names in files.items() if len(names) > 1)
+
+
+def rebuild_index(entries: list[tuple[str, str]], files: dict[str, list[str]]) -> RecordIndex:
+    """Build a consistent record index
+
+    Entries without a file are dropped, only the first entry of a duplicated ID is kept and unreferenced files are
+    appended with their name as ID. Files of dropped duplicates are left on disk as orphans to review.
+    """
+    referenced = {file_name for _, file_name in entries}
+    kept: dict[str, str] = {}
+    for record_id, file_name in entries:
+        if file_name in files and record_id not in kept:
+            kept[record_id] = file_name
+    for name in sorted(files):
+        if name not in referenced and name not in kept:
+            kept[name] = name
+    return RecordIndex(list(kept), {record_id: file_name for record_id, file_name in kept.items()
+                                    if file_name != record_id})
+
+
+def fsck(db: TakocLocalDb, workers: int | None = None, parse_records: bool = False, repair: bool = False,
+         namespaces: list[str] | None = None) -> FsckReportData:
+    """Check every table of the database
+
+    Args:
+        db: Database to check, the server should be stopped while repairing
+        workers: Number of worker processes, None for the shared pool of one per CPU, 0 to run in the calling process
+        parse_records: Also parse every record file
+        repair: Rewrite the record index of inconsistent tables, see `rebuild_index`, and save the statistics of
+            tables created before them
+        namespaces: Only check these namespaces
+
+    Returns:
+        One check per table
+    """
+    tables: list[tuple[TableCheckData, Table]] = []
+    for namespace in db.metadata.get_namespaces():
+        if namespaces is not None and namespace.name not in namespaces:
+            continue
+        namespace_obj = db.load_namespace(namespace.name)
+        for table in db.metadata.get_tables(namespace.name):
+            tables.append((TableCheckData(namespace=namespace.name, table=table.name),
+                           namespace_obj.load_table(table.name)))
+
+    with process_pool(workers) as executor:
+        scans = [executor.submit(scan_table, str(table.records_dir)) for _, table in tables]
+        parses: list[list[Future]] = []
+        results = []
+        for (check, table), scan in zip(tables, scans):
+            entries, files, error = scan.result()
+            results.append((entries, files))
+            if error is not None:
+                check.unreadable_files.append(error)
+            else:
+                check_table(check, entries, files)
+            file_names = sorted(name for names in files.values() for name in names) if parse_records else []
+            parses.append([executor.submit(parse_files, str(table.records_dir), file_names[i:i + PARSE_CHUNK_SIZE])
+                           for i in range(0, len(file_names), PARSE_CHUNK_SIZE)])
+
+        for (check, table), chunks, (entries, files) in zip(tables, parses, results):
+            for chunk in chunks:
+                check.unreadable_files.extend(chunk.result())
+            if repair and entries is not None and (check.orphan_files or check.missing_files or check.duplicate_ids):
+                table.replace_records(rebuild_index(entries, files))
+                check.repaired = True
+            if repair and entries is not None:
+                # Tables created before statistics get them here rather than on a read
+                table.build_stats()
+    return FsckReportData(tables=[check for check, _ in tables])
@@ -26,7 +26,7 @@ class GlobalConfig(BaseModel):
             GlobalConfig instance
         """
         config_dir = files.dir.absolute()
-        data = files.read_file("takoc")
+        data = files.read_cached("takoc", dict)
         if data:
             return cls(config_dir=config_dir, **data)
         else:
@@ -0,0 +1,464 @@
+import json
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, TypeVar
+
+import yaml
+
+from .file_io import FILE_FORMAT
+from .global_config import GlobalConfig
+from .metadata import NamespaceMetadata, NamespacesMetadata, TableMetadata, TablesMetadata, ViewMetadata, ViewsMetadata, \
+    MetadataNamespace
+from .table import TableMeta, RecordIndex
+from ..api.error import ReadOnlyError
+from ..api.v1 import IDatabase, INamespaces, INamespace, ITable, NamespaceData, NamespaceCreateRequest, \
+    NamespaceUpdateRequest, TableData, TableCreateRequest, TableUpdateRequest
+
+# Tree entries are (mode, object id), keyed by entry name
+TreeEntries = dict[str, tuple[str, str]]
+
+T = TypeVar("T")
+
+
+class GitObjects:
+    """
+    Read git objects through one long-running `git cat-file --batch` process.
+
+    Trees are immutable by object id, so parsed trees are kept in an LRU cache.
+    Blobs are read whole, records being parsed from their complete content, and are never cached.
+    """
+
+    def __init__(self, repo_dir: Path, tree_cache_size: int = 4096):
+        """Start the cat-file process
+
+        Args:
+            repo_dir: Any directory inside the git work tree
+            tree_cache_size: Maximum number of parsed trees to keep
+        """
+        self._process = subprocess.Popen(
+            ["git", "cat-file", "--batch"], cwd=repo_dir,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._lock = threading.Lock()
+        self._trees: OrderedDict[str, TreeEntries] = OrderedDict()
+        self._tree_cache_size = tree_cache_size
+
+    def close(self) -> None:
+        """Stop the cat-file process"""
+        if self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.wait()
+
+    def read(self, name: str) -> tuple[str, str, bytes] | None:
+        """Read an object
+
+        Args:
+            name: Object id or any revision expression, e.g. 'HEAD~1:data'
+
+        Returns:
+            Tuple of (object id, type, content), None if the object does not exist
+        """
+        with self._lock:
+            self._process.stdin.write(name.encode("utf-8") + b"\n")
+            self._process.stdin.flush()
+            header = self._process.stdout.readline().decode("utf-8").split()
+            if len(header) != 3:
+                # '<name> missing' or '<name> ambiguous'
+                return None
+            object_id, object_type, size = header[0], header[1], int(header[2])
+            # Buffered reads return the whole size unless the process terminated
+            content = self._process.stdout.read(size)
+            if len(content) != size:
+                raise OSError(f"git cat-file terminated while reading '{name}'")
+            # Trailing newline after the content
+            self._process.stdout.read(1)
+            return object_id, object_type, content
+
+    def tree(self, object_id: str) -> TreeEntries:
+        """Get the parsed entries of a tree
+
+        Args:
+            object_id: Tree object id
+
+        Returns:
+            Tree entries
+
+        Raises:
+            ValueError: Object is not a tree
+        """
+        with self._lock:
+            entries = self._trees.get(object_id)
+            if entries is not None:
+                self._trees.move_to_end(object_id)
+                return entries
+
+        obj = self.read(object_id)
+        if obj is None or obj[1] != "tree":
+            raise ValueError(f"Git object '{object_id}' is not a tree")
+        entries = self._parse_tree(obj[2], hash_size=len(object_id) // 2)
+
+        with self._lock:
+            self._trees[object_id] = entries
+            if len(self._trees) > self._tree_cache_size:
+                self._trees.popitem(last=False)
+        return entries
+
+    @staticmethod
+    def _parse_tree(content: bytes, hash_size: int) -> TreeEntries:
+        """Parse the binary tree format: '<mode> <name>\\0<raw object id>' repeated"""
+        entries = {}
+        pos = 0
+        while pos < len(content):
+            space = content.index(b" ", pos)
+            nul = content.index(b"\0", space)
+            mode = content[pos:space].decode("ascii")
+            name = content[space + 1:nul].decode("utf-8")
+            entries[name] = (mode, content[nul + 1:nul + 1 + hash_size].hex())
+            pos = nul + 1 + hash_size
+        return entries
+
+
+class GitTreeFiles:
+    """
+    Read-only counterpart of `Files` for a directory inside a git tree.
+
+    The file extension handling is the same as `Files`.
+    """
+
+    def __init__(self, objects: GitObjects, tree: str, format: FILE_FORMAT = "yaml"):
+        """Initialize tree file reader
+
+        Args:
+            objects: Git object reader
+            tree: Object id of the directory tree
+            format: Default file format
+        """
+        self._objects = objects
+        self._tree = tree
+        self._format = format
+
+    @property
+    def read_only(self) -> bool:
+        return True
+
+    @property
+    def format(self) -> FILE_FORMAT:
+        return self._format
+
+    def sub_dir(self, path: str, format: FILE_FORMAT | None = None) -> "GitTreeFiles | None":
+        """Get a reader for a sub directory
+
+        Args:
+            path: Relative path of the directory
+            format: Default file format, same as this reader if None
+
+        Returns:
+            Reader for the directory, None if it does not exist
+        """
+        tree = self._lookup(path, "tree")
+        if tree is None:
+            return None
+        return GitTreeFiles(self._objects, tree, format or self._format)
+
+    def _lookup(self, path: str, object_type: str) -> str | None:
+        """Find the object id of a path, walking the cached trees"""
+        tree = self._tree
+        parts = [part for part in PurePosixPath(path).parts if part not in ("", ".")]
+        for i, part in enumerate(parts):
+            entry = self._objects.tree(tree).get(part)
+            if entry is None:
+                return None
+            mode, object_id = entry
+            is_tree = mode == "40000"
+            if i < len(parts) - 1 or object_type == "tree":
+                if not is_tree:
+                    return None
+                tree = object_id
+            else:
+                return None if is_tree else object_id
+        return tree
+
+    def file_info(self, file_name: str) -> tuple[str, FILE_FORMAT] | None:
+        """Get blob id and format of a file
+
+        Args:
+            file_name: File name without extension
+
+        Returns:
+            Tuple of (blob id, format), None if not found
+        """
+        candidates: list[tuple[str, FILE_FORMAT]] = [(".yaml", "yaml"), (".yml", "yaml"), (".json", "json")]
+        if self.format == "json":
+            candidates.insert(0, (".json", "json"))
+        for ext, format in candidates:
+            if blob := self._lookup(file_name + ext, "blob"):
+                return blob, format
+        return None
+
+    def read_cached(self, file_name: str, convert: Callable[[Any], T],
+                    trusted: Callable[[Any], T] | None = None) -> T | None:
+        """Read and convert the file content, git objects never change so no stat validation is needed
+
+        Committed files may have been edited outside takoc, they are always converted with `convert`.
+        """
+        data = self.read_file(file_name)
+        return None if data is None else convert(data)
+
+    def read_file(self, file_name: str) -> Any:
+        """Read the file content
+
+        Args:
+            file_name: File name without extension
+
+        Returns:
+            File content, None if not found
+        """
+        file_info = self.file_info(file_name)
+        if file_info is None:
+            return None
+        blob, format = file_info
+        obj = self._objects.read(blob)
+        if obj is None:
+            return None
+        if format == "yaml":
+            return yaml.safe_load(obj[2])
+        return json.loads(obj[2])
+
+
+class HistoryMetadata:
+    """
+    Read-only counterpart of `Metadata` over a git tree.
+
+    Provides the read methods used by `MetadataNamespace`, all mutations raise `ReadOnlyError`.
+    """
+
+    def __init__(self, files: GitTreeFiles | None):
+        """Initialize metadata reader
+
+        Args:
+            files: Reader of the 'takoc' metadata directory, None if it does not exist at the revision
+        """
+        self._files = files
+
+    def get_namespaces(self) -> list[NamespaceMetadata]:
+        return NamespacesMetadata.parse(self._files.read_file("namespaces") if self._files else None).namespaces
+
+    def get_namespace(self, name: str) -> NamespaceMetadata | None:
+        for ns in self.get_namespaces():
+            if ns.name == name:
+                return ns
+        return None
+
+    def get_tables(self, namespace: str) -> list[TableMetadata]:
+        return TablesMetadata.parse(self._files.read_file(f"{namespace}_tables") if self._files else None).tables
+
+    def get_table(self, namespace: str, name: str) -> TableMetadata | None:
+        for table in self.get_tables(namespace):
+            if table.name == name:
+                return table
+        return None
+
+    def get_views(self) -> list[ViewMetadata]:
+        return ViewsMetadata.parse(self._files.read_file("views") if self._files else None).views
+
+    def get_view(self, namespace: str, name: str) -> ViewMetadata | None:
+        for view in self.get_views():
+            if view.namespace == namespace and view.name == name:
+                return view
+        return None
+
+    def _read_only(self, *args, **kwargs) -> None:
+        raise ReadOnlyError("Cannot modify the history of a git repository")
+
+    add_namespace = update_namespace = delete_namespace_meta = _read_only
+    add_table = update_table = delete_table = _read_only
+    put_view = delete_view = declare_view = _read_only
+
+
+class HistoryDb(IDatabase):
+    """
+    Read-only database served from a git commit.
+
+    All data is read from git objects, the working tree and the index are never touched.
+    """
+
+    def __init__(self, db_root: str = ".", rev: str = "HEAD"):
+        """Open the database at a revision
+
+        Args:
+            db_root: Database root directory inside the git work tree, same as `TakocLocalDb`
+            rev: Any git revision, e.g. a commit id, 'HEAD~1' or 'main@{yesterday}'
+
+        Raises:
+            ValueError: Database root not in a git work tree, or revision or database root not found in the repository
+        """
+        db_root = Path(db_root)
+        try:
+            prefix = subprocess.run(
+                ["git", "rev-parse", "--show-prefix"], cwd=db_root, check=True, capture_output=True, text=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise ValueError(f"Directory '{db_root}' is not in a git work tree") from e
+
+        self._objects = GitObjects(db_root)
+        root = self._objects.read(f"{rev}:{prefix}")
+        if root is None or root[1] != "tree":
+            self._objects.close()
+            raise ValueError(f"Directory '{prefix or '.'}' not found at revision '{rev}'")
+        self._rev = rev
+
+        root_files = GitTreeFiles(self._objects, root[0])
+        config_data = root_files.read_file("takoc")
+        self._global_config = GlobalConfig(config_dir=db_root.absolute(), **(config_data or {}))
+        self._data_files = root_files.sub_dir(self._global_config.data_path, self._global_config.default_format)
+
+        self._metadata = HistoryMetadata(self._data_files.sub_dir("takoc") if self._data_files else None)
+        self._namespaces = HistoryNamespaces(self._metadata)
+
+    @property
+    def rev(self) -> str:
+        """Get the revision"""
+        return self._rev
+
+    @property
+    def global_config(self) -> GlobalConfig:
+        """Get global configuration at the revision"""
+        return self._global_config
+
+    @property
+    def metadata(self) -> HistoryMetadata:
+        """Get metadata reader"""
+        return self._metadata
+
+    @property
+    def namespaces(self) -> "HistoryNamespaces":
+        return self._namespaces
+
+    @property
+    def read_only(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        """Stop the git process"""
+        self._objects.close()
+
+    def load_namespace(self, namespace: str) -> INamespace | None:
+        if namespace == "takoc":
+            return MetadataNamespace(self._metadata)
+        if not self._metadata.get_namespace(namespace):
+            return None
+        files = self._data_files.sub_dir(namespace) if self._data_files else None
+        return HistoryNamespace(self._metadata, namespace, files)
+
+
+class HistoryNamespaces(INamespaces):
+    """Read-only namespaces at a revision"""
+
+    def __init__(self, metadata: HistoryMetadata):
+        self._metadata = metadata
+
+    def list_namespaces(self) -> list[NamespaceData]:
+        return [NamespaceData(name="takoc", description="System metadata namespace")] + [
+            NamespaceData(name=ns.name, description=ns.description) for ns in self._metadata.get_namespaces()
+        ]
+
+    def get_namespace(self, namespace: str) -> NamespaceData | None:
+        if namespace == "takoc":
+            return NamespaceData(name="takoc", description="System metadata namespace")
+        ns = self._metadata.get_namespace(namespace)
+        if ns:
+            return NamespaceData(name=ns.name, description=ns.description)
+        return None
+
+    def create_namespace(self, create: NamespaceCreateRequest) -> None:
+        raise ReadOnlyError("Cannot create namespaces in the history of a git repository")
+
+    def update_namespace(self, namespace: str, update: NamespaceUpdateRequest) -> None:
+        raise ReadOnlyError("Cannot update namespaces in the history of a git repository")
+
+    def delete_namespace(self, name: str) -> None:
+        raise ReadOnlyError("Cannot delete namespaces in the history of a git repository")
+
+
+class HistoryNamespace(INamespace):
+    """Read-only namespace at a revision"""
+
+    def __init__(self, metadata: HistoryMetadata, name: str, files: GitTreeFiles | None):
+        self._metadata = metadata
+        self._name = name
+        self._files = files
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def list_tables(self) -> list[TableData]:
+        return [TableData(name=table.name, description=table.description, namespace=self._name)
+                for table in self._metadata.get_tables(self._name)]
+
+    def get_table(self, name: str) -> TableData | None:
+        table = self._metadata.get_table(self._name, name)
+        if table:
+            return TableData(name=table.name, description=table.description, namespace=self._name)
+        return None
+
+    def create_table(self, create: TableCreateRequest) -> None:
+        raise ReadOnlyError("Cannot create tables in the history of a git repository")
+
+    def update_table(self, name: str, update: TableUpdateRequest) -> None:
+        raise ReadOnlyError("Cannot update tables in the history of a git repository")
+
+    def delete_table(self, name: str) -> None:
+        raise ReadOnlyError("Cannot delete tables in the history of a git repository")
+
+    def load_table(self, table: str) -> ITable:
+        table_metadata = self._metadata.get_table(self._name, table)
+        table_files = self._files.sub_dir(table_metadata.path) if table_metadata and self._files else None
+        if table_files is None:
+            raise ValueError(f"Table '{table}' not found in namespace '{self._name}'")
+        return HistoryTable(self._name, table, table_files)
+
+
+class HistoryTable(ITable):
+    """Read-only table at a revision"""
+
+    def __init__(self, namespace: str, name: str, files: GitTreeFiles):
+        self._namespace = namespace
+        self._name = name
+        meta = TableMeta.load(files)
+        self._files = files.sub_dir(meta.path or ".", meta.records_format)
+        self._records: RecordIndex | None = None
+
+    @property
+    def namespace(self) -> str:
+        return self._namespace
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _get_records(self) -> RecordIndex:
+        if self._records is None:
+            self._records = RecordIndex.parse(self._files.read_file("records"))
+        return self._records
+
+    def list_records(self) -> list[str]:
+        return list(self._get_records().ids)
+
+    def get_record(self, record_id: str) -> Any:
+        file_name = self._get_records().file_of(record_id)
+        if file_name is not None:
+            data = self._files.read_file(file_name)
+            if data is not None:
+                return data
+        raise ValueError(f"Record '{record_id}' not found in table")
+
+    def create_record(self, record_id: str, data: Any) -> None:
+        raise ReadOnlyError("Cannot create records in the history of a git repository")
+
+    def update_record(self, record_id: str, data: Any) -> None:
+        raise ReadOnlyError("Cannot update records in the history of a git repository")
+
+    def delete_record(self, record_id: str) -> None:
+        raise ReadOnlyError("Cannot delete records in the history of a git repository")
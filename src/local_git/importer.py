@@ -0,0 +1,56 @@
+"""
+Worker side of bulk imports: parse, validate and serialize a batch of rows.
+
+Runs in worker processes, so the CPU heavy part of an import (JSON parsing, schema validation and YAML
+serialization) scales with the cores while the calling process only writes files.
+"""
+import functools
+import json
+from typing import Any, Callable
+
+from .file_io import Files, FILE_FORMAT
+from ..api.bulk_import import IMPORT_FORMAT, parse_row
+
+# Prepared row: (line number, record ID, serialized record, error); ID and content are None for rejected rows
+PreparedRow = tuple[int, str | None, bytes | None, str | None]
+
+
+@functools.lru_cache(maxsize=8)
+def _validator(schema_json: str) -> Callable[[Any], str | None]:
+    import jsonschema
+
+    schema = json.loads(schema_json)
+    validator = jsonschema.validators.validator_for(schema)(schema)
+
+    def validate(data: Any) -> str | None:
+        error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+        return error.message if error is not None else None
+
+    return validate
+
+
+def prepare_batch(rows: list[tuple[int, Any]], format: IMPORT_FORMAT, id_field: str, schema: dict | None,
+                  records_format: FILE_FORMAT) -> list[PreparedRow]:
+    """Parse, validate and serialize rows from `iter_rows`
+
+    Args:
+        rows: (line number, row) pairs
+        format: Import format
+        id_field: Member or column holding the record ID
+        schema: JSON schema of the records, no validation if None
+        records_format: Format of the record files
+
+    Returns:
+        One prepared row per row, in order
+    """
+    validate = _validator(json.dumps(schema, sort_keys=True)) if schema is not None else None
+    prepared = []
+    for line_no, row in rows:
+        try:
+            record_id, data = parse_row(row, format, id_field)
+            if validate is not None and (error := validate(data)) is not None:
+                raise ValueError(f"Record '{record_id}' does not match the schema: {error}")
+            prepared.append((line_no, record_id, Files.serialize(data, records_format), None))
+        except (ValueError, TypeError) as e:
+            prepared.append((line_no, None, None, str(e)))
+    return prepared
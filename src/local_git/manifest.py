@@ -0,0 +1,238 @@
+"""
+Content hashes of the record files of a table.
+
+The manifest is the `manifest.log` file next to the records file, a sidecar no record file can be named after. Its
+first line is a JSON header, every other line sets or removes the entry of one record file:
+`["<file>", "<hash>", <size>, <mtime_ns>]`, or `["<file>"]` once the file is deleted. Record writes append their
+line, and the file is rewritten with only the listed files once it has doubled since it was last written whole.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+
+from pydantic import BaseModel
+
+from .cache import FileCache
+
+HASH_ALGORITHM = "blake2b"
+# 128-bit digests, plenty for change detection and much shorter in the manifest than the default 512 bits
+DIGEST_SIZE = 16
+# Size below which the manifest file is never rewritten
+COMPACT_MIN_BYTES = 1024 * 1024
+
+
+def content_hash(content: bytes) -> str:
+    """Hash the content of a file"""
+    return hashlib.blake2b(content, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def file_hash(file: str | os.PathLike) -> str:
+    """Hash a file on disk"""
+    with open(file, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=DIGEST_SIZE)).hexdigest()
+
+
+class ManifestDiffData(BaseModel):
+    """Differences between the record files and the manifest, by record ID"""
+    changed: list[str] = []
+    missing: list[str] = []
+    unlisted: list[str] = []
+
+    @property
+    def clean(self) -> bool:
+        """Whether every record file matches the manifest"""
+        return not (self.changed or self.missing or self.unlisted)
+
+
+class Manifest:
+    """
+    Content hashes of the record files of a table, parsed from its `manifest.log` file.
+
+    Every entry also keeps the size and modification time of the file when it was hashed, so unchanged files are
+    recognized from their stat without reading them. Instances are shared with the cache and never mutated.
+    """
+
+    __slots__ = ("size", "_entries")
+
+    def __init__(self, entries: dict[str, tuple[str, int, int]] | None = None, size: int = 0):
+        """Initialize manifest
+
+        Args:
+            entries: Record file name without extension -> (hash, size, mtime_ns)
+            size: Size of the entries when the file was last written whole
+        """
+        self._entries = entries if entries is not None else {}
+        self.size = size
+
+    @classmethod
+    def parse(cls, content: bytes) -> "Manifest":
+        """Parse a manifest file, skipping incomplete or malformed lines
+
+        Raises:
+            ValueError: Invalid header or unsupported hash algorithm
+        """
+        lines = content.split(b"\n")
+        header = json.loads(lines[0])
+        if header.get("algorithm") != HASH_ALGORITHM:
+            raise ValueError(f"Unsupported manifest hash algorithm: {header.get('algorithm')}")
+        entries: dict[str, tuple[str, int, int]] = {}
+        # The last element is empty, or an incomplete line being written
+        for line in lines[1:-1]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if len(entry) == 4:
+                entries[entry[0]] = (entry[1], entry[2], entry[3])
+            elif len(entry) == 1:
+                entries.pop(entry[0], None)
+        return cls(entries, header["size"])
+
+    def content(self) -> bytes:
+        """Get the content of the manifest file with only the listed files"""
+        body = b"".join(_line(file_name, entry) for file_name, entry in self._entries.items())
+        return _header(len(body)) + body
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def get(self, file_name: str) -> tuple[str, int, int] | None:
+        """Get the (hash, size, mtime_ns) of a record file, None if not listed"""
+        return self._entries.get(file_name)
+
+    def updated(self, changes: dict[str, tuple[str, int, int] | None]) -> "Manifest":
+        """Get a new manifest with entries set, or removed for None"""
+        entries = dict(self._entries)
+        for file_name, entry in changes.items():
+            if entry is None:
+                entries.pop(file_name, None)
+            else:
+                entries[file_name] = entry
+        return Manifest(entries, self.size)
+
+    def matches(self, file_name: str, path: str | os.PathLike, full: bool = False) -> bool | None:
+        """Check a record file against its entry
+
+        Args:
+            file_name: Record file name without extension
+            path: Path of the record file
+            full: Hash the file even if its size and modification time are unchanged
+
+        Returns:
+            None if the file is not listed, otherwise whether its content matches
+        """
+        entry = self._entries.get(file_name)
+        if entry is None:
+            return None
+        hash, size, mtime_ns = entry
+        if not full:
+            stat = os.stat(path)
+            if stat.st_size != size:
+                return False
+            if stat.st_mtime_ns == mtime_ns:
+                return True
+        return file_hash(path) == hash
+
+
+def entry_of(hash: str, stat: os.stat_result) -> tuple[str, int, int]:
+    """Get the manifest entry of a hashed file"""
+    return hash, stat.st_size, stat.st_mtime_ns
+
+
+def _line(file_name: str, entry: tuple[str, int, int] | None) -> bytes:
+    line = [file_name, *entry] if entry is not None else [file_name]
+    return json.dumps(line, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _header(size: int) -> bytes:
+    return json.dumps({"algorithm": HASH_ALGORITHM, "size": size}).encode("utf-8") + b"\n"
+
+
+class ManifestFile:
+    """Manifest file of one table, appended and compacted under the table lock"""
+
+    FILE_NAME = "manifest.log"
+
+    def __init__(self, dir: Path, cache: FileCache | None = None):
+        """Initialize manifest file
+
+        Args:
+            dir: Directory of the records file
+            cache: Cache of the parsed manifest
+        """
+        self._path = dir / self.FILE_NAME
+        self._cache = cache
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def read(self) -> Manifest | None:
+        """Read the manifest through the cache, None if the table has no manifest
+
+        Raises:
+            ValueError: Invalid manifest file
+        """
+        version = self._cache.version() if self._cache is not None else None
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        manifest = self._cache.get(self._path, stat) if self._cache is not None else None
+        if manifest is None:
+            with open(self._path, "rb") as f:
+                manifest = Manifest.parse(f.read())
+            if self._cache is not None:
+                self._cache.put(self._path, stat, manifest, version)
+        return manifest
+
+    def write(self, manifest: Manifest) -> Manifest:
+        """Write a whole manifest
+
+        Returns:
+            Manifest as written
+        """
+        content = manifest.content()
+        # Appends are compared with the size of the entries, as recorded in the header
+        manifest = Manifest(manifest._entries, len(content) - content.index(b"\n") - 1)
+        tmp_file = self._path.with_name(f".{self._path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_file, "wb") as f:
+                f.write(content)
+            os.replace(tmp_file, self._path)
+            if self._cache is not None:
+                self._cache.put(self._path, os.stat(self._path), manifest)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        return manifest
+
+    def append(self, manifest: Manifest, changes: dict[str, tuple[str, int, int] | None]) -> Manifest:
+        """Append entries to the file of a manifest, in O(changes) until the file has doubled and is rewritten
+
+        Args:
+            manifest: Current manifest, from `read`
+            changes: Record file name -> new entry, None for a deleted file
+
+        Returns:
+            Updated manifest
+        """
+        manifest = manifest.updated(changes)
+        content = b"".join(_line(file_name, entry) for file_name, entry in changes.items())
+        with open(self._path, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    content = b"\n" + content
+            f.write(content)
+        if size + len(content) > max(COMPACT_MIN_BYTES, 2 * manifest.size):
+            return self.write(manifest)
+        if self._cache is not None:
+            self._cache.put(self._path, os.stat(self._path), manifest)
+        return manifest
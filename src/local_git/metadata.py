@@ -1,12 +1,15 @@
-from typing import Any
+from pathlib import Path
+from typing import Any, Callable
 
 from pydantic import BaseModel
 
 from .db import TakocLocalDb
 from .file_io import Files
+from ..api.changes import CHANGE_OP
 from ..api.error import ReadOnlyError
+from ..api.metrics import timed
 from ..api.v1 import INamespace, ITable, TableData, TableCreateRequest, TableUpdateRequest, NamespaceData, \
-    NamespaceCreateRequest, NamespaceUpdateRequest
+    NamespaceCreateRequest, NamespaceUpdateRequest, ViewData
 
 
 class NamespaceMetadata(BaseModel):
@@ -20,6 +23,19 @@ class NamespacesMetadata(BaseModel):
     """Namespace list class"""
     namespaces: list[NamespaceMetadata] = []
 
+    @classmethod
+    def parse(cls, data: dict | None) -> "NamespacesMetadata":
+        """Parse the content of the namespaces file"""
+        return cls(**data) if data else cls()
+
+    @classmethod
+    def parse_trusted(cls, data: dict | None) -> "NamespacesMetadata":
+        """Parse the content of a namespaces file written by takoc, without validation"""
+        if not data:
+            return cls()
+        return cls.model_construct(namespaces=[
+            NamespaceMetadata.model_construct(**namespace) for namespace in data.get("namespaces") or []])
+
 
 class TableMetadata(BaseModel):
     """Table metadata class"""
@@ -33,6 +49,50 @@ class TablesMetadata(BaseModel):
     """Table list class"""
     tables: list[TableMetadata] = []
 
+    @classmethod
+    def parse(cls, data: dict | None) -> "TablesMetadata":
+        """Parse the content of a tables file"""
+        return cls(**data) if data else cls()
+
+    @classmethod
+    def parse_trusted(cls, data: dict | None) -> "TablesMetadata":
+        """Parse the content of a tables file written by takoc, without validation"""
+        if not data:
+            return cls()
+        return cls.model_construct(tables=[TableMetadata.model_construct(**table) for table in data.get("tables") or []])
+
+
+class ViewMetadata(BaseModel):
+    """View metadata class, see `view`"""
+    namespace: str
+    name: str
+    source: str
+    filter: list[str] = []
+    fields: list[str] | None = None
+    group_by: str | None = None
+
+    @property
+    def table(self) -> str:
+        """Get the view table as '<namespace>.<table>'"""
+        return f"{self.namespace}.{self.name}"
+
+
+class ViewsMetadata(BaseModel):
+    """View list class"""
+    views: list[ViewMetadata] = []
+
+    @classmethod
+    def parse(cls, data: dict | None) -> "ViewsMetadata":
+        """Parse the content of the views file"""
+        return cls(**data) if data else cls()
+
+    @classmethod
+    def parse_trusted(cls, data: dict | None) -> "ViewsMetadata":
+        """Parse the content of a views file written by takoc, without validation"""
+        if not data:
+            return cls()
+        return cls.model_construct(views=[ViewMetadata.model_construct(**view) for view in data.get("views") or []])
+
 
 class Metadata:
     """
@@ -53,9 +113,21 @@ class Metadata:
         self._files = Files(
             dir=self.metadata_dir,
             read_only=db.read_only,
-            format=db.global_config.default_format
+            format=db.global_config.default_format,
+            cache=db.cache
         )
 
+    def _record_change(self, op: CHANGE_OP, namespace: str, table: str | None = None, record_id: str | None = None,
+                       dir: Path | None = None) -> None:
+        """Record a metadata mutation, committed with the metadata lock held while its files are staged
+
+        Args:
+            dir: Namespace or table directory created or deleted with the metadata
+        """
+        self.db.record_change(op, namespace, table, record_id, lock="metadata",
+                              paths=[self.metadata_dir] + ([dir] if dir is not None else []))
+
+    @timed("metadata.get_namespaces")
     def get_namespaces(self) -> list[NamespaceMetadata]:
         """
         Get metadata for all namespaces.
@@ -63,11 +135,11 @@ class Metadata:
         Returns:
             List of NamespaceMetadata objects.
         """
-        data = self._files.read_file("namespaces")
-        namespaces_data = NamespacesMetadata(
-            **data) if data else NamespacesMetadata()
-        return namespaces_data.namespaces
+        namespaces_data = self._files.read_cached(
+            "namespaces", NamespacesMetadata.parse, NamespacesMetadata.parse_trusted)
+        return namespaces_data.namespaces if namespaces_data else []
 
+    @timed("metadata.get_namespace")
     def get_namespace(self, name: str) -> NamespaceMetadata | None:
         """
         Get metadata for a specific namespace.
@@ -92,23 +164,25 @@ class Metadata:
             name: Namespace name
             description: Namespace description
         """
-        # Load existing namespaces
-        data = self._files.read_file("namespaces")
-        namespaces_data = NamespacesMetadata(
-            **data) if data else NamespacesMetadata()
-
-        # Check if namespace already exists
-        for ns in namespaces_data.namespaces:
-            if ns.name == name:
-                raise ValueError(f"Namespace '{name}' already exists")
-
-        # Add new namespace
-        new_namespace = NamespaceMetadata(
-            name=name, description=description, path=name)
-        namespaces_data.namespaces.append(new_namespace)
-
-        # Save updated namespaces
-        self._files.write_file("namespaces", namespaces_data.model_dump())
+        with self.db.lock("metadata"):
+            # Load existing namespaces
+            data = self._files.read_file("namespaces")
+            namespaces_data = NamespacesMetadata(
+                **data) if data else NamespacesMetadata()
+
+            # Check if namespace already exists
+            for ns in namespaces_data.namespaces:
+                if ns.name == name:
+                    raise ValueError(f"Namespace '{name}' already exists")
+
+            # Add new namespace
+            new_namespace = NamespaceMetadata(
+                name=name, description=description, path=name)
+            namespaces_data.namespaces.append(new_namespace)
+
+            # Save updated namespaces
+            self._files.write_file("namespaces", namespaces_data.model_dump())
+            self._record_change("create", name, dir=self.db.global_config.data_dir / name)
 
     def update_namespace(self, name: str, description: str) -> None:
         """
@@ -118,24 +192,26 @@ class Metadata:
             name: Namespace name
             description: New namespace description
         """
-        # Load existing namespaces
-        data = self._files.read_file("namespaces")
-        namespaces_data = NamespacesMetadata(
-            **data) if data else NamespacesMetadata()
-
-        # Find and update the namespace
-        found = False
-        for ns in namespaces_data.namespaces:
-            if ns.name == name:
-                ns.description = description
-                found = True
-                break
-
-        if not found:
-            raise ValueError(f"Namespace '{name}' not found")
-
-        # Save updated namespaces
-        self._files.write_file("namespaces", namespaces_data.model_dump())
+        with self.db.lock("metadata"):
+            # Load existing namespaces
+            data = self._files.read_file("namespaces")
+            namespaces_data = NamespacesMetadata(
+                **data) if data else NamespacesMetadata()
+
+            # Find and update the namespace
+            found = False
+            for ns in namespaces_data.namespaces:
+                if ns.name == name:
+                    ns.description = description
+                    found = True
+                    break
+
+            if not found:
+                raise ValueError(f"Namespace '{name}' not found")
+
+            # Save updated namespaces
+            self._files.write_file("namespaces", namespaces_data.model_dump())
+            self._record_change("update", name)
 
     def delete_namespace_meta(self, name: str) -> None:
         """
@@ -144,27 +220,31 @@ class Metadata:
         Args:
             name: Namespace name
         """
-        # Load existing namespaces
-        data = self._files.read_file("namespaces")
-        namespaces_data = NamespacesMetadata(
-            **data) if data else NamespacesMetadata()
-
-        # Remove the namespace
-        original_count = len(namespaces_data.namespaces)
-        namespaces_data.namespaces = [
-            ns for ns in namespaces_data.namespaces if ns.name != name]
-
-        if len(namespaces_data.namespaces) == original_count:
-            raise ValueError(f"Namespace '{name}' not found")
-
-        # Save updated namespaces
-        self._files.write_file("namespaces", namespaces_data.model_dump())
-
-        # Also delete the tables file for this namespace if it exists
-        tables_file = f"{name}_tables"
-        if self._files.file_info(tables_file):
-            self._files.delete_file(tables_file)
-
+        with self.db.lock("metadata"):
+            # Load existing namespaces
+            data = self._files.read_file("namespaces")
+            namespaces_data = NamespacesMetadata(
+                **data) if data else NamespacesMetadata()
+
+            # Remove the namespace
+            original_count = len(namespaces_data.namespaces)
+            namespaces_data.namespaces = [
+                ns for ns in namespaces_data.namespaces if ns.name != name]
+
+            if len(namespaces_data.namespaces) == original_count:
+                raise ValueError(f"Namespace '{name}' not found")
+
+            # Save updated namespaces
+            self._files.write_file("namespaces", namespaces_data.model_dump())
+
+            # Also delete the tables file for this namespace if it exists
+            tables_file = f"{name}_tables"
+            if self._files.file_info(tables_file):
+                self._files.delete_file(tables_file)
+            self._record_change("delete", name, dir=self.db.global_config.data_dir / name)
+            self._delete_dependent_views(lambda table: table.partition(".")[0] == name)
+
+    @timed("metadata.get_tables")
     def get_tables(self, namespace: str) -> list[TableMetadata]:
         """
         Get metadata for all tables in a specific namespace.
@@ -175,11 +255,11 @@ class Metadata:
         Returns:
             List of TableMetadata objects.
         """
-        table_file = f"{namespace}_tables"
-        data = self._files.read_file(table_file)
-        tables_data = TablesMetadata(**data) if data else TablesMetadata()
-        return tables_data.tables
+        tables_data = self._files.read_cached(
+            f"{namespace}_tables", TablesMetadata.parse, TablesMetadata.parse_trusted)
+        return tables_data.tables if tables_data else []
 
+    @timed("metadata.get_table")
     def get_table(self, namespace: str, name: str) -> TableMetadata | None:
         """
         Get metadata for a specific table in a namespace.
@@ -206,25 +286,27 @@ class Metadata:
             name: Table name
             description: Table description
         """
-        table_file = f"{namespace}_tables"
+        with self.db.lock("metadata"):
+            table_file = f"{namespace}_tables"
 
-        # Load existing tables
-        data = self._files.read_file(table_file)
-        tables_data = TablesMetadata(**data) if data else TablesMetadata()
+            # Load existing tables
+            data = self._files.read_file(table_file)
+            tables_data = TablesMetadata(**data) if data else TablesMetadata()
 
-        # Check if table already exists
-        for table in tables_data.tables:
-            if table.name == name:
-                raise ValueError(
-                    f"Table '{name}' already exists in namespace '{namespace}'")
+            # Check if table already exists
+            for table in tables_data.tables:
+                if table.name == name:
+                    raise ValueError(
+                        f"Table '{name}' already exists in namespace '{namespace}'")
 
-        # Add new table
-        new_table = TableMetadata(
-            name=name, description=description, path=name)
-        tables_data.tables.append(new_table)
+            # Add new table
+            new_table = TableMetadata(
+                name=name, description=description, path=name)
+            tables_data.tables.append(new_table)
 
-        # Save updated tables
-        self._files.write_file(table_file, tables_data.model_dump())
+            # Save updated tables
+            self._files.write_file(table_file, tables_data.model_dump())
+            self._record_change("create", namespace, name, dir=self.db.global_config.data_dir / namespace / name)
 
     def update_table(self, namespace: str, name: str, description: str) -> None:
         """
@@ -235,26 +317,28 @@ class Metadata:
             name: Table name
             description: New table description
         """
-        table_file = f"{namespace}_tables"
-
-        # Load existing tables
-        data = self._files.read_file(table_file)
-        tables_data = TablesMetadata(**data) if data else TablesMetadata()
-
-        # Find and update the table
-        found = False
-        for table in tables_data.tables:
-            if table.name == name:
-                table.description = description
-                found = True
-                break
-
-        if not found:
-            raise ValueError(
-                f"Table '{name}' not found in namespace '{namespace}'")
+        with self.db.lock("metadata"):
+            table_file = f"{namespace}_tables"
+
+            # Load existing tables
+            data = self._files.read_file(table_file)
+            tables_data = TablesMetadata(**data) if data else TablesMetadata()
+
+            # Find and update the table
+            found = False
+            for table in tables_data.tables:
+                if table.name == name:
+                    table.description = description
+                    found = True
+                    break
+
+            if not found:
+                raise ValueError(
+                    f"Table '{name}' not found in namespace '{namespace}'")
 
-        # Save updated tables
-        self._files.write_file(table_file, tables_data.model_dump())
+            # Save updated tables
+            self._files.write_file(table_file, tables_data.model_dump())
+            self._record_change("update", namespace, name)
 
     def delete_table(self, namespace: str, name: str) -> None:
         """
@@ -264,23 +348,143 @@ class Metadata:
             namespace: Namespace name
             name: Table name
         """
-        table_file = f"{namespace}_tables"
+        with self.db.lock("metadata"):
+            table_file = f"{namespace}_tables"
+
+            # Load existing tables
+            data = self._files.read_file(table_file)
+            tables_data = TablesMetadata(**data) if data else TablesMetadata()
+
+            # Remove the table
+            original_count = len(tables_data.tables)
+            tables_data.tables = [
+                table for table in tables_data.tables if table.name != name]
+
+            if len(tables_data.tables) == original_count:
+                raise ValueError(
+                    f"Table '{name}' not found in namespace '{namespace}'")
+
+            # Save updated tables
+            self._files.write_file(table_file, tables_data.model_dump())
+            self._record_change("delete", namespace, name, dir=self.db.global_config.data_dir / namespace / name)
+            self._delete_dependent_views(lambda table: table == f"{namespace}.{name}")
+
+    @timed("metadata.get_views")
+    def get_views(self) -> list[ViewMetadata]:
+        """
+        Get metadata for all views.
 
-        # Load existing tables
-        data = self._files.read_file(table_file)
-        tables_data = TablesMetadata(**data) if data else TablesMetadata()
+        Returns:
+            List of ViewMetadata objects.
+        """
+        views_data = self._files.read_cached("views", ViewsMetadata.parse, ViewsMetadata.parse_trusted)
+        return views_data.views if views_data else []
 
-        # Remove the table
-        original_count = len(tables_data.tables)
-        tables_data.tables = [
-            table for table in tables_data.tables if table.name != name]
+    def get_view(self, namespace: str, name: str) -> ViewMetadata | None:
+        """
+        Get metadata for the view materialised in a table.
 
-        if len(tables_data.tables) == original_count:
-            raise ValueError(
-                f"Table '{name}' not found in namespace '{namespace}'")
+        Args:
+            namespace: Namespace of the view table
+            name: Name of the view table
 
-        # Save updated tables
-        self._files.write_file(table_file, tables_data.model_dump())
+        Returns:
+            ViewMetadata object if found, None otherwise.
+        """
+        for view in self.get_views():
+            if view.namespace == namespace and view.name == name:
+                return view
+        return None
+
+    def put_view(self, view: ViewMetadata, create: bool) -> None:
+        """
+        Add or replace a view.
+
+        Views cannot be chained: a view table is never the source of another view.
+
+        Args:
+            view: View metadata
+            create: Add a new view, else replace an existing one
+
+        Raises:
+            ValueError: View already exists or not found, or invalid source
+        """
+        with self.db.lock("metadata"):
+            data = self._files.read_file("views")
+            views_data = ViewsMetadata(**data) if data else ViewsMetadata()
+
+            others = [other for other in views_data.views if other.table != view.table]
+            if create and len(others) != len(views_data.views):
+                raise ValueError(f"View '{view.table}' already exists")
+            if not create and len(others) == len(views_data.views):
+                raise ValueError(f"View '{view.table}' not found")
+            if view.source == view.table:
+                raise ValueError(f"View '{view.table}' cannot be its own source")
+            if any(other.table == view.source for other in others):
+                raise ValueError(f"Source '{view.source}' of view '{view.table}' is a view")
+            if any(other.source == view.table for other in others):
+                raise ValueError(f"View '{view.table}' is the source of another view")
+            source_namespace, _, source_table = view.source.partition(".")
+            if self.get_table(source_namespace, source_table) is None:
+                raise ValueError(f"Source table '{view.source}' of view '{view.table}' not found")
+
+            views_data.views = others + [view] if create else \
+                [view if other.table == view.table else other for other in views_data.views]
+
+            self._files.write_file("views", views_data.model_dump())
+            self._record_change("create" if create else "update", "takoc", "view", view.table)
+
+    def delete_view(self, namespace: str, name: str) -> None:
+        """
+        Delete a view, its table is kept.
+
+        Args:
+            namespace: Namespace of the view table
+            name: Name of the view table
+        """
+        with self.db.lock("metadata"):
+            data = self._files.read_file("views")
+            views_data = ViewsMetadata(**data) if data else ViewsMetadata()
+
+            original_count = len(views_data.views)
+            views_data.views = [
+                view for view in views_data.views if view.namespace != namespace or view.name != name]
+
+            if len(views_data.views) == original_count:
+                raise ValueError(f"View '{namespace}.{name}' not found")
+
+            self._files.write_file("views", views_data.model_dump())
+            self._record_change("delete", "takoc", "view", f"{namespace}.{name}")
+
+    def _delete_dependent_views(self, deleted: Callable[[str], bool]) -> None:
+        """Delete the views whose source or table is deleted, must be called with the metadata lock held
+
+        A table later created with the same name is neither written by a stale view nor the source of one.
+
+        Args:
+            deleted: Whether a `<namespace>.<table>` is deleted
+        """
+        data = self._files.read_file("views")
+        views_data = ViewsMetadata(**data) if data else ViewsMetadata()
+        dependent = [view for view in views_data.views if deleted(view.source) or deleted(view.table)]
+        if not dependent:
+            return
+        views_data.views = [view for view in views_data.views if view not in dependent]
+        self._files.write_file("views", views_data.model_dump())
+        for view in dependent:
+            self._record_change("delete", "takoc", "view", view.table)
+
+    def declare_view(self, view: ViewMetadata, create: bool) -> None:
+        """
+        Declare a view and build its table, see `view.declare_view`.
+
+        Args:
+            view: View metadata
+            create: Create the view and its table, else replace an existing view
+        """
+        from .view import declare_view
+
+        declare_view(self.db, view, create)
 
     def get_metadata_namespace(self) -> INamespace:
         """
@@ -385,6 +589,53 @@ class TablesTable(ITable):
         self._metadata.delete_table(namespace, table_name)
 
 
+class ViewsTable(ITable):
+    """ITable implementation for view records, see `view`"""
+
+    def __init__(self, metadata: Metadata):
+        self._metadata = metadata
+
+    @property
+    def namespace(self) -> str:
+        return "takoc"
+
+    @property
+    def name(self) -> str:
+        return "view"
+
+    def list_records(self) -> list[str]:
+        return [view.table for view in self._metadata.get_views()]
+
+    def get_record(self, record_id: str) -> Any:
+        if "." not in record_id:
+            raise ValueError(f"Invalid view record ID format: '{record_id}'. Use 'namespace.table' format.")
+        namespace, table_name = record_id.split(".", 1)
+        view = self._metadata.get_view(namespace, table_name)
+        if view:
+            return ViewData(**view.model_dump()).model_dump()
+        raise ValueError(f"View '{record_id}' not found")
+
+    def _declare(self, record_id: str, data: Any, create: bool) -> None:
+        if "." not in record_id:
+            raise ValueError(f"Invalid view record ID format: '{record_id}'. Use 'namespace.table' format.")
+        view = ViewData(**data)
+        if view.namespace + "." + view.name != record_id:
+            raise ValueError(f"Record ID '{record_id}' must match view table '{view.namespace}.{view.name}'")
+        self._metadata.declare_view(ViewMetadata(**view.model_dump()), create)
+
+    def create_record(self, record_id: str, data: Any) -> None:
+        self._declare(record_id, data, create=True)
+
+    def update_record(self, record_id: str, data: Any) -> None:
+        self._declare(record_id, data, create=False)
+
+    def delete_record(self, record_id: str) -> None:
+        if "." not in record_id:
+            raise ValueError(f"Invalid view record ID format: '{record_id}'. Use 'namespace.table' format.")
+        namespace, table_name = record_id.split(".", 1)
+        self._metadata.delete_view(namespace, table_name)
+
+
 class MetadataNamespace(INamespace):
     """INamespace implementation for metadata namespace"""
 
@@ -399,7 +650,8 @@ class MetadataNamespace(INamespace):
     def list_tables(self) -> list[TableData]:
         return [
             TableData(name="namespace", description="Stores all namespace records", namespace=self._name),
-            TableData(name="table", description="Stores all table records", namespace=self._name)
+            TableData(name="table", description="Stores all table records", namespace=self._name),
+            TableData(name="view", description="Stores all view records", namespace=self._name)
         ]
 
     def get_table(self, name: str) -> TableData | None:
@@ -408,6 +660,8 @@ class MetadataNamespace(INamespace):
                 return TableData(name="namespace", description="Stores all namespace records", namespace=self._name)
             else:
                 return TableData(name="table", description="Stores all table records", namespace=self._name)
+        if name == "view":
+            return TableData(name="view", description="Stores all view records", namespace=self._name)
         return None
 
     def create_table(self, create: TableCreateRequest) -> None:
@@ -424,4 +678,6 @@ class MetadataNamespace(INamespace):
             return NamespacesTable(self._metadata)
         elif table == "table":
             return TablesTable(self._metadata)
+        elif table == "view":
+            return ViewsTable(self._metadata)
         raise ValueError(f"Table '{table}' not found in namespace '{self._name}'")
@@ -3,7 +3,8 @@ from pathlib import Path
 
 from .db import TakocLocalDb
 from .file_io import Files
-from ..api.v1 import INamespace, ITable, TableData, TableCreateRequest, TableUpdateRequest
+from ..api.metrics import timed
+from ..api.v1 import INamespace, ITable, TableData, TableCreateRequest, TableUpdateRequest, TableStatsData
 
 
 class Namespace(INamespace):
@@ -20,7 +21,7 @@ class Namespace(INamespace):
         self._db = db
         self._name = name
         self._files = Files(
-            dir=dir, read_only=db.read_only, format=db.global_config.default_format)
+            dir=dir, read_only=db.read_only, format=db.global_config.default_format, cache=db.cache)
 
     @classmethod
     def initialize(cls, db: TakocLocalDb, name: str, dir: Path) -> 'Namespace':
@@ -67,14 +68,16 @@ class Namespace(INamespace):
         """
         from .table import Table
 
-        # Use metadata to add table
-        self._db.metadata.add_table(self._name, create.name, create.description)
+        # The directory is created under the metadata lock, so a commit of the metadata includes it
+        with self._db.lock("metadata"):
+            # Use metadata to add table
+            self._db.metadata.add_table(self._name, create.name, create.description)
 
-        # Create table directory
-        table_dir = self._files.dir / create.name
+            # Create table directory
+            table_dir = self._files.dir / create.name
 
-        # Use Table class method to create table
-        Table.initialize(self._db, table_dir)
+            # Use Table class method to create table
+            Table.initialize(self._db, table_dir)
 
     def list_tables(self) -> list[TableData]:
         """Get list of all tables in namespace
@@ -83,8 +86,18 @@ class Namespace(INamespace):
             List of tables
         """
         tables_metadata = self._db.metadata.get_tables(self._name)
-        return [TableData(name=table.name, description=table.description, namespace=self._name) for table in
-                tables_metadata]
+        return [TableData(name=table.name, description=table.description, namespace=self._name,
+                          stats=self._table_stats(table.path)) for table in tables_metadata]
+
+    def _table_stats(self, path: str) -> TableStatsData | None:
+        """Get the statistics of a table from its metadata file, None if the table has none yet
+
+        Statistics are never computed here, tables created before them get them on their first write or from
+        `Table.build_stats`.
+        """
+        from .table import TableMeta
+        meta = TableMeta.load(Files(dir=self._files.dir / path, read_only=True, cache=self._db.cache))
+        return meta.stats if meta is not None else None
 
     def get_table(self, name: str) -> TableData | None:
         """Get single table instance
@@ -97,7 +110,8 @@ class Namespace(INamespace):
         """
         table = self._db.metadata.get_table(self._name, name)
         if table:
-            return TableData(name=table.name, description=table.description, namespace=self._name)
+            return TableData(name=table.name, description=table.description, namespace=self._name,
+                             stats=self._table_stats(table.path))
         return None
 
     def update_table(self, name: str, update: TableUpdateRequest) -> None:
@@ -122,14 +136,16 @@ class Namespace(INamespace):
         Raises:
             ValueError: Table not found
         """
-        # Use metadata to delete table
-        self._db.metadata.delete_table(self._name, name)
+        with self._db.lock("metadata"):
+            # Use metadata to delete table
+            self._db.metadata.delete_table(self._name, name)
 
-        # Delete table directory
-        table_dir = self._files.dir / name
-        if table_dir.exists():
-            shutil.rmtree(table_dir)
+            # Delete table directory
+            table_dir = self._files.dir / name
+            if table_dir.exists():
+                shutil.rmtree(table_dir)
 
+    @timed("namespace.load_table")
     def load_table(self, table: str) -> ITable:
         """Get record data access object for a specific table
 
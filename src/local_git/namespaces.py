@@ -19,7 +19,8 @@ class Namespaces(INamespaces):
         """
         self._db = db
         self._files = Files(
-            dir=Path(db.global_config.data_dir), read_only=db.read_only, format=db.global_config.default_format)
+            dir=Path(db.global_config.data_dir), read_only=db.read_only, format=db.global_config.default_format,
+            cache=db.cache)
 
     def create_namespace(self, create: NamespaceCreateRequest) -> None:
         """Create new namespace
@@ -34,12 +35,14 @@ class Namespaces(INamespaces):
             raise ReadOnlyError(
                 "Cannot create namespace with name 'takoc' - it's a reserved system namespace")
 
-        # Use metadata to add namespace
-        self._db.metadata.add_namespace(create.name, create.description)
+        # The directory is created under the metadata lock, so a commit of the metadata includes it
+        with self._db.lock("metadata"):
+            # Use metadata to add namespace
+            self._db.metadata.add_namespace(create.name, create.description)
 
-        # Use Namespace class method to create namespace
-        Namespace.initialize(db=self._db, name=create.name,
-                             dir=self._files.dir / create.name)
+            # Use Namespace class method to create namespace
+            Namespace.initialize(db=self._db, name=create.name,
+                                 dir=self._files.dir / create.name)
 
     def list_namespaces(self) -> list[NamespaceData]:
         """Get list of all namespaces
@@ -102,10 +105,11 @@ class Namespaces(INamespaces):
             raise ReadOnlyError(
                 "Cannot delete the 'takoc' system metadata namespace")
 
-        # Use metadata to delete namespace metadata
-        self._db.metadata.delete_namespace_meta(name)
+        with self._db.lock("metadata"):
+            # Use metadata to delete namespace metadata
+            self._db.metadata.delete_namespace_meta(name)
 
-        # Delete namespace directory
-        namespace_dir = self._files.dir / name
-        if namespace_dir.exists():
-            shutil.rmtree(namespace_dir)
+            # Delete namespace directory
+            namespace_dir = self._files.dir / name
+            if namespace_dir.exists():
+                shutil.rmtree(namespace_dir)
@@ -0,0 +1,75 @@
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Iterator
+
+# Workers are started from a clean server process, never forked from a multithreaded process whose locks, e.g. the
+# metrics lock, may be held by another thread
+CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+_shared: ProcessPoolExecutor | None = None
+_shared_lock = threading.Lock()
+
+
+class InlineExecutor(Executor):
+    """Run tasks in the calling thread, for small inputs and tests"""
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def shared_pool() -> ProcessPoolExecutor:
+    """Get the process pool shared by the calls of the process, with one worker per CPU
+
+    The pool is started on the first call and kept until the process exits, so requests do not pay for starting
+    workers. A worker that dies, e.g. killed by the OOM killer, breaks the whole pool: it is replaced by a new one.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is not None and _shared._broken:
+            _shared.shutdown(wait=False)
+            _shared = None
+        if _shared is None:
+            _shared = ProcessPoolExecutor(mp_context=CONTEXT)
+        return _shared
+
+
+def _discard(executor: ProcessPoolExecutor) -> None:
+    """Stop sharing a broken pool, the next call starts a new one"""
+    global _shared
+    with _shared_lock:
+        if _shared is executor:
+            _shared = None
+    executor.shutdown(wait=False)
+
+
+@contextmanager
+def process_pool(workers: int | None) -> Iterator[Executor]:
+    """Get a process pool for the duration of a call
+
+    Args:
+        workers: Number of worker processes, None for the shared pool, 0 to run tasks in the calling thread
+
+    Raises:
+        BrokenProcessPool: A worker died during the call, the shared pool is replaced for the next calls
+    """
+    if workers == 0:
+        yield InlineExecutor()
+    elif workers is None:
+        executor = shared_pool()
+        try:
+            yield executor
+        except BrokenProcessPool:
+            _discard(executor)
+            raise
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=CONTEXT) as executor:
+            yield executor
@@ -0,0 +1,39 @@
+"""
+Worker side of scan queries: read and filter one partition of the records of a table.
+
+Runs in worker processes, so parsing the record files and evaluating the filters scale with the cores; only the
+matching rows, sorted and limited, are sent back to be merged, see `query`.
+"""
+from pathlib import Path
+from typing import Any, Iterator
+
+from .file_io import Files
+from ..api.aggregate import Filter
+from ..api.query import Row, Sort, scan_rows
+
+# Record files read per task
+SCAN_CHUNK_SIZE = 1000
+
+
+def _read(records_dir: str, entries: list[tuple[str, str]]) -> Iterator[tuple[str, Any]]:
+    files = Files(dir=Path(records_dir), read_only=True)
+    for record_id, file_name in entries:
+        data = files.read_file(file_name)
+        # Skipped like `Table.iter_records` does
+        if data is not None:
+            yield record_id, data
+
+
+def scan_partition(records_dir: str, entries: list[tuple[str, str]], filters: list[Filter], sort: list[Sort],
+                   limit: int | None, fields: list[str] | None) -> list[Row]:
+    """Read record files and keep the matching rows, see `query.scan_rows`
+
+    Args:
+        records_dir: Directory of the record files
+        entries: (record ID, file name) pairs of the partition, in index order
+        filters: Filters the records must all match
+        sort: Sort fields
+        limit: Maximum number of rows
+        fields: Dotted paths of the returned fields, whole records if None
+    """
+    return scan_rows(_read(records_dir, entries), filters, sort, limit, fields)
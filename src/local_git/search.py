@@ -0,0 +1,352 @@
+"""
+Optional full-text index of a table, ranked with BM25.
+
+A table declares it in its `takoc` file, with the dotted paths of the indexed fields, or every string of the record
+if `fields` is omitted:
+
+    search:
+      fields: [title, notes]
+
+The index is the `search.idx` file next to the records file. Its first line is a JSON header, every other line
+indexes or removes one record: `["<id>", <length>, {"<term>": <frequency>, ...}]`, or `["<id>"]` once the record is
+deleted. Writes append their lines, and the file is rewritten with only the indexed records once it has doubled since
+it was last written whole. The parsed index is cached, and the index updated by an append is cached for the appended
+file, so searching after a write neither parses the file nor rebuilds the postings.
+"""
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable
+
+from .cache import FileCache
+from ..api.fields import parse_fields, project
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# BM25 term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+# Size below which the index file is never rewritten
+COMPACT_MIN_BYTES = 1024 * 1024
+
+# Length and term frequencies of an indexed record, None for a deleted record
+Document = tuple[int, dict[str, int]] | None
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a text into case-folded words"""
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def _strings(value: Any, texts: list[str]) -> None:
+    if isinstance(value, str):
+        texts.append(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _strings(item, texts)
+    elif isinstance(value, list):
+        for item in value:
+            _strings(item, texts)
+
+
+def document(data: Any, fields: list[str] | None) -> Document:
+    """Tokenize the strings of a record
+
+    Args:
+        data: Record data
+        fields: Dotted paths of the indexed fields, every string of the record if None
+    """
+    texts: list[str] = []
+    _strings(project(data, parse_fields(fields)) if fields is not None else data, texts)
+    tokens = [token for text in texts for token in tokenize(text)]
+    return len(tokens), dict(Counter(tokens))
+
+
+def _line(record_id: str, doc: Document) -> bytes:
+    entry = [record_id, *doc] if doc is not None else [record_id]
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class SearchIndexState:
+    """
+    Parsed search index, shared with the cache and never mutated: `updated` returns a new index.
+
+    The records indexed again since the index was built are held in an overlay on top of the built records, so a write
+    copies the overlay and the postings of the terms of its records, never the whole index. The overlay is merged into
+    the built records when the file is rewritten, or once it holds `MAX_DELTA_DOCS` records.
+    """
+
+    # Records of the overlay above which a write merges it into the built records
+    MAX_DELTA_DOCS = 256
+
+    __slots__ = ("fields", "size", "_docs", "_postings", "_delta_docs", "_delta_postings", "_count", "_total")
+
+    def __init__(self, fields: list[str] | None, size: int, docs: dict[str, tuple[int, dict[str, int]]],
+                 postings: dict[str, dict[str, int]], total: int, delta_docs: dict[str, Document] | None = None,
+                 delta_postings: dict[str, dict[str, int]] | None = None, count: int | None = None):
+        """Initialize state
+
+        Args:
+            fields: Indexed fields
+            size: Size of the file when it was last written whole
+            docs: Record ID -> (length, term frequencies) of the built records
+            postings: Term -> record ID -> frequency of the built records
+            total: Sum of the lengths of the records
+            delta_docs: Record ID -> document of the records indexed again since, None for a deleted record
+            delta_postings: Term -> record ID -> frequency of every term of the overlay, replacing `postings`
+            count: Number of records, the number of built records if None
+        """
+        self.fields = fields
+        self.size = size
+        self._docs = docs
+        self._postings = postings
+        self._delta_docs = delta_docs or {}
+        self._delta_postings = delta_postings or {}
+        self._count = len(docs) if count is None else count
+        self._total = total
+
+    @classmethod
+    def build(cls, fields: list[str] | None, docs: dict[str, tuple[int, dict[str, int]]],
+              size: int = 0) -> "SearchIndexState":
+        """Build the postings of records"""
+        postings: dict[str, dict[str, int]] = {}
+        for record_id, (_, terms) in docs.items():
+            for term, frequency in terms.items():
+                postings.setdefault(term, {})[record_id] = frequency
+        return cls(fields, size, docs, postings, sum(length for length, _ in docs.values()))
+
+    @classmethod
+    def parse(cls, content: bytes) -> "SearchIndexState":
+        """Parse an index file, skipping incomplete or malformed lines
+
+        Raises:
+            ValueError: Invalid header
+        """
+        lines = content.split(b"\n")
+        header = json.loads(lines[0])
+        docs: dict[str, tuple[int, dict[str, int]]] = {}
+        # The last element is empty, or an incomplete line being written
+        for line in lines[1:-1]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if len(entry) == 3:
+                docs[entry[0]] = (entry[1], entry[2])
+            elif len(entry) == 1:
+                docs.pop(entry[0], None)
+        return cls.build(header["fields"], docs, header["size"])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _doc(self, record_id: str) -> Document:
+        if record_id in self._delta_docs:
+            return self._delta_docs[record_id]
+        return self._docs.get(record_id)
+
+    def _term_docs(self, term: str) -> dict[str, int] | None:
+        if term in self._delta_postings:
+            return self._delta_postings[term]
+        return self._postings.get(term)
+
+    def merged(self) -> "SearchIndexState":
+        """Get the same index with the overlay merged into the built records, in O(records)"""
+        if not self._delta_docs:
+            return SearchIndexState(self.fields, self.size, self._docs, self._postings, self._total)
+        docs = dict(self._docs)
+        for record_id, doc in self._delta_docs.items():
+            if doc is None:
+                docs.pop(record_id, None)
+            else:
+                docs[record_id] = doc
+        postings = dict(self._postings)
+        for term, term_docs in self._delta_postings.items():
+            if term_docs:
+                postings[term] = term_docs
+            else:
+                postings.pop(term, None)
+        return SearchIndexState(self.fields, self.size, docs, postings, self._total)
+
+    def updated(self, changes: list[tuple[str, Document]]) -> "SearchIndexState":
+        """Get a new index with records indexed again or removed
+
+        Only the overlay and the postings of the terms of the changed records are copied, the built records are shared
+        with this index.
+        """
+        if len(self._delta_docs) + len(changes) > self.MAX_DELTA_DOCS:
+            return self.merged()._updated(changes)
+        return self._updated(changes)
+
+    def _updated(self, changes: list[tuple[str, Document]]) -> "SearchIndexState":
+        delta_docs = dict(self._delta_docs)
+        delta_postings = dict(self._delta_postings)
+        copied: set[str] = set()
+        count = self._count
+        total = self._total
+
+        def terms_of(term: str) -> dict[str, int]:
+            if term not in copied:
+                copied.add(term)
+                delta_postings[term] = dict(self._term_docs(term) or {})
+            return delta_postings[term]
+
+        for record_id, doc in changes:
+            old = delta_docs[record_id] if record_id in delta_docs else self._docs.get(record_id)
+            if old is not None:
+                count -= 1
+                total -= old[0]
+                for term in old[1]:
+                    terms_of(term).pop(record_id, None)
+            if doc is not None:
+                count += 1
+                total += doc[0]
+                for term, frequency in doc[1].items():
+                    terms_of(term)[record_id] = frequency
+            delta_docs[record_id] = doc
+        return SearchIndexState(self.fields, self.size, self._docs, self._postings, total, delta_docs, delta_postings,
+                                count)
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[str, float]]:
+        """Rank the records matching any word of a query with BM25
+
+        Args:
+            query: Words to search
+            limit: Maximum number of results
+
+        Returns:
+            (record ID, score) by descending score
+        """
+        count = self._count
+        if not count:
+            return []
+        average = self._total / count or 1.0
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            term_docs = self._term_docs(term)
+            if not term_docs:
+                continue
+            idf = math.log(1 + (count - len(term_docs) + 0.5) / (len(term_docs) + 0.5))
+            for record_id, frequency in term_docs.items():
+                norm = K1 * (1 - B + B * self._doc(record_id)[0] / average)
+                scores[record_id] = scores.get(record_id, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+    def content(self) -> bytes:
+        """Get the content of the index file with only the indexed records"""
+        docs = self.merged()._docs
+        body = b"".join(_line(record_id, doc) for record_id, doc in docs.items())
+        return _header(self.fields, len(body)) + body
+
+
+def _header(fields: list[str] | None, size: int) -> bytes:
+    return json.dumps({"fields": fields, "size": size}, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class SearchIndex:
+    """Search index of one table, written under the table lock"""
+
+    FILE_NAME = "search.idx"
+
+    def __init__(self, dir: Path, fields: list[str] | None, cache: FileCache | None = None):
+        """Initialize search index
+
+        Args:
+            dir: Directory of the records file
+            fields: Indexed fields declared by the table
+            cache: Cache of the parsed index
+        """
+        self._path = dir / self.FILE_NAME
+        self._fields = fields
+        self._cache = cache
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def read(self) -> SearchIndexState | None:
+        """Read the index through the cache, None if it must be built"""
+        version = self._cache.version() if self._cache is not None else None
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        state = self._cache.get(self._path, stat) if self._cache is not None else None
+        if state is None:
+            with open(self._path, "rb") as f:
+                try:
+                    state = SearchIndexState.parse(f.read())
+                except (ValueError, KeyError):
+                    return None
+            if self._cache is not None:
+                self._cache.put(self._path, stat, state, version)
+        # Indexed with other fields, e.g. after the declaration changed
+        return state if state.fields == self._fields else None
+
+    def documents(self, records: Iterable[tuple[str, Any]]) -> dict[str, tuple[int, dict[str, int]]]:
+        """Tokenize records"""
+        return {record_id: document(data, self._fields) for record_id, data in records}
+
+    def build(self, records: Iterable[tuple[str, Any]]) -> SearchIndexState:
+        """Index every record and write the index"""
+        state = SearchIndexState.build(self._fields, self.documents(records))
+        content = state.content()
+        state.size = len(content)
+        self._write(content, state)
+        return state
+
+    def apply(self, changes: list[tuple[str, Any]]) -> None:
+        """Index records again after they are written, no-op if the index has not been built
+
+        Args:
+            changes: (record ID, data) pairs, data is None for a deleted record
+        """
+        state = self.read()
+        if state is None:
+            # Built from the records on the next search
+            self.delete()
+            return
+        docs = [(record_id, document(data, self._fields) if data is not None else None) for record_id, data in changes]
+        state = state.updated(docs)
+        content = b"".join(_line(record_id, doc) for record_id, doc in docs)
+        with open(self._path, "ab") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size and not self._ends_with_newline(size):
+                content = b"\n" + content
+            f.write(content)
+        if size + len(content) > max(COMPACT_MIN_BYTES, 2 * state.size):
+            state = state.merged()
+            content = state.content()
+            state.size = len(content)
+            self._write(content, state)
+        elif self._cache is not None:
+            self._cache.put(self._path, os.stat(self._path), state)
+
+    def _ends_with_newline(self, size: int) -> bool:
+        with open(self._path, "rb") as f:
+            f.seek(size - 1)
+            return f.read(1) == b"\n"
+
+    def delete(self) -> None:
+        """Delete the index, built again on the next search"""
+        if self._cache is not None:
+            self._cache.invalidate(self._path)
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+    def _write(self, content: bytes, state: SearchIndexState) -> None:
+        tmp_file = self._path.with_name(f".{self._path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_file, "wb") as f:
+                f.write(content)
+            os.replace(tmp_file, self._path)
+            if self._cache is not None:
+                self._cache.put(self._path, os.stat(self._path), state)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
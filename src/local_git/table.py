@@ -1,11 +1,36 @@
+import bisect
+import logging
+import os
+import time
+from collections import deque
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
 
 from pydantic import BaseModel
 
 from .db import TakocLocalDb
 from .file_io import Files, FILE_FORMAT
-from ..api.v1 import ITable
+from ..api.changes import CHANGE_OP
+from ..api.error import ReadOnlyError
+from ..api.fields import set_path
+from ..api.patch import PATCH_FORMAT, apply_patch
+from .changelog import ChangeLog, LOG_OP
+from .search import SearchIndex, SearchIndexState
+from .manifest import Manifest, ManifestDiffData, ManifestFile, entry_of, file_hash
+from ..api.metrics import timed
+from ..api.v1 import ITable, ImportResponse, ChangesResponse, TableStatsData, AggregateRowData
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from .metadata import ViewMetadata
+
+logger = logging.getLogger(__name__)
+
+
+class SearchMetaData(BaseModel):
+    """Full-text index declaration, see `search`"""
+    fields: list[str] | None = None
 
 
 class TableMeta(BaseModel):
@@ -13,6 +38,8 @@ class TableMeta(BaseModel):
     records_format: FILE_FORMAT = "yaml"
     json_schema: dict | None = None
     path: str | None = None
+    stats: TableStatsData | None = None
+    search: SearchMetaData | None = None
 
     @classmethod
     def load(cls, files: Files) -> 'TableMeta':
@@ -24,7 +51,25 @@ class TableMeta(BaseModel):
         Returns:
             Table metadata object
         """
-        return cls(**files.read_file("takoc"))
+        return files.read_cached("takoc", lambda data: cls(**data), cls.parse_trusted)
+
+    @classmethod
+    def parse_trusted(cls, data: dict) -> 'TableMeta':
+        """Parse the content of a metadata file written by takoc, without validation"""
+        stats = data.get("stats")
+        search = data.get("search")
+        return cls.model_construct(**{
+            **data,
+            "stats": TableStatsData.model_construct(**stats) if stats else None,
+            "search": SearchMetaData.model_construct(**search) if search is not None else None})
+
+
+# Format and size of a record file, None if the record has no file
+FileStat = tuple[FILE_FORMAT, int] | None
+
+
+def _identity(data: Any) -> Any:
+    return data
 
 
 class RecordPos(BaseModel):
@@ -35,10 +80,192 @@ class RecordPos(BaseModel):
 class Records(BaseModel):
     records: list[RecordPos] = []
 
+    @classmethod
+    def parse(cls, data: dict | None) -> "Records":
+        """Parse the content of a records file"""
+        return cls(**data) if data else cls()
+
+
+class RecordIndex:
+    """
+    Compact in-memory form of the records file.
+
+    Record IDs are kept in a list in file order, file names are only stored for the records whose file name differs
+    from the ID. The ID lookup table is built on the first lookup, and the sorted IDs on the first range scan; once
+    built, the sorted IDs are carried over to the new indexes. Pydantic models are only used to validate the records
+    file, instances are shared with the cache and never mutated: `add` and `remove` return new indexes.
+    """
+
+    __slots__ = ("_ids", "_files", "_members", "_sorted")
+
+    def __init__(self, ids: list[str] | None = None, files: dict[str, str] | None = None,
+                 sorted_ids: list[str] | None = None):
+        """Initialize record index
+
+        Args:
+            ids: Record IDs in file order
+            files: File names of the records whose file name is not the ID
+            sorted_ids: Same record IDs in ID order, built on demand if None
+        """
+        self._ids = ids if ids is not None else []
+        self._files = files if files is not None else {}
+        self._members: frozenset[str] | None = None
+        self._sorted = sorted_ids
+
+    @classmethod
+    def parse(cls, data: dict | None) -> "RecordIndex":
+        """Validate and parse the content of a records file"""
+        ids = []
+        files = {}
+        for record in Records.parse(data).records:
+            ids.append(record.id)
+            if record.file != record.id:
+                files[record.id] = record.file
+        return cls(ids, files)
+
+    @classmethod
+    def parse_trusted(cls, data: dict | None) -> "RecordIndex":
+        """Parse the content of a records file written by takoc, without validation"""
+        ids = []
+        files = {}
+        for record in (data or {}).get("records") or []:
+            record_id = record["id"]
+            ids.append(record_id)
+            if record["file"] != record_id:
+                files[record_id] = record["file"]
+        return cls(ids, files)
+
+    def to_data(self) -> dict:
+        """Get the content of the records file"""
+        return {"records": [{"id": record_id, "file": file} for record_id, file in self]}
+
+    def __getstate__(self):
+        # The lookup table is rebuilt on demand, keep snapshots small
+        return self._ids, self._files
+
+    def __setstate__(self, state) -> None:
+        self._ids, self._files = state
+        self._members = None
+        self._sorted = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        """Iterate over (record ID, file name) in file order"""
+        files = self._files
+        for record_id in self._ids:
+            yield record_id, files.get(record_id, record_id)
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._lookup()
+
+    @property
+    def ids(self) -> list[str]:
+        """Get the record IDs in file order, the list must not be mutated"""
+        return self._ids
+
+    def _lookup(self) -> frozenset[str]:
+        members = self._members
+        if members is None:
+            members = self._members = frozenset(self._ids)
+        return members
+
+    def _ordered(self) -> list[str]:
+        ordered = self._sorted
+        if ordered is None:
+            ordered = self._sorted = sorted(self._ids)
+        return ordered
+
+    def scan(self, prefix: str = "", start: str | None = None, end: str | None = None, reverse: bool = False,
+             limit: int | None = None) -> list[str]:
+        """Get record IDs in ID order within a range, in O(log n + k) once the sorted IDs are built
+
+        Args:
+            prefix: Keep the IDs starting with it
+            start: First ID, inclusive
+            end: Last ID, exclusive
+            reverse: Descending order, `limit` then keeps the last IDs of the range
+            limit: Maximum number of IDs
+
+        Returns:
+            Record IDs
+        """
+        ordered = self._ordered()
+        lower = max(start, prefix) if start is not None else prefix
+        upper = _prefix_end(prefix)
+        if end is not None:
+            upper = min(end, upper) if upper is not None else end
+        lo = bisect.bisect_left(ordered, lower)
+        hi = bisect.bisect_left(ordered, upper) if upper is not None else len(ordered)
+        if limit is not None:
+            if reverse:
+                lo = max(lo, hi - limit)
+            else:
+                hi = min(hi, lo + limit)
+        if hi <= lo:
+            return []
+        return ordered[lo:hi][::-1] if reverse else ordered[lo:hi]
+
+    def file_of(self, record_id: str) -> str | None:
+        """Get the file name of a record, None if the record is not indexed"""
+        if record_id not in self._lookup():
+            return None
+        return self._files.get(record_id, record_id)
+
+    def extend(self, records: list[tuple[str, str]]) -> "RecordIndex":
+        """Get a new index with (record ID, file name) pairs appended"""
+        files = self._files
+        renamed = {record_id: file for record_id, file in records if file != record_id}
+        if renamed:
+            files = {**files, **renamed}
+        added = [record_id for record_id, _ in records]
+        # Sorting two sorted runs merges them in linear time
+        ordered = sorted(self._sorted + sorted(added)) if self._sorted is not None else None
+        return RecordIndex(self._ids + added, files, ordered)
+
+    def add(self, record_id: str, file: str) -> "RecordIndex":
+        """Get a new index with a record appended"""
+        files = self._files
+        if file != record_id:
+            files = {**files, record_id: file}
+        ordered = None
+        if self._sorted is not None:
+            ordered = list(self._sorted)
+            bisect.insort(ordered, record_id)
+        return RecordIndex(self._ids + [record_id], files, ordered)
+
+    def remove(self, record_id: str) -> "RecordIndex":
+        """Get a new index without a record"""
+        ids = [i for i in self._ids if i != record_id]
+        files = self._files
+        if record_id in files:
+            files = {k: v for k, v in files.items() if k != record_id}
+        ordered = None
+        if self._sorted is not None:
+            ordered = list(self._sorted)
+            i = bisect.bisect_left(ordered, record_id)
+            if i < len(ordered) and ordered[i] == record_id:
+                del ordered[i]
+        return RecordIndex(ids, files, ordered)
+
+
+def _prefix_end(prefix: str) -> str | None:
+    """Get the smallest string greater than every string starting with a prefix, None if there is none"""
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
 
 class Table(ITable):
     """Table APIs"""
 
+    # Files in the records directory that are not records
+    RESERVED_FILES = ("takoc", "records")
+
     def __init__(self, db: TakocLocalDb, dir: Path):
         """Initialize table
 
@@ -48,14 +275,27 @@ class Table(ITable):
         """
         self._db = db
         self._dir = dir
-        self._meta = TableMeta.load(Files(dir=dir, read_only=True))
+        meta_files = Files(dir=dir, read_only=True, cache=db.cache)
+        self._meta = TableMeta.load(meta_files)
+        # Metadata is written back in its own format, holding the statistics
+        meta_info = meta_files.file_info("takoc")
+        self._meta_files = Files(dir=dir, read_only=db.read_only,
+                                 format=meta_info[1] if meta_info else db.global_config.default_format,
+                                 cache=db.cache)
 
-        self._files = Files(
-            dir=self._dir / self._meta.path if self._meta.path else self._dir,
-            read_only=db.read_only,
-            format=self._meta.records_format if self._meta.records_format else self._db.global_config.default_format)
+        records_dir = self._dir / self._meta.path if self._meta.path else self._dir
+        records_format = self._meta.records_format if self._meta.records_format else \
+            self._db.global_config.default_format
+        self._files = Files(dir=records_dir, read_only=db.read_only, format=records_format, cache=db.cache)
+        # Record files have their own bounded cache, so records never evict the indexes
+        self._record_files = Files(dir=records_dir, read_only=db.read_only, format=records_format,
+                                   cache=db.record_cache)
 
         self._schema = self._meta.json_schema
+        self._changelog = ChangeLog(records_dir, db.cache)
+        self._manifest = ManifestFile(records_dir, db.cache)
+        self._search = SearchIndex(records_dir, self._meta.search.fields, db.cache) \
+            if self._meta.search is not None else None
 
         # Extract namespace and table name from path
         self._namespace = dir.parent.name
@@ -80,16 +320,23 @@ class Table(ITable):
             dir=dir, read_only=False, format=db.global_config.default_format)
 
         # Create table metadata file
-        table_meta = TableMeta()
+        table_meta = TableMeta(stats=TableStatsData(modified=time.time()))
         files.write_file("takoc", table_meta.model_dump())
 
         # Create empty records list file
-        empty_records = Records(records=[])
-        files.write_file("records", empty_records.model_dump())
+        files.write_file("records", RecordIndex().to_data())
+        ChangeLog(dir).create([])
+        if db.checksums:
+            ManifestFile(dir).write(Manifest())
 
         # Create and return table instance
         return cls(db=db, dir=dir)
 
+    @property
+    def records_dir(self) -> Path:
+        """Get the directory of the record files"""
+        return self._files.dir
+
     @property
     def json_schema(self) -> dict | None:
         return self._schema
@@ -112,46 +359,458 @@ class Table(ITable):
         """
         return self._table_name
 
-    def _get_records(self) -> Records:
+    def _get_records(self) -> RecordIndex:
         """Get all records
 
         Returns:
-            Record list object
+            Record index, shared with the cache and must not be mutated
         """
-        return Records(**self._files.read_file("records"))
+        return self._files.read_cached("records", RecordIndex.parse, RecordIndex.parse_trusted)
 
-    def _get_record(self, record_id: str, records: Records = None) -> RecordPos | None:
-        """Get record position
+    def _update_records(self, records: RecordIndex) -> None:
+        """Update record list
 
         Args:
-            record_id: Record ID
+            records: Record index
+        """
+        # Cache the index itself, so the next lookups neither parse the file nor sort the IDs again
+        self._files.write_file("records", records.to_data(), cached=records)
+
+    def _get_manifest(self) -> Manifest | None:
+        """Get the content hashes of the record files
 
         Returns:
-            Record position object
+            Manifest shared with the cache and must not be mutated, None if the table has no manifest
         """
-        if records is None:
-            records = self._get_records()
-        for record in records.records:
-            if record.id == record_id:
-                return record
-        return None
+        return self._manifest.read()
 
-    def _update_records(self, records: Records) -> None:
-        """Update record list
+    def _log_changes(self, changes: list[tuple[LOG_OP, str]]) -> None:
+        """Log mutations in the change log, must be called with the table lock held after the index is written"""
+        if self._changelog.exists():
+            self._changelog.append(changes)
+        else:
+            # Tables created before change logs get one with every current record
+            self._changelog.create(self._get_records().ids)
+
+    @timed("table.changes_since")
+    def changes_since(self, token: str) -> ChangesResponse:
+        """Get the records created, updated or deleted since a token
+
+        Args:
+            token: Token of a previous response, empty for every record
+
+        Returns:
+            Changed records and the token of the current state
+
+        Raises:
+            TokenExpiredError: The token is too old or from a replaced change log, re-sync fully
+            ValueError: Malformed token, or no change log in read-only mode
+        """
+        if not self._changelog.exists():
+            if self._files.read_only:
+                raise ValueError(f"Table '{self._table_name}' has no change log")
+            with self._db.lock(str(self._files.dir)):
+                if not self._changelog.exists():
+                    self._changelog.create(self._get_records().ids)
+        state = self._changelog.read()
+        upserted, deleted = state.since(token)
+        return ChangesResponse(token=state.token, upserted=upserted, deleted=deleted)
+
+    def _file_stat(self, file_name: str) -> FileStat:
+        """Get the format and size of a record file"""
+        info = self._record_files.file_info(file_name)
+        if info is None:
+            return None
+        try:
+            return info[1], os.stat(info[0]).st_size
+        except OSError:
+            return None
+
+    def _compute_stats(self) -> TableStatsData:
+        """Compute the statistics from the record files, stats every file without reading it"""
+        records = self._get_records()
+        size = 0
+        modified = None
+        formats: dict[str, int] = {}
+        for _, file_name in records:
+            info = self._record_files.file_info(file_name)
+            if info is None:
+                continue
+            try:
+                stat = os.stat(info[0])
+            except OSError:
+                continue
+            size += stat.st_size
+            formats[info[1]] = formats.get(info[1], 0) + 1
+            modified = max(modified or 0.0, stat.st_mtime)
+        return TableStatsData(count=len(records), bytes=size, modified=modified, formats=formats)
+
+    def _update_stats(self, count: int, files: list[tuple[FileStat, FileStat]]) -> None:
+        """Update the statistics in the metadata file, must be called with the table lock held after the writes
+
+        Args:
+            count: Number of records created, negative for deleted records
+            files: (previous, new) format and size of the written or deleted record files
+        """
+        meta = TableMeta.load(self._meta_files)
+        if meta is None:
+            return
+        if meta.stats is None:
+            # Tables created before statistics get them from the files, the writes included
+            stats = self._compute_stats()
+        else:
+            size = meta.stats.bytes
+            formats = dict(meta.stats.formats)
+            for old, new in files:
+                if old is not None:
+                    size -= old[1]
+                    formats[old[0]] = formats.get(old[0], 0) - 1
+                    if formats[old[0]] <= 0:
+                        del formats[old[0]]
+                if new is not None:
+                    size += new[1]
+                    formats[new[0]] = formats.get(new[0], 0) + 1
+            stats = TableStatsData(count=meta.stats.count + count, bytes=size, modified=time.time(), formats=formats)
+        self._meta_files.write_file("takoc", meta.model_copy(update={"stats": stats}).model_dump())
+
+    def _index_search(self, changes: list[tuple[str, Any]]) -> None:
+        """Update the search index if the table declares one, must be called with the table lock held
+
+        Args:
+            changes: (record ID, data) pairs, data is None for a deleted record
+        """
+        if self._search is not None:
+            self._search.apply(changes)
+
+    def _records_version(self) -> tuple | None:
+        """Get the modification time and size of the records file"""
+        info = self._files.file_info("records")
+        try:
+            stat = os.stat(info[0]) if info is not None else None
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+
+    def _update_columns(self, changes: list[tuple[str, Any]]) -> None:
+        """Update the columnar copy of the table if it has one, must be called with the table lock held
+
+        Args:
+            changes: (record ID, data) pairs, data is None for a deleted record
+        """
+        columns = self._db.columns.get(str(self._files.dir))
+        if columns is not None:
+            columns.apply(changes)
+            columns.version = self._records_version()
+
+    def _record_change(self, op: CHANGE_OP, record_id: str | None = None) -> None:
+        """Record a mutation of the table, committed with the table lock held while its files are staged"""
+        self._db.record_change(op, self._namespace, self._table_name, record_id, lock=str(self._files.dir),
+                               paths=[self._dir, self._files.dir])
+
+    def _source_views(self) -> list["ViewMetadata"]:
+        """Get the views derived from this table"""
+        source = f"{self._namespace}.{self._table_name}"
+        return [view for view in self._db.metadata.get_views() if view.source == source]
+
+    def _update_views(self, views: list["ViewMetadata"], changes: list[tuple[str, Any, Any]]) -> None:
+        """Write changed records to the views of the table, must be called with the table lock held
+
+        Args:
+            views: Views from `_source_views`
+            changes: (record ID, old data, new data), data is None for a missing record
+        """
+        if views:
+            from .view import apply_views
+            apply_views(self._db, views, changes)
+
+    def _build_views(self) -> None:
+        """Build the views of the table from all its records, must be called with the table lock held"""
+        views = self._source_views()
+        if views:
+            from .view import build_views
+            build_views(self._db, views, self)
+
+    @timed("table.aggregate")
+    def aggregate(self, group_by: list[str], metrics: list[tuple[str, str | None]],
+                  filters: list[tuple[str, str, Any]]) -> list[AggregateRowData]:
+        """Aggregate the scalar fields of the records on their columnar copy, see `aggregate`
+
+        The columns are built on the first aggregation and kept up to date by the writes. Without NumPy, the records
+        are aggregated one by one.
+
+        Args:
+            group_by: Fields of the group keys, a single group if empty
+            metrics: (function, field) pairs, the field is None for 'count'
+            filters: (field, operator, value) the records must all match
+
+        Returns:
+            One row per group, by group key
+        """
+        try:
+            from .columnar import TableColumns
+        except ImportError:
+            return super().aggregate(group_by, metrics, filters)
+        key = str(self._files.dir)
+        columns = self._db.columns.get(key)
+        if columns is None or columns.version != self._records_version():
+            with self._db.lock(key):
+                columns = self._db.columns.get(key)
+                version = self._records_version()
+                if columns is None or columns.version != version:
+                    columns = self._db.columns[key] = TableColumns.build(self.iter_records(), version)
+        return columns.aggregate(group_by, metrics, filters)
+
+    @timed("table.query")
+    def query(self, filters: list[tuple[str, str, Any]], sort: list[tuple[str, bool]], limit: int | None = None,
+              fields: list[str] | None = None, workers: int | None = None) -> list[tuple[str, Any]]:
+        """Filter, sort and limit the records on worker processes, see `query`
+
+        The record index is split in partitions of `scan.SCAN_CHUNK_SIZE` records. Workers of the shared pool, started
+        once per process, parse the record files of a partition and send back only its matching rows, sorted and
+        limited, which are merged here. Without sort, the
+        partitions left are cancelled once `limit` rows are found. Record files are read around the record cache.
+
+        Args:
+            filters: (field, operator, value) the records must all match
+            sort: (field, descending) pairs, index order if empty
+            limit: Maximum number of records
+            fields: Dotted paths of the returned fields, whole records if None
+            workers: Number of worker processes, None for the shared pool, 0 to scan in the calling thread
+
+        Returns:
+            (record ID, selected data) pairs
+        """
+        from .pool import process_pool
+        from .scan import SCAN_CHUNK_SIZE, scan_partition
+        from ..api.query import merge_rows
+
+        entries = list(self._get_records())
+        chunks = [entries[i:i + SCAN_CHUNK_SIZE] for i in range(0, len(entries), SCAN_CHUNK_SIZE)]
+        partitions = []
+        found = 0
+        # A single partition is not worth starting processes
+        with process_pool(workers if len(chunks) > 1 else 0) as executor:
+            futures = [executor.submit(scan_partition, str(self._files.dir), chunk, filters, sort, limit, fields)
+                       for chunk in chunks]
+            for future in futures:
+                partitions.append(future.result())
+                found += len(partitions[-1])
+                if not sort and limit is not None and found >= limit:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        return merge_rows(partitions, sort, limit)
+
+    @timed("table.search")
+    def search(self, query: str, limit: int = 20) -> list[tuple[str, float]]:
+        """Rank the records matching the words of a query with BM25
+
+        The index is built from the records on the first search, and kept up to date by the writes from then on.
+
+        Args:
+            query: Words to search
+            limit: Maximum number of results
+
+        Returns:
+            (record ID, score) by descending score
+
+        Raises:
+            ValueError: The table declares no search index
+        """
+        if self._search is None:
+            raise ValueError(f"Table '{self._table_name}' has no search index")
+        state = self._search.read()
+        if state is None:
+            if self._files.read_only:
+                state = SearchIndexState.build(self._meta.search.fields, self._search.documents(self.iter_records()))
+            else:
+                with self._db.lock(str(self._files.dir)):
+                    state = self._search.read() or self._search.build(self.iter_records())
+        return state.search(query, limit)
+
+    @timed("table.stats")
+    def stats(self) -> TableStatsData:
+        """Get the record count and sizes of the table, in O(1) from its metadata file
+
+        Tables created before statistics get them computed from the record files on every call, without saving them,
+        until their first write or `build_stats`. Edits of the files outside takoc are not counted until the records
+        are repaired, see `replace_records`.
+
+        Returns:
+            Statistics, shared with the cache and must not be mutated
+        """
+        meta = TableMeta.load(self._meta_files)
+        if meta is not None and meta.stats is not None:
+            return meta.stats
+        return self._compute_stats()
+
+    def build_stats(self) -> TableStatsData:
+        """Compute the statistics of a table created before them and save them, kept up to date from then on
+
+        Returns:
+            Statistics, shared with the cache and must not be mutated
+
+        Raises:
+            ReadOnlyError: Read-only mode and the table has no statistics
+        """
+        meta = TableMeta.load(self._meta_files)
+        if meta is not None and meta.stats is not None:
+            return meta.stats
+        if self._meta_files.read_only:
+            raise ReadOnlyError("Read-only mode, cannot save table statistics")
+        with self._db.lock(str(self._files.dir)):
+            meta = TableMeta.load(self._meta_files)
+            if meta is None:
+                return self._compute_stats()
+            if meta.stats is not None:
+                return meta.stats
+            stats = self._compute_stats()
+            self._meta_files.write_file("takoc", meta.model_copy(update={"stats": stats}).model_dump())
+            return stats
+
+    def _write_record_file(self, file_name: str, data: Any) -> tuple[FileStat, FileStat]:
+        """Write a record file and its manifest entry, must be called with the table lock held
+
+        Returns:
+            Previous and new format and size of the file, for the statistics
+        """
+        old = self._file_stat(file_name)
+        manifest = self._get_manifest()
+        hash = self._record_files.write_file(file_name, data, checksum=manifest is not None)
+        stat = os.stat(self._record_files.dir / (file_name + self._record_files.default_ext))
+        if manifest is not None:
+            self._manifest.append(manifest, {file_name: entry_of(hash, stat)})
+        return old, (self._record_files.format, stat.st_size)
+
+    def _delete_record_file(self, file_name: str) -> FileStat:
+        """Delete a record file and its manifest entry, must be called with the table lock held
+
+        Returns:
+            Format and size of the deleted file, for the statistics
+        """
+        old = self._file_stat(file_name)
+        self._record_files.delete_file(file_name)
+        manifest = self._get_manifest()
+        if manifest is not None and manifest.get(file_name) is not None:
+            self._manifest.append(manifest, {file_name: None})
+        return old
+
+    @property
+    def record_index(self) -> RecordIndex:
+        """Get the record index, shared with the cache and must not be mutated"""
+        return self._get_records()
+
+    @property
+    def has_manifest(self) -> bool:
+        """Whether the table keeps content hashes of its record files"""
+        return self._get_manifest() is not None
+
+    def build_manifest(self) -> None:
+        """Hash every record file and write the manifest, the table keeps it up to date from then on"""
+        with self._db.lock(str(self._files.dir)):
+            entries = {}
+            for _, file_name in self._get_records():
+                file_info = self._record_files.file_info(file_name)
+                if file_info is not None:
+                    file, _ = file_info
+                    stat = os.stat(file)
+                    entries[file_name] = entry_of(file_hash(file), stat)
+            self._manifest.write(Manifest(entries))
+
+    def diff_manifest(self, full: bool = False) -> ManifestDiffData:
+        """Compare the record files with the manifest
+
+        Files whose size and modification time match the manifest are not read, unless `full`.
 
         Args:
-            records: Record list object
+            full: Hash every record file
+
+        Returns:
+            Record IDs whose file changed, is missing, or is not listed in the manifest
+
+        Raises:
+            ValueError: The table has no manifest
+        """
+        manifest = self._get_manifest()
+        if manifest is None:
+            raise ValueError(f"Table '{self._table_name}' has no manifest")
+        diff = ManifestDiffData()
+        for record_id, file_name in self._get_records():
+            file_info = self._record_files.file_info(file_name)
+            if file_info is None:
+                diff.missing.append(record_id)
+                continue
+            matches = manifest.matches(file_name, file_info[0], full=full)
+            if matches is None:
+                diff.unlisted.append(record_id)
+            elif not matches:
+                diff.changed.append(record_id)
+        return diff
+
+    def verify(self) -> ManifestDiffData:
+        """Hash every record file and compare it with the manifest
+
+        Raises:
+            ValueError: The table has no manifest
         """
-        self._files.write_file("records", records.model_dump())
+        return self.diff_manifest(full=True)
+
+    def record_hash(self, record_id: str) -> str | None:
+        """Get the content hash of a record from the manifest, None if unknown"""
+        manifest = self._get_manifest()
+        file_name = self._get_records().file_of(record_id)
+        if manifest is None or file_name is None:
+            return None
+        entry = manifest.get(file_name)
+        return entry[0] if entry is not None else None
 
+    def replace_records(self, records: RecordIndex) -> None:
+        """Replace the record index, for repair tools; record files are not touched
+
+        Args:
+            records: New record index
+        """
+        with self._db.lock(str(self._files.dir)):
+            self._update_records(records)
+            # The records may have changed in any way, start a new epoch so consumers re-sync fully
+            if not self._files.read_only:
+                self._changelog.create(records.ids)
+                if self._search is not None:
+                    self._search.delete()
+                meta = TableMeta.load(self._meta_files)
+                if meta is not None:
+                    meta = meta.model_copy(update={"stats": self._compute_stats()})
+                    self._meta_files.write_file("takoc", meta.model_dump())
+                self._build_views()
+            self._db.columns.pop(str(self._files.dir), None)
+
+    @timed("table.list_records")
     def list_records(self) -> list[str]:
         """Get all records in the table
 
         Returns:
             List of record IDs
         """
-        return [record.id for record in self._get_records().records]
+        return list(self._get_records().ids)
+
+    @timed("table.scan_records")
+    def scan_records(self, prefix: str = "", start: str | None = None, end: str | None = None, reverse: bool = False,
+                     limit: int | None = None) -> list[str]:
+        """List record IDs in ID order within a range, in O(log n + k) from the sorted IDs of the index
+
+        Args:
+            prefix: Keep the IDs starting with it
+            start: First ID, inclusive
+            end: Last ID, exclusive
+            reverse: Descending order, `limit` then keeps the last IDs of the range
+            limit: Maximum number of IDs
 
+        Returns:
+            List of record IDs
+        """
+        return self._get_records().scan(prefix, start, end, reverse, limit)
+
+    @timed("table.get_record")
     def get_record(self, record_id: str) -> Any:
         """Get a specific record
 
@@ -164,11 +823,189 @@ class Table(ITable):
         Raises:
             ValueError: Record not found
         """
-        record = self._files.read_file(record_id)
+        file_name = self._get_records().file_of(record_id)
+        record = self.load_record_file(file_name) if file_name is not None else None
         if record is None:
             raise ValueError(f"Record '{record_id}' not found in table")
         return record
 
+    def iter_records(self, workers: int = 8, read_ahead: int = 64) -> Iterator[tuple[str, Any]]:
+        """Iterate over all records in index order, reading the record files ahead on a thread pool
+
+        Record files are read around the record cache, so a full scan does not evict the hot records.
+        Records whose file is missing are skipped with a warning.
+
+        Args:
+            workers: Threads reading record files
+            read_ahead: Maximum number of record files read but not consumed yet
+
+        Returns:
+            Iterator of (record ID, data)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="takoc-read")
+        pending = deque()
+        try:
+            for record_id, file_name in self._get_records():
+                pending.append((record_id, executor.submit(self._record_files.read_file, file_name)))
+                if len(pending) >= read_ahead:
+                    yield from self._consume(pending.popleft())
+            while pending:
+                yield from self._consume(pending.popleft())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _consume(self, item: tuple[str, "Future"]) -> Iterator[tuple[str, Any]]:
+        record_id, future = item
+        data = future.result()
+        if data is None:
+            logger.warning("Record '%s' of table '%s.%s' has no file", record_id, self._namespace, self._table_name)
+        else:
+            yield record_id, data
+
+    @timed("table.import_records")
+    def import_records(self, chunks: Iterable[bytes], format: str = "ndjson", id_field: str = "id",
+                       skip_existing: bool = False, validate: bool = False, workers: int | None = None,
+                       batch_size: int = 1000, checkpoint: int | None = None) -> ImportResponse:
+        """Create records from a JSON Lines or CSV stream
+
+        Rows are parsed, validated and serialized in batches on worker processes, of the shared pool unless `workers`
+        is given, record files are written by a thread pool and the records file is written once at the end, or every
+        `checkpoint` records. The table is
+        locked during the import. After a failure, importing again with `skip_existing` resumes after the last
+        written record, or after the last checkpoint if the process was killed.
+
+        Args:
+            chunks: Stream of the body
+            format: 'ndjson' or 'csv'
+            id_field: Member or column holding the record ID
+            skip_existing: Skip records that already exist instead of rejecting them
+            validate: Validate the records against the JSON schema of the table, if it has one
+            workers: Number of worker processes, None for the shared pool, 0 to parse in the calling thread
+            batch_size: Rows per batch sent to a worker
+            checkpoint: Write the records file every this many imported records, only at the end if None
+
+        Returns:
+            Counts of imported, skipped and rejected rows
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from itertools import islice
+
+        from .importer import prepare_batch, PreparedRow
+        from .pool import process_pool
+        from ..api.bulk_import import iter_rows
+
+        if self._files.read_only:
+            raise ReadOnlyError("Read-only mode, cannot import records")
+        schema = self._schema if validate else None
+        result = ImportResponse()
+        rows = iter_rows(chunks, format)
+        batches = iter(lambda: list(islice(rows, batch_size)), [])
+
+        with self._db.lock(str(self._files.dir)), process_pool(workers) as executor, \
+                ThreadPoolExecutor(max_workers=8, thread_name_prefix="takoc-import") as writer:
+            index = self._get_records()
+            manifest = self._get_manifest()
+            seen = set()
+            taken = set()
+            entries: list[tuple[str, str]] = []
+            sizes: list[int] = []
+            hashes: dict[str, tuple[str, int, int]] = {}
+
+            def flush() -> None:
+                nonlocal index, manifest
+                if entries:
+                    index = index.extend(entries)
+                    self._update_records(index)
+                    self._log_changes([("u", record_id) for record_id, _ in entries])
+                    if self._search is not None:
+                        # Imported records are only serialized here, the index is built again on the next search
+                        self._search.delete()
+                    self._db.columns.pop(str(self._files.dir), None)
+                    format = self._record_files.format
+                    self._update_stats(len(entries), [(None, (format, size)) for size in sizes])
+                    entries.clear()
+                    sizes.clear()
+                if manifest is not None and hashes:
+                    manifest = self._manifest.append(manifest, hashes)
+                    hashes.clear()
+
+            def write(file_name: str, content: bytes) -> None:
+                hash = self._record_files.write_content(file_name, content, checksum=manifest is not None)
+                if manifest is not None:
+                    path = self._record_files.dir / (file_name + self._record_files.default_ext)
+                    hashes[file_name] = entry_of(hash, os.stat(path))
+
+            def apply(prepared: list[PreparedRow]) -> None:
+                writes = []
+                for line_no, record_id, content, error in prepared:
+                    if error is not None:
+                        result.fail(line_no, error)
+                    elif record_id in seen:
+                        result.fail(line_no, f"Record '{record_id}' is imported twice")
+                    elif record_id in index:
+                        if skip_existing:
+                            result.skipped += 1
+                        else:
+                            result.fail(line_no, f"Record '{record_id}' already exists")
+                    else:
+                        seen.add(record_id)
+                        file_name = self._import_file_name(record_id, taken)
+                        writes.append((file_name, content))
+                        entries.append((record_id, file_name))
+                        sizes.append(len(content))
+                for _ in writer.map(lambda item: write(*item), writes):
+                    pass
+                result.imported += len(writes)
+                if checkpoint is not None and len(entries) >= checkpoint:
+                    flush()
+
+            # Keep a bounded number of batches in flight, the input may not fit in memory
+            window = 2 * (workers if workers is not None else os.cpu_count() or 1) or 1
+            pending = deque()
+            try:
+                for batch in batches:
+                    pending.append(executor.submit(
+                        prepare_batch, batch, format, id_field, schema, self._record_files.format))
+                    if len(pending) >= window:
+                        apply(pending.popleft().result())
+                while pending:
+                    apply(pending.popleft().result())
+            finally:
+                # Index the written files even if the import fails, a killed import leaves them as orphans for fsck
+                flush()
+            if result.imported:
+                self._build_views()
+
+        if result.imported:
+            self._record_change("update")
+        return result
+
+    def _import_file_name(self, record_id: str, taken: set[str]) -> str:
+        """Get a file name not used on disk nor by another record of the running import"""
+        file_name = self._files.generate_file_name(record_id)
+        if file_name in taken:
+            base = file_name
+            n = 1
+            while file_name in taken or self._files.file_info(file_name) is not None:
+                file_name = f"{base}_{n}"
+                n += 1
+        taken.add(file_name)
+        return file_name
+
+    def load_record_file(self, file_name: str) -> Any:
+        """Read a record file, through the record cache if enabled
+
+        Args:
+            file_name: Record file name without extension
+
+        Returns:
+            Record data, shared with the record cache and must not be mutated; None if not found
+        """
+        return self._record_files.read_cached(file_name, _identity)
+
+    @timed("table.create_record")
     def create_record(self, record_id: str, data: Any) -> None:
         """Create a new record
 
@@ -179,17 +1016,22 @@ class Table(ITable):
         Returns:
             None
         """
-        records = self._get_records()
-        record = self._get_record(record_id, records=records)
-        if record is not None:
-            raise ValueError(f"Record '{record_id}' already exists")
+        with self._db.lock(str(self._files.dir)):
+            records = self._get_records()
+            if record_id in records:
+                raise ValueError(f"Record '{record_id}' already exists")
 
-        file_name = self._files.generate_file_name(record_id)
-        records.records.append(RecordPos(id=record_id, file=file_name))
-        self._update_records(records)
+            file_name = self._files.generate_file_name(record_id)
+            self._update_records(records.add(record_id, file_name))
 
-        self._files.write_file(file_name, data)
+            self._update_stats(1, [self._write_record_file(file_name, data)])
+            self._index_search([(record_id, data)])
+            self._update_columns([(record_id, data)])
+            self._update_views(self._source_views(), [(record_id, None, data)])
+            self._log_changes([("u", record_id)])
+            self._record_change("create", record_id)
 
+    @timed("table.update_record")
     def update_record(self, record_id: str, data: Any) -> None:
         """Update a record
 
@@ -203,12 +1045,58 @@ class Table(ITable):
         Raises:
             ValueError: Record not found
         """
-        record = self._get_record(record_id)
-        if record is None:
-            raise ValueError(f"Record '{record_id}' not found in table")
+        with self._db.lock(str(self._files.dir)):
+            file_name = self._get_records().file_of(record_id)
+            if file_name is None:
+                raise ValueError(f"Record '{record_id}' not found in table")
+
+            views = self._source_views()
+            # Read before the write, to take the record out of its previous group
+            old = self.load_record_file(file_name) if views else None
+            self._update_stats(0, [self._write_record_file(file_name, data)])
+            self._index_search([(record_id, data)])
+            self._update_columns([(record_id, data)])
+            self._update_views(views, [(record_id, old, data)])
+            self._log_changes([("u", record_id)])
+            self._record_change("update", record_id)
+
+    @timed("table.update_record_path")
+    def update_record_path(self, record_id: str, pointer: str, value: Any) -> None:
+        """Set the value at a JSON pointer of a record, see `fields.set_path`
 
-        self._files.write_file(record.file, data)
+        Args:
+            record_id: Record ID
+            pointer: JSON pointer, e.g. '/address/city'
+            value: New value
 
+        Raises:
+            ValueError: Record or parent path not found
+        """
+        with self._db.lock(str(self._files.dir)):
+            self.update_record(record_id, set_path(self.get_record(record_id), pointer, value))
+
+    @timed("table.patch_record")
+    def patch_record(self, record_id: str, patch: Any, format: PATCH_FORMAT = "merge") -> Any:
+        """Apply a JSON merge patch or a JSON patch to a record, under the table lock
+
+        Args:
+            record_id: Record ID
+            patch: Merge patch, or list of JSON patch operations
+            format: 'merge' (RFC 7396) or 'json' (RFC 6902)
+
+        Returns:
+            Patched record, shares its unchanged values with the record cache and must not be mutated
+
+        Raises:
+            PatchError: The patch cannot be applied
+            ValueError: Record not found
+        """
+        with self._db.lock(str(self._files.dir)):
+            record = apply_patch(self.get_record(record_id), patch, format)
+            self.update_record(record_id, record)
+        return record
+
+    @timed("table.delete_record")
     def delete_record(self, record_id: str) -> None:
         """Delete a record
 
@@ -221,13 +1109,19 @@ class Table(ITable):
         Raises:
             ValueError: Record not found
         """
-        records = self._get_records()
-        record = self._get_record(record_id, records=records)
-        if record is None:
-            raise ValueError(f"Record '{record_id}' not found in table")
+        with self._db.lock(str(self._files.dir)):
+            records = self._get_records()
+            file_name = records.file_of(record_id)
+            if file_name is None:
+                raise ValueError(f"Record '{record_id}' not found in table")
 
-        records.records = [
-            record for record in records.records if record.id != record_id]
-        self._update_records(records)
+            views = self._source_views()
+            old = self.load_record_file(file_name) if views else None
+            self._update_records(records.remove(record_id))
 
-        self._files.delete_file(record.file)
+            self._update_stats(-1, [(self._delete_record_file(file_name), None)])
+            self._index_search([(record_id, None)])
+            self._update_columns([(record_id, None)])
+            self._update_views(views, [(record_id, old, None)])
+            self._log_changes([("d", record_id)])
+            self._record_change("delete", record_id)
@@ -0,0 +1,177 @@
+import random
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from .db import TakocLocalDb
+from ..api.aggregate import aggregate_records, parse_filter, parse_metric
+from ..api.v1 import ITable, NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+ORDERS = {
+    "o1": {"status": "open", "amount": 10, "customer": {"country": "FR"}, "paid": False},
+    "o2": {"status": "open", "amount": 5.5, "customer": {"country": "DE"}, "paid": True},
+    "o3": {"status": "closed", "amount": 20, "customer": {"country": "FR"}, "paid": True},
+    "o4": {"status": "closed", "amount": "n/a", "tags": ["x"]},
+    "o5": "not an object",
+}
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with a table of orders"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="orders", description="Table"))
+        table = namespace.load_table("orders")
+        for record_id, data in ORDERS.items():
+            table.create_record(record_id, data)
+        yield db
+
+
+def load(db):
+    return db.load_namespace("ns").load_table("orders")
+
+
+def rows(result) -> list[tuple[dict, dict]]:
+    return [(row.group, row.values) for row in result]
+
+
+def test_parse():
+    """Test metrics and filters are parsed, with JSON values or plain strings"""
+    assert parse_metric("count") == ("count", None)
+    assert parse_metric("sum:a.b") == ("sum", "a.b")
+    assert parse_filter("amount>=10") == ("amount", ">=", 10)
+    assert parse_filter("status=open") == ("status", "=", "open")
+    assert parse_filter("paid!=true") == ("paid", "!=", True)
+    assert parse_filter('code="10"') == ("code", "=", "10")
+    for text in ["sum", "median:a", "count:a"]:
+        with pytest.raises(ValueError):
+            parse_metric(text)
+    for text in ["amount", "amount<null", "a=[1]"]:
+        with pytest.raises(ValueError):
+            parse_filter(text)
+
+
+def test_aggregate_records():
+    """Test groups, metrics over numbers only, and filters matching values of the same kind"""
+    metrics = [("count", None), ("sum", "amount"), ("mean", "amount"), ("min", "amount"), ("max", "amount")]
+    assert rows(aggregate_records(ORDERS.values(), ["status"], metrics, [])) == [
+        ({"status": None}, {"count": 1, "sum:amount": None, "mean:amount": None, "min:amount": None,
+                            "max:amount": None}),
+        ({"status": "closed"}, {"count": 2, "sum:amount": 20, "mean:amount": 20, "min:amount": 20,
+                                "max:amount": 20}),
+        ({"status": "open"}, {"count": 2, "sum:amount": 15.5, "mean:amount": 7.75, "min:amount": 5.5,
+                              "max:amount": 10}),
+    ]
+    assert rows(aggregate_records(ORDERS.values(), [], [("count", None)], [("amount", ">", 6)])) == [
+        ({}, {"count": 2})]
+    assert rows(aggregate_records(ORDERS.values(), ["customer.country"], [("count", None)],
+                                  [("paid", "=", True)])) == [
+        ({"customer.country": "DE"}, {"count": 1}), ({"customer.country": "FR"}, {"count": 1})]
+    assert rows(aggregate_records(ORDERS.values(), [], [("count", None)], [("customer.country", "=", None)])) == [
+        ({}, {"count": 2})]
+    assert rows(aggregate_records([], [], [("count", None), ("sum", "a")], [])) == [({}, {"count": 0, "sum:a": None})]
+
+
+def random_records(rng: random.Random, count: int) -> dict[str, dict]:
+    values = [None, 0, 1, 2.5, -3, 1.0, "a", "b", "", True, False, [1], {"x": 1}]
+    return {f"r{i}": {field: value for field in ("g", "h", "v", "n.x")
+                      if (value := rng.choice(values)) is not None} for i in range(count)}
+
+
+def test_columnar_matches_python():
+    """Test the columnar evaluation gives the results of the Python one, through writes"""
+    pytest.importorskip("numpy")
+    from . import columnar
+    from .columnar import TableColumns
+
+    rng = random.Random(7)
+    records = random_records(rng, 300)
+    columns = TableColumns.build(records.items(), None)
+    queries = [
+        ([], [("count", None)], []),
+        (["g"], [("count", None), ("sum", "v"), ("mean", "v"), ("min", "h"), ("max", "h")], []),
+        (["g", "n"], [("count", None), ("sum", "n.x")], [("v", ">=", 0)]),
+        (["h"], [("count", None)], [("g", "!=", "a"), ("v", "!=", None)]),
+        (["missing"], [("sum", "missing")], [("g", "<", "b")]),
+        ([], [("count", None)], [("g", "=", True), ("h", "=", None)]),
+    ]
+
+    def check():
+        for group_by, metrics, filters in queries:
+            expected = aggregate_records(records.values(), group_by, metrics, filters)
+            assert rows(columns.aggregate(group_by, metrics, filters)) == rows(expected)
+
+    check()
+    columnar_capacity = columnar.INITIAL_CAPACITY
+    for i in range(2 * columnar_capacity):
+        record_id = f"r{rng.randrange(400)}"
+        if rng.random() < 0.3:
+            records.pop(record_id, None)
+            columns.apply([(record_id, None)])
+        else:
+            records[record_id] = random_records(rng, 1)["r0"]
+            columns.apply([(record_id, records[record_id])])
+    assert len(columns) == len(records)
+    check()
+
+
+def test_large_integers():
+    """Test integer columns keep their precision above 2**53, and are promoted to floats once mixed"""
+    pytest.importorskip("numpy")
+    from .columnar import TableColumns
+
+    big = 2 ** 62 + 1
+    records = {"r1": {"g": "a", "v": big}, "r2": {"g": "a", "v": big}, "r3": {"g": "b", "v": -big}, "r4": {"v": 1}}
+    metrics = [("sum", "v"), ("mean", "v"), ("min", "v"), ("max", "v")]
+    for group_by, filters in [(["g"], []), (["v"], []), ([], [("v", ">", 2 ** 62)])]:
+        expected = aggregate_records(records.values(), group_by, metrics, filters)
+        assert rows(TableColumns.build(records.items(), None).aggregate(group_by, metrics, filters)) == rows(expected)
+    assert rows(aggregate_records(records.values(), ["g"], metrics, []))[1][1] == \
+           {"sum:v": 2 * big, "mean:v": big / 1, "min:v": big, "max:v": big}
+
+    columns = TableColumns.build(records.items(), None)
+    columns.apply([("r5", {"v": 0.5})])
+    assert rows(columns.aggregate([], [("sum", "v")], [])) == [({}, {"sum:v": float(big + 1.5)})]
+
+
+def test_table_aggregate(temp_db):
+    """Test the columns of a table follow its writes, and are built again after external edits"""
+    pytest.importorskip("numpy")
+    table = load(temp_db)
+    by_status = (["status"], [("count", None), ("sum", "amount")], [])
+    assert rows(table.aggregate(*by_status))[2] == ({"status": "open"}, {"count": 2, "sum:amount": 15.5})
+    assert str(table.records_dir) in temp_db.columns
+
+    table.update_record("o2", {"status": "closed", "amount": 1})
+    table.delete_record("o3")
+    table.create_record("o6", {"status": "open", "amount": 4})
+    expected = ITable.aggregate(table, *by_status)
+    assert rows(table.aggregate(*by_status)) == rows(expected)
+
+    # External edit of the records file
+    table.replace_records(table.record_index.remove("o6"))
+    assert rows(table.aggregate(*by_status))[2] == ({"status": "open"}, {"count": 1, "sum:amount": 10})
+
+
+def test_aggregate_endpoint(temp_db):
+    """Test query parameters and invalid queries"""
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        response = client.get("/aggregate/ns/orders?group_by=customer.country&metric=count&metric=max:amount"
+                              "&filter=status=open")
+        assert response.status_code == 200
+        assert response.json() == [
+            {"group": {"customer.country": "DE"}, "values": {"count": 1, "max:amount": 5.5}},
+            {"group": {"customer.country": "FR"}, "values": {"count": 1, "max:amount": 10}},
+        ]
+        assert client.get("/aggregate/ns/orders").json() == [{"group": {}, "values": {"count": 5}}]
+        assert client.get("/aggregate/ns/orders?metric=median:amount").status_code == 400
+        assert client.get("/aggregate/ns/orders?filter=amount").status_code == 400
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,164 @@
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from .cache import FileCache
+from .db import TakocLocalDb
+from .file_io import Files
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+@pytest.fixture
+def temp_dir():
+    # Create temporary directory for testing
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        yield Path(tmp_dir)
+
+
+def test_read_cached_reuses_value(temp_dir):
+    """Test the converted value is reused while the file is unchanged"""
+    files = Files(dir=temp_dir, read_only=False, cache=FileCache())
+    files.write_file("test", {"value": 1})
+    calls = []
+
+    def convert(data):
+        calls.append(data)
+        return data["value"]
+
+    assert files.read_cached("test", convert) == 1
+    assert files.read_cached("test", convert) == 1
+    assert len(calls) == 1
+
+
+def test_read_cached_detects_changes(temp_dir):
+    """Test writes through Files and external edits are both visible"""
+    files = Files(dir=temp_dir, read_only=False, cache=FileCache())
+    files.write_file("test", {"value": 1})
+    assert files.read_cached("test", dict) == {"value": 1}
+
+    files.write_file("test", {"value": 2})
+    assert files.read_cached("test", dict) == {"value": 2}
+
+    # External edit with the same size, only the modification time changes
+    file = temp_dir / "test.yaml"
+    file.write_text("value: 3\n")
+    stat = file.stat()
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert files.read_cached("test", dict) == {"value": 3}
+
+    files.delete_file("test")
+    assert files.read_cached("test", dict) is None
+
+
+def test_read_cached_without_cache(temp_dir):
+    """Test read_cached converts every time when no cache is configured"""
+    files = Files(dir=temp_dir, read_only=False)
+    files.write_file("test", {"value": 1})
+    assert files.read_cached("test", lambda data: data["value"]) == 1
+
+
+def test_save_and_load(temp_dir):
+    """Test snapshot round trip"""
+    file = temp_dir / "data.yaml"
+    file.write_text("value: 1\n")
+    cache = FileCache()
+    cache.put(file, file.stat(), {"value": 1})
+    cache.save(temp_dir / "cache" / "snapshot.pickle")
+
+    loaded = FileCache()
+    assert loaded.load(temp_dir / "cache" / "snapshot.pickle")
+    assert loaded.get(file, file.stat()) == {"value": 1}
+
+
+def test_load_rejects_other_versions(temp_dir):
+    """Test snapshots of another format version or corrupted snapshots are ignored"""
+    snapshot = temp_dir / "snapshot.pickle"
+    with open(snapshot, "wb") as f:
+        pickle.dump({"version": FileCache.FORMAT_VERSION + 1, "entries": {"x": (0, 0, 1)}}, f)
+    cache = FileCache()
+    assert not cache.load(snapshot)
+    assert len(cache) == 0
+
+    snapshot.write_bytes(b"not a pickle")
+    assert not cache.load(snapshot)
+    assert not cache.load(temp_dir / "missing.pickle")
+
+
+def test_db_warm_start(temp_dir):
+    """Test a new database starts with the snapshot of the previous one"""
+    db_root = temp_dir / "db"
+    cache_dir = temp_dir / "cache"
+    db = TakocLocalDb(db_root=str(db_root), cache_dir=str(cache_dir))
+    db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+    namespace = db.load_namespace("ns")
+    namespace.create_table(TableCreateRequest(name="t", description="Table"))
+    namespace.load_table("t").create_record("r1", {"value": 1})
+    assert namespace.load_table("t").list_records() == ["r1"]
+    db.close()
+    assert (cache_dir / TakocLocalDb.SNAPSHOT_FILE).exists()
+
+    warm_db = TakocLocalDb(db_root=str(db_root), cache_dir=str(cache_dir))
+    assert len(warm_db.cache) >= 4
+    assert warm_db.load_namespace("ns").load_table("t").list_records() == ["r1"]
+
+    # A stale snapshot entry is parsed again
+    TakocLocalDb(db_root=str(db_root)).load_namespace("ns").load_table("t").create_record("r2", {"value": 2})
+    assert warm_db.load_namespace("ns").load_table("t").list_records() == ["r1", "r2"]
+
+
+def test_save_snapshot_without_cache_dir(temp_dir):
+    """Test saving a snapshot requires a cache directory"""
+    db = TakocLocalDb(db_root=str(temp_dir))
+    with pytest.raises(ValueError):
+        db.save_snapshot()
+
+
+def test_read_cached_trusts_written_files(temp_dir):
+    """Test files written through Files skip validation until they are edited outside takoc"""
+    files = Files(dir=temp_dir, read_only=False, cache=FileCache())
+    files.write_file("test", {"value": 1})
+    assert files.read_cached("test", lambda data: "validated", lambda data: "trusted") == "trusted"
+
+    file = temp_dir / "test.yaml"
+    file.write_text("value: 22\n")
+    assert files.read_cached("test", lambda data: "validated", lambda data: "trusted") == "validated"
+
+
+def test_put_skipped_after_newer_write(temp_dir):
+    """Test a reader does not replace the entry written after it took the stat, even with the same stat"""
+    file = temp_dir / "data.yaml"
+    file.write_text("value: 1\n")
+    stat = file.stat()
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns - FileCache.RACY_NS))
+    stat = file.stat()
+    cache = FileCache()
+
+    version = cache.version()
+    cache.put(file, stat, {"value": 2})
+    cache.put(file, stat, {"value": 1}, version)
+    assert cache.get(file, stat) == {"value": 2}
+
+    version = cache.version()
+    cache.invalidate(file)
+    cache.put(file, stat, {"value": 1}, version)
+    assert cache.get(file, stat) is None
+
+    cache.put(file, stat, {"value": 1}, cache.version())
+    assert cache.get(file, stat) == {"value": 1}
+
+
+def test_put_skipped_for_racy_files(temp_dir):
+    """Test files edited outside takoc within the timestamp granularity are not cached"""
+    file = temp_dir / "data.yaml"
+    file.write_text("value: 1\n")
+    cache = FileCache()
+    cache.put(file, file.stat(), {"value": 1}, cache.version())
+    assert cache.get(file, file.stat()) is None
+
+    stat = file.stat()
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns - FileCache.RACY_NS))
+    cache.put(file, file.stat(), {"value": 1}, cache.version())
+    assert cache.get(file, file.stat()) == {"value": 1}
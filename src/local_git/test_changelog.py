@@ -0,0 +1,122 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from . import changelog
+from .changelog import ChangeLog, ChangeLogState
+from .db import TakocLocalDb
+from ..api.error import TokenExpiredError
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with a table of two records"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="t", description="Table"))
+        table = namespace.load_table("t")
+        table.create_record("r1", {"value": 1})
+        table.create_record("r2", {"value": 2})
+        yield db
+
+
+def test_changes_since(temp_db):
+    """Test only the records changed after a token are returned, with their last change"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    full = table.changes_since("")
+    assert (full.upserted, full.deleted) == (["r1", "r2"], [])
+
+    table.update_record("r1", {"value": 3})
+    table.create_record("r3", {"value": 3})
+    table.delete_record("r2")
+    changes = table.changes_since(full.token)
+    assert (changes.upserted, changes.deleted) == (["r1", "r3"], ["r2"])
+
+    table.delete_record("r3")
+    assert table.changes_since(changes.token).deleted == ["r3"]
+    latest = table.changes_since("")
+    assert (latest.upserted, latest.deleted) == (["r1"], ["r2", "r3"])
+    assert table.changes_since(latest.token).upserted == []
+
+
+def test_invalid_token(temp_db):
+    """Test malformed tokens are rejected, and tokens of another log are expired"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    token = table.changes_since("").token
+    with pytest.raises(ValueError):
+        table.changes_since("not a token")
+    with pytest.raises(TokenExpiredError):
+        table.changes_since("other:1")
+
+    # A repair starts a new epoch
+    table.replace_records(table._get_records())
+    with pytest.raises(TokenExpiredError):
+        table.changes_since(token)
+
+
+def test_compaction(temp_db, monkeypatch):
+    """Test compaction keeps the latest entry of every record, and expires tokens older than forgotten deletions"""
+    monkeypatch.setattr(changelog, "COMPACT_MIN_BYTES", 0)
+    monkeypatch.setattr(changelog, "MAX_TOMBSTONES", 2)
+    table = temp_db.load_namespace("ns").load_table("t")
+    token = table.changes_since("").token
+    for i in range(10):
+        table.update_record("r1", {"value": i})
+    for i in range(5):
+        table.create_record(f"d{i}", {})
+        table.delete_record(f"d{i}")
+
+    log_path = table.records_dir / ChangeLog.FILE_NAME
+    assert len(log_path.read_bytes().splitlines()) <= 1 + 2 + 2 + 1
+    with pytest.raises(TokenExpiredError):
+        table.changes_since(token)
+    latest = table.changes_since("")
+    assert (latest.upserted, latest.deleted) == (["r2", "r1"], ["d3", "d4"])
+
+
+def test_existing_table(temp_db):
+    """Test a table without a change log gets one with every record"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    (table.records_dir / ChangeLog.FILE_NAME).unlink()
+    table.create_record("r3", {})
+    assert table.changes_since("").upserted == ["r1", "r2", "r3"]
+
+    (table.records_dir / ChangeLog.FILE_NAME).unlink()
+    assert table.changes_since("").upserted == ["r1", "r2", "r3"]
+
+
+def test_partial_line():
+    """Test a line interrupted by a crash is skipped, and the next append starts a new line"""
+    state = ChangeLogState.parse(b'{"epoch": "e", "horizon": 0, "seq": 0, "size": 0}\n1 u "a"\n2 u "b"\n3 d')
+    assert (state.token, state.since("")) == ("e:2", (["a", "b"], []))
+
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        log = ChangeLog(Path(tmp_dir))
+        log.create(["a"])
+        with open(log.path, "ab") as f:
+            f.write(b'2 d "')
+        assert log.append([("u", "b")]) == f"{log.read().epoch}:2"
+        assert log.read().since("") == (["a", "b"], [])
+
+
+def test_since_endpoint(temp_db):
+    """Test the changes are listed with `since`, and expired tokens are gone"""
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        response = client.get("/data/ns/t?since=")
+        assert response.status_code == 200
+        token = response.json()["token"]
+        client.delete("/data/ns/t/r1")
+        assert client.get(f"/data/ns/t?since={token}").json() == {
+            "token": token.split(":")[0] + ":3", "upserted": [], "deleted": ["r1"]}
+        assert client.get("/data/ns/t?since=bad").status_code == 400
+        assert client.get("/data/ns/t?since=other:1").status_code == 410
+    finally:
+        app.dependency_overrides.clear()
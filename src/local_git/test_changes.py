@@ -0,0 +1,104 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from .db import TakocLocalDb
+from .watcher import ChangeWatcher
+from ..api.changes import ChangeBus
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import change_events
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with a table of two records"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="t", description="Table"))
+        table = namespace.load_table("t")
+        table.create_record("r1", {"value": 1})
+        table.create_record("r2", {"value": 2})
+        yield db
+
+
+def changes(subscription) -> list[tuple]:
+    return [(event.op, event.namespace, event.table, event.record_id, event.source)
+            for event in subscription.drain()]
+
+
+def test_store_changes(temp_db):
+    """Test mutations are published to the subscriptions of their namespace or table"""
+    namespace_sub = temp_db.changes.subscribe("ns")
+    table_sub = temp_db.changes.subscribe("ns", "t")
+    other_sub = temp_db.changes.subscribe("other")
+    namespace = temp_db.load_namespace("ns")
+    namespace.load_table("t").update_record("r1", {"value": 3})
+    namespace.create_table(TableCreateRequest(name="t2", description="Table"))
+
+    assert changes(namespace_sub) == [("update", "ns", "t", "r1", "store"), ("create", "ns", "t2", None, "store")]
+    assert changes(table_sub) == [("update", "ns", "t", "r1", "store")]
+    assert changes(other_sub) == []
+
+
+def test_slow_subscriber_dropped():
+    """Test a full queue drops the subscriber without affecting the others"""
+    bus = ChangeBus()
+    notified = []
+    slow = bus.subscribe("ns", max_queue=2, notify=lambda: notified.append(1))
+    fast = bus.subscribe("ns")
+    for i in range(3):
+        bus.publish("create", "ns", "t", f"r{i}")
+
+    assert slow.dropped
+    assert slow.drain() == []
+    assert len(notified) == 3
+    assert len(fast.drain()) == 3
+    bus.publish("create", "ns", "t", "r3")
+    assert slow.drain() == []
+    fast.close()
+    assert not bus.has_subscribers
+
+
+def test_watcher(temp_db):
+    """Test external edits are published, and the store changes are not published twice"""
+    watcher = ChangeWatcher(temp_db)
+    assert watcher.poll() == 0
+    subscription = temp_db.changes.subscribe("ns")
+    assert watcher.poll() == 0
+
+    table = temp_db.load_namespace("ns").load_table("t")
+    table.create_record("r3", {"value": 3})
+    assert watcher.poll() == 0
+    subscription.drain()
+
+    # External edits: rewrite a record file through a new file, and delete a record from the index
+    records_dir = table.records_dir
+    (records_dir / "new.yaml").write_text("value: 10\n")
+    os.replace(records_dir / "new.yaml", records_dir / "r1.yaml")
+    index = (records_dir / "records.yaml").read_text()
+    (records_dir / "records.yaml").write_text("\n".join(line for line in index.splitlines() if "r2" not in line))
+    assert watcher.poll() == 2
+    assert changes(subscription) == [("update", "ns", "t", "r1", "external"), ("delete", "ns", "t", "r2", "external")]
+
+
+def test_change_events(temp_db):
+    """Test the Server-Sent Events stream, its keep-alive and its end when the subscriber is dropped"""
+
+    async def run() -> list[str]:
+        stream = change_events(temp_db.changes, "ns", "t", heartbeat=0.05)
+        messages = [await anext(stream), await anext(stream)]
+        table = temp_db.load_namespace("ns").load_table("t")
+        await asyncio.to_thread(table.delete_record, "r2")
+        messages.append(await anext(stream))
+        await stream.aclose()
+        return messages
+
+    subscribed, keep_alive, change = asyncio.run(run())
+    assert subscribed == ": subscribed\n\n"
+    assert keep_alive == ": keep-alive\n\n"
+    assert change.startswith("id: ") and "event: change\n" in change and '"record_id":"r2"' in change
+    assert not temp_db.changes.has_subscribers
@@ -0,0 +1,114 @@
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from .committer import GitCommitter, ChangeData
+from .db import TakocLocalDb
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+def git(repo: Path, *args: str) -> str:
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def temp_repo():
+    """Create temporary git repository for testing"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        repo = Path(tmp_dir)
+        git(repo, "init", "-q")
+        git(repo, "config", "user.name", "takoc")
+        git(repo, "config", "user.email", "takoc@example.com")
+        yield repo
+
+
+def commit_count(repo: Path) -> int:
+    return int(git(repo, "rev-list", "--count", "HEAD").strip())
+
+
+def test_commit_message():
+    """Test commit message lists every change"""
+    message = GitCommitter.commit_message([
+        ChangeData(op="create", namespace="ns"),
+        ChangeData(op="update", namespace="ns", table="t", record_id="r1"),
+    ])
+
+    subject, body = message.split("\n\n")
+    assert subject == "takoc: 2 changes in ns"
+    assert body.splitlines() == ["create ns", "update ns/t/r1"]
+
+
+def test_commit_by_operation_count(temp_repo):
+    """Test changes are committed once max_ops is reached"""
+    db = TakocLocalDb(db_root=str(temp_repo), committer=GitCommitter(temp_repo, max_ops=3, max_delay=60))
+    try:
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="t", description="Table"))
+        namespace.load_table("t").create_record("r1", {"value": 1})
+
+        # Wait for the background commit
+        for _ in range(100):
+            if git(temp_repo, "log", "--oneline", "--all") != "":
+                break
+            time.sleep(0.05)
+
+        assert commit_count(temp_repo) == 1
+        message = git(temp_repo, "log", "-1", "--format=%B")
+        assert "create ns\n" in message
+        assert "create ns/t\n" in message
+        assert "create ns/t/r1" in message
+        files = git(temp_repo, "ls-files").splitlines()
+        assert "ns/t/r1.yaml" in files
+        assert "ns/t/changes.log" not in files
+    finally:
+        db.close()
+
+
+def test_commit_by_time(temp_repo):
+    """Test pending changes are committed after max_delay"""
+    db = TakocLocalDb(db_root=str(temp_repo), committer=GitCommitter(temp_repo, max_ops=100, max_delay=0.1))
+    try:
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        time.sleep(0.5)
+        assert commit_count(temp_repo) == 1
+    finally:
+        db.close()
+
+
+def test_flush_and_close(temp_repo):
+    """Test flush commits pending changes and close commits the rest"""
+    db = TakocLocalDb(db_root=str(temp_repo), committer=GitCommitter(temp_repo, max_ops=100, max_delay=60))
+    db.namespaces.create_namespace(NamespaceCreateRequest(name="ns1", description="Namespace 1"))
+    assert db.committer.flush(timeout=10)
+    assert commit_count(temp_repo) == 1
+
+    db.namespaces.create_namespace(NamespaceCreateRequest(name="ns2", description="Namespace 2"))
+    db.close()
+    assert commit_count(temp_repo) == 2
+    assert "create ns2" in git(temp_repo, "log", "-1", "--format=%B")
+
+
+def test_commit_only_database_files(temp_repo):
+    """Test files staged outside the database are neither committed nor unstaged"""
+    (temp_repo / "other.txt").write_text("other")
+    git(temp_repo, "add", "other.txt")
+    db_root = temp_repo / "db"
+    db_root.mkdir()
+    db = TakocLocalDb(db_root=str(db_root), committer=GitCommitter(db_root, max_ops=100, max_delay=60))
+    try:
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="t", description="Table"))
+        namespace.load_table("t").create_record("r1", {"value": 1})
+        assert db.committer.flush(timeout=10)
+
+        files = git(temp_repo, "ls-tree", "-r", "--name-only", "HEAD").splitlines()
+        assert "db/ns/t/r1.yaml" in files
+        assert "other.txt" not in files
+        assert "A  other.txt" in git(temp_repo, "status", "--porcelain").splitlines()
+    finally:
+        db.close()
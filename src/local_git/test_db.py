@@ -82,3 +82,19 @@ def test_data_dir_property(temp_db):
 
     expected_data_dir = temp_db.global_config.config_dir / "test_data"
     assert new_db.global_config.data_dir == expected_data_dir
+
+
+def test_verify(temp_db):
+    """Test verify reports invalid record indexes written outside takoc"""
+    from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+    temp_db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+    namespace = temp_db.load_namespace("ns")
+    namespace.create_table(TableCreateRequest(name="t", description="Table"))
+    namespace.load_table("t").create_record("r1", {"value": 1})
+    assert temp_db.verify() == []
+
+    records_file = namespace.load_table("t").records_dir / "records.yaml"
+    records_file.write_text("records:\n- id: r1\n")
+    problems = temp_db.verify()
+    assert len(problems) == 1
+    assert "records" in problems[0]
@@ -0,0 +1,76 @@
+import gzip
+import json
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from .db import TakocLocalDb
+from ..api.export import export_lines, chunked
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with two tables of records"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        for name, count in (("t1", 30), ("t2", 3)):
+            namespace.create_table(TableCreateRequest(name=name, description="Table"))
+            table = namespace.load_table(name)
+            for i in range(count):
+                table.create_record(f"r{i}", {"value": i, "name": f"récord {i}"})
+        yield db
+
+
+def test_iter_records_in_order(temp_db):
+    """Test records are read ahead but yielded in index order, skipping missing files"""
+    table = temp_db.load_namespace("ns").load_table("t1")
+    (table.records_dir / "r5.yaml").unlink()
+    records = list(table.iter_records(workers=4, read_ahead=8))
+    assert [record_id for record_id, _ in records] == [f"r{i}" for i in range(30) if i != 5]
+    assert records[0] == ("r0", {"value": 0, "name": "récord 0"})
+
+
+def test_iter_records_closed_early(temp_db):
+    """Test an abandoned iteration releases its thread pool"""
+    records = temp_db.load_namespace("ns").load_table("t1").iter_records(workers=2, read_ahead=4)
+    assert next(records)[0] == "r0"
+    records.close()
+
+
+def test_export_namespace(temp_db):
+    """Test a namespace export has one line per record of every table"""
+    lines = [json.loads(line) for line in export_lines(temp_db.load_namespace("ns"))]
+    assert len(lines) == 33
+    assert lines[0] == {"table": "t1", "id": "r0", "data": {"value": 0, "name": "récord 0"}}
+    assert lines[-1]["table"] == "t2"
+
+
+def test_chunked_gzip(temp_db):
+    """Test chunks join to the lines, compressed or not"""
+    lines = list(export_lines(temp_db.load_namespace("ns"), "t1"))
+    plain = list(chunked(lines, chunk_size=500))
+    assert len(plain) > 1
+    assert b"".join(plain) == b"".join(lines)
+    assert gzip.decompress(b"".join(chunked(lines, gzip=True, chunk_size=500))) == b"".join(lines)
+
+
+def test_export_endpoint(temp_db):
+    """Test the export endpoint streams the table"""
+    from fastapi.testclient import TestClient
+    from ..api.v1_app import app, get_database
+
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        response = client.get("/export/ns/t2?gzip=true")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/gzip"
+        assert len(gzip.decompress(response.content).splitlines()) == 3
+        assert client.get("/export/ns/missing").status_code == 404
+        assert client.get("/export/missing").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
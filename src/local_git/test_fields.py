@@ -0,0 +1,79 @@
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from .db import TakocLocalDb
+from ..api.fields import get_path, parse_fields, project, set_path
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+RECORD = {"name": "a", "address": {"city": "Paris", "zip": "75001"}, "tags": [{"k": "x", "v": 1}, {"k": "y"}],
+          "a/b": {"~": 1}}
+
+
+@pytest.fixture
+def client():
+    """Create a table with one record and serve it"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="t", description="Table"))
+        namespace.load_table("t").create_record("r1", RECORD)
+        app.dependency_overrides[get_database] = lambda: db
+        try:
+            yield TestClient(app)
+        finally:
+            app.dependency_overrides.clear()
+
+
+def test_project():
+    """Test dotted paths select members, through lists, without changing the record"""
+    assert project(RECORD, parse_fields(["name", "address.city", "missing", "tags.k"])) == {
+        "name": "a", "address": {"city": "Paris"}, "tags": [{"k": "x"}, {"k": "y"}]}
+    assert project(RECORD, parse_fields(["address.city", "address"])) == {"address": RECORD["address"]}
+    assert project(RECORD, parse_fields(["name.first"])) == {}
+
+
+def test_pointer():
+    """Test JSON pointers with escapes and list indexes"""
+    assert get_path(RECORD, "/a~1b/~0") == 1
+    assert get_path(RECORD, "/tags/1/k") == "y"
+    assert get_path(RECORD, "") is RECORD
+    for pointer in ("/tags/2", "/tags/01", "/name/x", "/missing", "name"):
+        with pytest.raises(ValueError):
+            get_path(RECORD, pointer)
+
+
+def test_set_path():
+    """Test values are set on copies of the containers along the path"""
+    record = set_path(RECORD, "/address/city", "Lyon")
+    assert record["address"] == {"city": "Lyon", "zip": "75001"}
+    assert RECORD["address"]["city"] == "Paris"
+    assert record["tags"] is RECORD["tags"]
+    assert set_path(RECORD, "/tags/-", 3)["tags"][-1] == 3
+    assert set_path(RECORD, "/tags/0/v", 2)["tags"][0] == {"k": "x", "v": 2}
+    with pytest.raises(ValueError):
+        set_path(RECORD, "/missing/city", 1)
+
+
+def test_fields_endpoints(client):
+    """Test projections of single and bulk reads"""
+    assert client.get("/data/ns/t/r1?fields=name,address.zip").json() == {"name": "a", "address": {"zip": "75001"}}
+    assert client.get("/data/ns/t?fields=name").json() == [{"id": "r1", "data": {"name": "a"}}]
+    assert client.get("/data/ns/t").json() == ["r1"]
+    assert client.get("/export/ns/t?fields=tags.v").json() == {"table": "t", "id": "r1", "data": {"tags": [{"v": 1}, {}]}}
+
+
+def test_path_endpoints(client):
+    """Test sub-path reads and writes"""
+    assert client.get("/data/ns/t/r1?path=/address/city").json() == "Paris"
+    assert client.get("/data/ns/t/r1?path=/tags/0").json() == {"k": "x", "v": 1}
+    assert client.get("/data/ns/t/r1?path=/address/country").status_code == 404
+    assert client.get("/data/ns/t/r2?path=/address").status_code == 404
+    assert client.get("/data/ns/t/r1?path=/name&fields=name").status_code == 400
+
+    assert client.put("/data/ns/t/r1?path=/address/city", json="Lyon").status_code == 200
+    assert client.get("/data/ns/t/r1").json()["address"] == {"city": "Lyon", "zip": "75001"}
+    assert client.put("/data/ns/t/r1?path=/missing/city", json="Lyon").status_code == 404
@@ -0,0 +1,75 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from .db import TakocLocalDb
+from .fsck import fsck, rebuild_index
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+@pytest.fixture
+def temp_db():
+    """Create a database with one consistent and one drifted table"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        for name in ("good", "bad"):
+            namespace.create_table(TableCreateRequest(name=name, description="Table"))
+            table = namespace.load_table(name)
+            for i in range(3):
+                table.create_record(f"r{i}", {"value": i})
+
+        bad = namespace.load_table("bad")
+        records_dir = bad.records_dir
+        # A merge brought an orphan file, a duplicate ID with a suffixed file, a deleted file and a broken file
+        (records_dir / "orphan.yaml").write_text("value: 9\n")
+        (records_dir / "r0_1700000000.yaml").write_text("value: 0\n")
+        (records_dir / "r1.yaml").unlink()
+        (records_dir / "r2.json").write_text("{broken")
+        records = bad._get_records().to_data()
+        records["records"].append({"id": "r0", "file": "r0_1700000000"})
+        bad._files.write_file("records", records)
+        yield db
+
+
+def test_fsck_reports_drift(temp_db):
+    """Test orphan, missing, duplicate, ambiguous and unreadable files are reported"""
+    report = fsck(temp_db, workers=0, parse_records=True)
+    assert not report.clean
+    good, bad = sorted(report.tables, key=lambda table: table.table != "good")
+    assert good.clean
+    assert bad.records == 4
+    assert bad.orphan_files == ["orphan"]
+    assert bad.missing_files == ["r1"]
+    assert bad.duplicate_ids == {"r0": ["r0", "r0_1700000000"]}
+    assert bad.ambiguous_files == ["r2"]
+    assert len(bad.unreadable_files) == 1 and bad.unreadable_files[0].startswith("r2.json")
+
+
+def test_fsck_in_worker_processes(temp_db):
+    """Test the process pool gives the same report"""
+    assert fsck(temp_db, workers=2) == fsck(temp_db, workers=0)
+
+
+def test_fsck_repair(temp_db):
+    """Test repair rebuilds the index of the drifted table"""
+    report = fsck(temp_db, workers=0, repair=True)
+    assert [table.table for table in report.tables if table.repaired] == ["bad"]
+
+    table = temp_db.load_namespace("ns").load_table("bad")
+    assert table.list_records() == ["r0", "r2", "orphan"]
+    assert table.get_record("orphan") == {"value": 9}
+    after = fsck(temp_db, workers=0)
+    bad = next(table for table in after.tables if table.table == "bad")
+    assert bad.missing_files == [] and bad.duplicate_ids == {}
+    # The file of the dropped duplicate is left for review
+    assert bad.orphan_files == ["r0_1700000000"]
+
+
+def test_rebuild_index():
+    """Test missing entries are dropped and orphans appended"""
+    index = rebuild_index([("a", "a"), ("b", "b_1"), ("a", "a_2"), ("c", "c")],
+                          {"a": ["a.yaml"], "b_1": ["b_1.yaml"], "a_2": ["a_2.yaml"], "d": ["d.json"]})
+    assert list(index) == [("a", "a"), ("b", "b_1"), ("d", "d")]
@@ -0,0 +1,155 @@
+import subprocess
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from .db import TakocLocalDb
+from .history import HistoryDb
+from ..api.error import ReadOnlyError
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+def git(repo: Path, *args: str) -> str:
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def temp_repo():
+    """Create a git repository with one committed table and uncommitted changes on top"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        repo = Path(tmp_dir)
+        git(repo, "init", "-q")
+        git(repo, "config", "user.name", "takoc")
+        git(repo, "config", "user.email", "takoc@example.com")
+
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="t", description="Table"))
+        table = namespace.load_table("t")
+        table.create_record("r1", {"value": 1})
+        table.create_record("r2", {"value": 2})
+        git(repo, "add", "-A")
+        git(repo, "commit", "-q", "-m", "first")
+
+        table.update_record("r1", {"value": 10})
+        table.delete_record("r2")
+        namespace.create_table(TableCreateRequest(name="t2", description="Table 2"))
+        yield repo, db
+
+
+def test_read_committed_data(temp_repo):
+    """Test reading namespaces, tables and records at HEAD ignores the working tree"""
+    repo, _ = temp_repo
+    history = HistoryDb(db_root=str(repo), rev="HEAD")
+    try:
+        assert [ns.name for ns in history.namespaces.list_namespaces()] == ["takoc", "ns"]
+        namespace = history.load_namespace("ns")
+        assert [t.name for t in namespace.list_tables()] == ["t"]
+        assert namespace.get_table("t2") is None
+
+        table = namespace.load_table("t")
+        assert table.list_records() == ["r1", "r2"]
+        assert table.get_record("r1") == {"value": 1}
+        assert table.get_record("r2") == {"value": 2}
+        with pytest.raises(ValueError):
+            table.get_record("r3")
+    finally:
+        history.close()
+
+    # Working tree is untouched
+    assert TakocLocalDb(db_root=str(repo)).load_namespace("ns").load_table("t").list_records() == ["r1"]
+
+
+def test_read_previous_commit(temp_repo):
+    """Test reading a revision before the latest commit"""
+    repo, db = temp_repo
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "second")
+
+    history = HistoryDb(db_root=str(repo), rev="HEAD~1")
+    try:
+        assert history.load_namespace("ns").load_table("t").get_record("r1") == {"value": 1}
+    finally:
+        history.close()
+
+    history = HistoryDb(db_root=str(repo), rev="HEAD")
+    try:
+        table = history.load_namespace("ns").load_table("t")
+        assert table.list_records() == ["r1"]
+        assert table.get_record("r1") == {"value": 10}
+        assert history.load_namespace("ns").get_table("t2") is not None
+    finally:
+        history.close()
+
+
+def test_metadata_namespace(temp_repo):
+    """Test the 'takoc' metadata namespace at a revision"""
+    repo, _ = temp_repo
+    history = HistoryDb(db_root=str(repo))
+    try:
+        tables = history.load_namespace("takoc").load_table("table")
+        assert tables.list_records() == ["ns.t"]
+        assert tables.get_record("ns.t")["description"] == "Table"
+    finally:
+        history.close()
+
+
+def test_views(temp_repo):
+    """Test the views declared at a revision are listed, and cannot be declared"""
+    repo, db = temp_repo
+    view = {"namespace": "ns", "name": "by_value", "source": "ns.t", "group_by": "value", "fields": None, "filter": []}
+    history = HistoryDb(db_root=str(repo))
+    try:
+        assert history.load_namespace("takoc").load_table("view").list_records() == []
+    finally:
+        history.close()
+
+    db.load_namespace("takoc").load_table("view").create_record("ns.by_value", view)
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "view")
+    history = HistoryDb(db_root=str(repo))
+    try:
+        views = history.load_namespace("takoc").load_table("view")
+        assert views.list_records() == ["ns.by_value"]
+        assert views.get_record("ns.by_value") == view
+        with pytest.raises(ReadOnlyError):
+            views.update_record("ns.by_value", view)
+        with pytest.raises(ReadOnlyError):
+            views.delete_record("ns.by_value")
+    finally:
+        history.close()
+
+
+def test_read_only(temp_repo):
+    """Test all mutations are rejected"""
+    repo, _ = temp_repo
+    history = HistoryDb(db_root=str(repo))
+    try:
+        with pytest.raises(ReadOnlyError):
+            history.namespaces.create_namespace(NamespaceCreateRequest(name="ns2", description=""))
+        with pytest.raises(ReadOnlyError):
+            history.load_namespace("ns").load_table("t").update_record("r1", {})
+        with pytest.raises(ReadOnlyError):
+            history.load_namespace("takoc").load_table("namespace").delete_record("ns")
+    finally:
+        history.close()
+
+
+def test_unknown_revision(temp_repo):
+    """Test opening a revision that does not exist"""
+    repo, _ = temp_repo
+    with pytest.raises(ValueError):
+        HistoryDb(db_root=str(repo), rev="no-such-branch")
+
+
+def test_not_a_repository(monkeypatch):
+    """Test opening a directory outside of any git work tree"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        # Keep git from finding the repository the tests run in
+        monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(Path(tmp_dir).parent.absolute()))
+        with pytest.raises(ValueError, match="not in a git work tree"):
+            HistoryDb(db_root=tmp_dir, rev="HEAD")
+        with pytest.raises(ValueError, match="not in a git work tree"):
+            HistoryDb(db_root=str(Path(tmp_dir) / "missing"), rev="HEAD")
@@ -0,0 +1,170 @@
+import gzip
+import json
+import tempfile
+
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from . import pool
+from .db import TakocLocalDb
+from ..api.bulk_import import iter_lines, iter_rows, parse_row
+from ..api.export import export_lines
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with an empty table"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        db.load_namespace("ns").create_table(TableCreateRequest(name="t", description="Table"))
+        yield db
+
+
+def ndjson(records: list[dict]) -> list[bytes]:
+    """Encode records as JSON Lines, split in small chunks crossing line boundaries"""
+    body = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+    return [body[i:i + 7] for i in range(0, len(body), 7)]
+
+
+def test_iter_lines():
+    """Test lines are rebuilt across chunks"""
+    assert list(iter_lines([b"a\nb", b"c\n", b"d"])) == [b"a\n", b"bc\n", b"d"]
+
+
+def test_parse_row():
+    """Test exported lines, plain JSON lines and CSV rows"""
+    assert parse_row(b'{"table": "t", "id": "r1", "data": {"a": 1}}', "ndjson") == ("r1", {"a": 1})
+    assert parse_row(b'{"key": 5, "a": 1}', "ndjson", "key") == ("5", {"key": 5, "a": 1})
+    with pytest.raises(ValueError):
+        parse_row(b'{"a": 1}', "ndjson")
+    rows = list(iter_rows([b'id,name\nr1,"multi\nline"\n'], "csv"))
+    assert [parse_row(row, "csv") for _, row in rows] == [("r1", {"id": "r1", "name": "multi\nline"})]
+
+
+def test_import_ndjson(temp_db):
+    """Test records are created, and rejected rows are reported with their line"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    body = ndjson([{"id": f"r{i}", "value": i} for i in range(50)]) + [b'{"value": 1}\n', b'not json\n']
+    result = table.import_records(body, workers=0, batch_size=8)
+
+    assert (result.imported, result.skipped, result.failed) == (50, 0, 2)
+    assert result.errors[0].startswith("line 51: ")
+    assert table.list_records() == [f"r{i}" for i in range(50)]
+    assert table.get_record("r7") == {"id": "r7", "value": 7}
+
+
+def test_import_export_round_trip(temp_db):
+    """Test an export is imported as is, in worker processes"""
+    namespace = temp_db.load_namespace("ns")
+    table = namespace.load_table("t")
+    for i in range(5):
+        table.create_record(f"r{i}", {"value": i, "name": f"récord {i}"})
+    namespace.create_table(TableCreateRequest(name="copy", description="Table"))
+    copy = namespace.load_table("copy")
+
+    result = copy.import_records(export_lines(namespace, "t"), workers=2, batch_size=2)
+    assert result.imported == 5
+    assert list(copy.iter_records()) == list(table.iter_records())
+
+
+def test_import_csv(temp_db):
+    """Test CSV rows are imported with one string member per column"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    result = table.import_records([b"key,name\nk1,first\nk2,second\n"], format="csv", id_field="key", workers=0)
+    assert result.imported == 2
+    assert table.get_record("k2") == {"key": "k2", "name": "second"}
+
+
+def test_import_existing(temp_db):
+    """Test existing and repeated records are rejected, or existing ones skipped"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    table.create_record("r0", {"value": "old"})
+    body = ndjson([{"id": "r0", "value": 0}, {"id": "r1", "value": 1}, {"id": "r1", "value": 2}])
+
+    result = table.import_records(body, workers=0)
+    assert (result.imported, result.skipped, result.failed) == (1, 0, 2)
+    assert table.get_record("r0") == {"value": "old"}
+    assert table.get_record("r1") == {"id": "r1", "value": 1}
+
+    result = table.import_records(ndjson([{"id": "r1"}, {"id": "r2"}]), skip_existing=True, workers=0)
+    assert (result.imported, result.skipped, result.failed) == (1, 1, 0)
+
+
+def test_import_file_names(temp_db):
+    """Test records whose IDs map to the same file name get distinct files"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    result = table.import_records(ndjson([{"id": "a/b", "v": 1}, {"id": "a:b", "v": 2}]), workers=0)
+    assert result.imported == 2
+    assert table.get_record("a/b") == {"id": "a/b", "v": 1}
+    assert table.get_record("a:b") == {"id": "a:b", "v": 2}
+
+
+def test_import_validate(temp_db):
+    """Test records not matching the table schema are rejected"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    (table.records_dir / "takoc.yaml").write_text(yaml.dump({"json_schema": {
+        "type": "object", "properties": {"value": {"type": "integer"}}, "required": ["value"]}}))
+    table = temp_db.load_namespace("ns").load_table("t")
+
+    result = table.import_records(ndjson([{"id": "r1", "value": 1}, {"id": "r2", "value": "x"}]), validate=True,
+                                  workers=0)
+    assert (result.imported, result.failed) == (1, 1)
+    assert "does not match the schema" in result.errors[0]
+    assert table.list_records() == ["r1"]
+
+
+def test_import_failure(temp_db):
+    """Test the records written before a failure are indexed, so importing again resumes after them"""
+    table = temp_db.load_namespace("ns").load_table("t")
+
+    def rows():
+        yield from ndjson([{"id": f"r{i}"} for i in range(10)])
+        raise OSError("connection lost")
+
+    with pytest.raises(OSError):
+        table.import_records(rows(), workers=0, batch_size=2, checkpoint=4)
+    assert table.list_records() == [f"r{i}" for i in range(10)]
+
+    result = table.import_records(ndjson([{"id": f"r{i}"} for i in range(12)]), skip_existing=True, workers=0)
+    assert (result.imported, result.skipped) == (2, 10)
+
+
+def test_import_manifest(temp_db):
+    """Test imported files are listed in the manifest"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    table.build_manifest()
+    table.import_records(ndjson([{"id": f"r{i}"} for i in range(3)]), workers=0)
+    assert table.diff_manifest(full=True).clean
+
+
+def test_import_shared_pool(temp_db):
+    """Test imports reuse the workers of the shared pool"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    assert table.import_records(ndjson([{"id": f"r{i}"} for i in range(6)]), batch_size=2).imported == 6
+    executor = pool.shared_pool()
+    assert table.import_records(ndjson([{"id": f"s{i}"} for i in range(6)]), batch_size=2).imported == 6
+    assert pool.shared_pool() is executor
+    assert len(table.list_records()) == 12
+
+
+def test_import_endpoint(temp_db):
+    """Test a streamed gzip body is imported, and unknown tables are not found"""
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        body = gzip.compress(b"".join(ndjson([{"id": f"r{i}", "value": i} for i in range(20)])))
+        response = client.post("/import/ns/t?gzip=true", content=iter([body[:10], body[10:]]))
+        assert response.status_code == 200
+        assert response.json() == {"imported": 20, "skipped": 0, "failed": 0, "errors": []}
+
+        response = client.post("/import/ns/t?format=csv", content=b"id,value\nr0,0\n")
+        assert response.json()["failed"] == 1
+
+        assert client.post("/import/ns/missing", content=b"").status_code == 404
+        assert client.post("/import/ns/t?gzip=true", content=b"not gzip").status_code == 400
+    finally:
+        app.dependency_overrides.clear()
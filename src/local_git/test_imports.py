@@ -0,0 +1,84 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Repository root, the package is imported as 'src'
+ROOT = Path(__file__).parent.parent.parent
+
+# Modules that reading records must never load
+LAZY_MODULES = ["fastapi", "starlette", "uvicorn", "jsonschema", "subprocess", "concurrent.futures", "pickle", "numpy"]
+# Modules loaded on the first aggregation or process pool, never by record reads and writes
+HEAVY_MODULES = ["numpy", "multiprocessing", "concurrent.futures.process", "src.local_git.pool", "src.local_git.columnar"]
+
+
+def import_times(code: str) -> dict[str, int]:
+    """Run code in a fresh interpreter with '-X importtime'
+
+    Returns:
+        Cumulative import time in microseconds, keyed by module name
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, check=True, capture_output=True, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_record_read_imports():
+    """Test reading records does not load the API server, schema validation or git tooling"""
+    times = import_times("from src.local_git.db import TakocLocalDb; from src.local_git.table import Table")
+
+    assert "src.local_git.db" in times
+    for module in LAZY_MODULES:
+        assert module not in times, f"'{module}' is imported when reading records"
+
+
+def loaded_modules(code: str) -> set[str]:
+    """Run code in a fresh interpreter, in a database created in a temporary directory as `db`
+
+    Returns:
+        Names of the modules loaded once the code has run
+    """
+    setup = ("import sys, tempfile\n"
+             "from src.local_git.db import TakocLocalDb\n"
+             "from src.api.v1 import NamespaceCreateRequest, TableCreateRequest\n"
+             "with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:\n"
+             "    db = TakocLocalDb(db_root=tmp_dir)\n"
+             "    db.namespaces.create_namespace(NamespaceCreateRequest(name='ns', description=''))\n"
+             "    db.load_namespace('ns').create_table(TableCreateRequest(name='t', description=''))\n"
+             "    table = db.load_namespace('ns').load_table('t')\n")
+    code = setup + "".join(f"    {line}\n" for line in code.splitlines()) + "    print(' '.join(sys.modules))\n"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True)
+    return set(result.stdout.split())
+
+
+def test_heavy_modules_loaded_on_first_use():
+    """Test record reads and writes leave NumPy and the process pool unloaded, until an aggregation or a query"""
+    modules = loaded_modules("table.create_record('r1', {'value': 1})\n"
+                             "table.update_record('r1', {'value': 2})\n"
+                             "table.get_record('r1')\n"
+                             "table.list_records()")
+    for module in HEAVY_MODULES + LAZY_MODULES:
+        assert module not in modules, f"'{module}' is loaded by record reads and writes"
+
+    pytest.importorskip("numpy")
+    modules = loaded_modules("table.create_record('r1', {'value': 1})\n"
+                             "table.query([], [])\n"
+                             "table.aggregate([], [('count', None)], [])")
+    for module in HEAVY_MODULES:
+        assert module in modules, f"'{module}' is not loaded by a query or an aggregation"
+
+
+def test_cli_imports():
+    """Test the CLI entry point only imports argparse until a command runs"""
+    times = import_times("import main")
+
+    assert "main" in times
+    for module in ["src", "yaml", "pydantic"] + LAZY_MODULES:
+        assert module not in times, f"'{module}' is imported by the CLI entry point"
@@ -0,0 +1,118 @@
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from .db import TakocLocalDb
+from . import manifest as manifest_module
+from .manifest import Manifest, ManifestFile, content_hash, file_hash
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+@pytest.fixture
+def temp_dir():
+    # Create temporary directory for testing
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        yield Path(tmp_dir)
+
+
+def create_table(db: TakocLocalDb):
+    db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+    namespace = db.load_namespace("ns")
+    namespace.create_table(TableCreateRequest(name="t", description="Table"))
+    return namespace.load_table("t")
+
+
+def test_hashes(temp_dir):
+    """Test the hash of a written file matches the hash of its content"""
+    file = temp_dir / "test.txt"
+    file.write_bytes(b"content")
+    assert file_hash(file) == content_hash(b"content")
+    assert len(content_hash(b"content")) == 32
+
+
+def test_manifest_file(temp_dir, monkeypatch):
+    """Test appended entries are read back, and the file is rewritten once it has doubled"""
+    monkeypatch.setattr(manifest_module, "COMPACT_MIN_BYTES", 0)
+    manifest_file = ManifestFile(temp_dir)
+    assert manifest_file.read() is None
+    manifest = manifest_file.write(Manifest({"r1": ("ab", 3, 4)}))
+    size = manifest_file.path.stat().st_size
+    manifest = manifest_file.append(manifest, {"r2": ("cd", 5, 6)})
+    assert manifest_file.path.stat().st_size > size
+    manifest = manifest_file.append(manifest, {"r1": None})
+    assert dict((name, manifest.get(name)) for name in manifest) == {"r2": ("cd", 5, 6)}
+    # Rewritten with only the listed file
+    assert manifest_file.path.read_bytes() == manifest.content()
+    assert list(manifest_file.read()) == ["r2"]
+
+    # Incomplete lines are skipped
+    with open(manifest_file.path, "ab") as f:
+        f.write(b'["r3", "ef"')
+    assert list(ManifestFile(temp_dir).read()) == ["r2"]
+    manifest_file.path.write_bytes(b'{"algorithm": "md5", "size": 0}\n')
+    with pytest.raises(ValueError):
+        ManifestFile(temp_dir).read()
+
+
+def test_manifest_maintained(temp_dir):
+    """Test record writes keep the manifest up to date"""
+    table = create_table(TakocLocalDb(db_root=str(temp_dir), checksums=True))
+    assert table.has_manifest
+    table.create_record("r1", {"value": 1})
+    table.create_record("r2", {"value": 2})
+    hash = table.record_hash("r1")
+    assert hash == file_hash(table.records_dir / "r1.yaml")
+
+    table.update_record("r1", {"value": 3})
+    assert table.record_hash("r1") != hash
+    table.delete_record("r2")
+    assert table.record_hash("r2") is None
+    assert table.verify().clean
+    assert table.diff_manifest().clean
+
+
+def test_diff_detects_changes(temp_dir):
+    """Test external edits, deletes and unlisted records are reported"""
+    table = create_table(TakocLocalDb(db_root=str(temp_dir)))
+    assert not table.has_manifest
+    for i in range(3):
+        table.create_record(f"r{i}", {"value": i})
+    table.build_manifest()
+    assert table.has_manifest
+    assert table.diff_manifest().clean
+
+    # Same size, so only the content hash tells the difference
+    time.sleep(0.01)
+    (table.records_dir / "r0.yaml").write_text("value: 9\n")
+    (table.records_dir / "r1.yaml").unlink()
+    table._manifest.append(table._get_manifest(), {"r2": None})
+
+    diff = table.diff_manifest()
+    assert diff.changed == ["r0"]
+    assert diff.missing == ["r1"]
+    assert diff.unlisted == ["r2"]
+    assert table.verify() == diff
+
+
+def test_db_verify_checksums(temp_dir):
+    """Test verify reports records changed since the manifest"""
+    db = TakocLocalDb(db_root=str(temp_dir), checksums=True)
+    table = create_table(db)
+    table.create_record("r1", {"value": 1})
+    assert db.verify(checksums=True) == []
+    (table.records_dir / "r1.yaml").write_text("value: 2\n")
+    problems = db.verify(checksums=True)
+    assert len(problems) == 1
+    assert "'r1' changed" in problems[0]
+
+
+def test_record_named_manifest(temp_dir):
+    """Test a record may be named like the manifest"""
+    table = create_table(TakocLocalDb(db_root=str(temp_dir), checksums=True))
+    table.create_record("manifest", {"value": 1})
+    table.build_manifest()
+    table.update_record("manifest", {"value": 2})
+    assert table.get_record("manifest") == {"value": 2}
+    assert table.verify().clean
@@ -263,10 +263,11 @@ def test_metadata_namespace_list_tables(temp_metadata):
     metadata_namespace = metadata.get_metadata_namespace()
 
     tables = metadata_namespace.list_tables()
-    assert len(tables) == 2
+    assert len(tables) == 3
     table_names = [table.name for table in tables]
     assert "namespace" in table_names
     assert "table" in table_names
+    assert "view" in table_names
 
 
 def test_metadata_namespace_get_table(temp_metadata):
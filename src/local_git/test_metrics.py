@@ -0,0 +1,104 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from .db import TakocLocalDb
+from ..api.metrics import METRICS, Metrics
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+@pytest.fixture
+def temp_dir():
+    # Create temporary directory for testing
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        yield Path(tmp_dir)
+
+
+@pytest.fixture
+def metrics():
+    METRICS.reset()
+    METRICS.enabled = True
+    yield METRICS
+    METRICS.enabled = False
+    METRICS.reset()
+
+
+def create_table(temp_dir: Path):
+    db = TakocLocalDb(db_root=str(temp_dir))
+    db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+    namespace = db.load_namespace("ns")
+    namespace.create_table(TableCreateRequest(name="t", description="Table"))
+    return namespace.load_table("t")
+
+
+def test_render():
+    """Test counters and histograms are rendered in the Prometheus text format"""
+    metrics = Metrics()
+    metrics.describe("requests_total", "counter", "Requests")
+    metrics.inc("requests_total", route='/a"b')
+    metrics.inc("requests_total", 2, route='/a"b')
+    metrics.observe("latency_seconds", 0.002)
+    text = metrics.render()
+    assert "# HELP requests_total Requests\n# TYPE requests_total counter\n" in text
+    assert 'requests_total{route="/a\\"b"} 3\n' in text
+    assert 'latency_seconds_bucket{le="0.001"} 0\n' in text
+    assert 'latency_seconds_bucket{le="0.0025"} 1\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 1\n' in text
+    assert "latency_seconds_count 1\n" in text
+
+
+def test_table_operations(temp_dir, metrics):
+    """Test table operations record latencies, bytes and cache hits"""
+    table = create_table(temp_dir)
+    table.create_record("r1", {"value": 1})
+    table.list_records()
+    table.list_records()
+    text = metrics.render()
+    assert 'takoc_operation_seconds_count{operation="table.create_record"} 1\n' in text
+    assert 'takoc_operation_seconds_count{operation="table.list_records"} 2\n' in text
+    assert 'takoc_bytes_written_total{format="yaml"}' in text
+    assert 'takoc_bytes_read_total{format="yaml"}' in text
+    assert "takoc_cache_hits_total" in text
+    assert "takoc_lock_wait_seconds_count" in text
+
+
+def test_disabled_records_nothing(temp_dir):
+    """Test nothing is recorded while metrics are disabled"""
+    METRICS.reset()
+    table = create_table(temp_dir)
+    table.create_record("r1", {"value": 1})
+    table.get_record("r1")
+    assert METRICS.render() == "\n"
+
+
+def test_http_requests(temp_dir, metrics):
+    """Test the middleware records requests by route, and adds the trace ID of traced requests"""
+    from fastapi.testclient import TestClient
+    from ..api.tracing import TRACER, TRACE_ID_HEADER
+    from ..api.v1_app import app, get_database
+
+    db = TakocLocalDb(db_root=str(temp_dir))
+    db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+    db.load_namespace("ns").create_table(TableCreateRequest(name="t", description="Table"))
+    app.dependency_overrides[get_database] = lambda: db
+    TRACER.configure(10)
+    try:
+        client = TestClient(app)
+        assert client.get("/data/ns/t/missing").status_code == 404
+        response = client.get("/data/ns/t", headers={"X-Takoc-Trace": "1"})
+        assert TRACER.get(response.headers[TRACE_ID_HEADER]).status == 200
+        text = metrics.render()
+        assert ('takoc_http_request_seconds_count{method="GET",route="/data/{namespace}/{table}/{record_id:path}",'
+                'status="404"} 1\n') in text
+        assert 'route="/data/{namespace}/{table}",status="200"} 1\n' in text
+
+        METRICS.enabled = False
+        TRACER.configure(0)
+        METRICS.reset()
+        assert TRACE_ID_HEADER not in client.get("/data/ns/t", headers={"X-Takoc-Trace": "1"}).headers
+        assert METRICS.render() == "\n"
+    finally:
+        TRACER.configure(0)
+        TRACER.clear()
+        app.dependency_overrides.clear()
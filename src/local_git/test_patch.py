@@ -0,0 +1,85 @@
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from .db import TakocLocalDb
+from ..api.patch import PatchError, json_patch, merge_patch
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+RECORD = {"name": "a", "address": {"city": "Paris", "zip": "75001"}, "tags": ["x", "y"]}
+
+
+@pytest.fixture
+def temp_db():
+    """Create a table with one record"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="t", description="Table"))
+        namespace.load_table("t").create_record("r1", RECORD)
+        yield db
+
+
+def test_merge_patch():
+    """Test members are merged recursively and null members removed, without changing the record"""
+    patched = merge_patch(RECORD, {"address": {"city": "Lyon", "zip": None}, "tags": ["z"], "age": 3})
+    assert patched == {"name": "a", "address": {"city": "Lyon"}, "tags": ["z"], "age": 3}
+    assert RECORD["address"] == {"city": "Paris", "zip": "75001"}
+    assert merge_patch(RECORD, [1]) == [1]
+
+
+def test_json_patch():
+    """Test every operation, and that a failed patch leaves the record unchanged"""
+    patched = json_patch(RECORD, [
+        {"op": "test", "path": "/name", "value": "a"},
+        {"op": "add", "path": "/tags/1", "value": "w"},
+        {"op": "remove", "path": "/address/zip"},
+        {"op": "replace", "path": "/name", "value": "b"},
+        {"op": "copy", "from": "/address", "path": "/home"},
+        {"op": "move", "from": "/tags/0", "path": "/tags/-"},
+    ])
+    assert patched == {"name": "b", "address": {"city": "Paris"}, "tags": ["w", "y", "x"], "home": {"city": "Paris"}}
+    assert RECORD == {"name": "a", "address": {"city": "Paris", "zip": "75001"}, "tags": ["x", "y"]}
+
+    for operations in ([{"op": "test", "path": "/name", "value": "b"}], [{"op": "replace", "path": "/age", "value": 1}],
+                       [{"op": "move", "from": "/address", "path": "/address/city"}], [{"op": "add", "path": "/a"}],
+                       [{"op": "frobnicate", "path": "/name"}], {"op": "remove", "path": "/name"}):
+        with pytest.raises(PatchError):
+            json_patch(RECORD, operations)
+
+
+def test_patch_record(temp_db):
+    """Test the patched record is written and returned"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    assert table.patch_record("r1", {"name": "b"}) == {**RECORD, "name": "b"}
+    table.patch_record("r1", [{"op": "remove", "path": "/tags"}], format="json")
+    assert table.get_record("r1") == {"name": "b", "address": RECORD["address"]}
+    with pytest.raises(ValueError):
+        table.patch_record("r2", {"name": "b"})
+
+
+def test_patch_endpoint(temp_db):
+    """Test the patch format follows the content type"""
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        response = client.patch("/data/ns/t/r1", json={"address": {"zip": None}},
+                                headers={"Content-Type": "application/merge-patch+json"})
+        assert response.status_code == 200
+        assert response.json() == {"name": "a", "address": {"city": "Paris"}, "tags": ["x", "y"]}
+
+        response = client.patch("/data/ns/t/r1", json=[{"op": "add", "path": "/tags/-", "value": "z"}],
+                                headers={"Content-Type": "application/json-patch+json"})
+        assert response.json()["tags"] == ["x", "y", "z"]
+
+        response = client.patch("/data/ns/t/r1", json=[{"op": "test", "path": "/name", "value": "b"}],
+                                headers={"Content-Type": "application/json-patch+json"})
+        assert response.status_code == 422
+        assert client.patch("/data/ns/t/r2", json={"name": "b"}).status_code == 404
+        assert client.put("/data/ns/t/r2", json={"name": "b"}).status_code == 404
+        assert client.delete("/data/ns/t/r2").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
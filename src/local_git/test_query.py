@@ -0,0 +1,161 @@
+import os
+import random
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi.testclient import TestClient
+
+from . import pool, scan
+from .db import TakocLocalDb
+from ..api.aggregate import flatten, kind, matches
+from ..api.query import merge_rows, parse_sort, scan_rows
+from ..api.v1 import ITable, NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+ORDERS = {
+    "o1": {"status": "open", "amount": 10, "customer": {"name": "Zoe"}},
+    "o2": {"status": "open", "amount": 5.5, "customer": {"name": "Adam"}},
+    "o3": {"status": "closed", "amount": 20},
+    "o4": {"status": "open", "amount": 10, "customer": {"name": "Bob"}},
+    "o5": {"status": "open"},
+}
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with a table of orders"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="orders", description="Table"))
+        table = namespace.load_table("orders")
+        for record_id, data in ORDERS.items():
+            table.create_record(record_id, data)
+        yield db
+
+
+def load(db):
+    return db.load_namespace("ns").load_table("orders")
+
+
+def test_parse_sort():
+    """Test fields are split, with their direction"""
+    assert parse_sort("amount") == [("amount", False)]
+    assert parse_sort("-amount, customer.name") == [("amount", True), ("customer.name", False)]
+    for text in ["", "a,", "-"]:
+        with pytest.raises(ValueError):
+            parse_sort(text)
+
+
+def expected_query(records: dict, filters, sort, limit, fields) -> list[tuple[str, object]]:
+    """Evaluate a query with stable sorts, from the last sort field to the first"""
+    matching = [(record_id, data) for record_id, data in records.items()
+                if all(matches(flatten(data).get(field), op, value) for field, op, value in filters)]
+    for field, descending in reversed(sort):
+        # Stable in both directions, equal values keep their index order
+        matching.sort(key=lambda item: (kind(value := flatten(item[1]).get(field)), value), reverse=descending)
+    matching = matching[:limit] if limit is not None else matching
+    if fields is not None:
+        matching = [(record_id, {name: data[name] for name in fields if name in data}) for record_id, data in matching]
+    return matching
+
+
+def test_merge_partitions():
+    """Test any split of the records gives the results of a single scan"""
+    rng = random.Random(3)
+    values = [None, 0, 1, 2.5, -3, "a", "b", True, False]
+    records = {f"r{i}": {field: value for field in ("a", "b", "c") if (value := rng.choice(values)) is not None}
+               for i in range(200)}
+    queries = [
+        ([], [], None, None),
+        ([], [], 7, ["a"]),
+        ([("a", ">", 0)], [("b", False)], None, None),
+        ([("c", "!=", None)], [("a", True), ("b", False)], 15, ["a", "b"]),
+        ([], [("c", True)], 0, None),
+        ([("b", "=", "a")], [("a", False)], 500, None),
+    ]
+    items = list(records.items())
+    for filters, sort, limit, fields in queries:
+        expected = expected_query(records, filters, sort, limit, fields)
+        assert merge_rows([scan_rows(items, filters, sort, limit, fields)], sort, limit) == expected
+        for size in (1, 9, 64):
+            partitions = [scan_rows(items[i:i + size], filters, sort, limit, fields)
+                          for i in range(0, len(items), size)]
+            assert merge_rows(partitions, sort, limit) == expected
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_table_query(temp_db, monkeypatch, workers):
+    """Test partitions scanned in worker processes give the results of the default implementation"""
+    monkeypatch.setattr(scan, "SCAN_CHUNK_SIZE", 2)
+    table = load(temp_db)
+    queries = [
+        ([("status", "=", "open")], [("amount", True), ("customer.name", False)], None, None),
+        ([("status", "=", "open")], [], 3, ["customer"]),
+        ([("amount", ">=", 10)], [("amount", False)], 1, ["amount"]),
+        ([], [], None, None),
+    ]
+    for filters, sort, limit, fields in queries:
+        assert table.query(filters, sort, limit, fields, workers=workers) == \
+               ITable.query(table, filters, sort, limit, fields)
+    assert table.query([("status", "=", "open")], [("amount", True), ("customer.name", False)], workers=workers) == [
+        ("o4", {"status": "open", "amount": 10, "customer": {"name": "Bob"}}),
+        ("o1", {"status": "open", "amount": 10, "customer": {"name": "Zoe"}}),
+        ("o2", {"status": "open", "amount": 5.5, "customer": {"name": "Adam"}}),
+        ("o5", {"status": "open"}),
+    ]
+
+    # Records without file are skipped
+    (table.records_dir / "o4.yaml").unlink()
+    assert [record_id for record_id, _ in table.query([], [("amount", True)], workers=workers)] == \
+           ["o3", "o1", "o2", "o5"]
+
+
+def test_shared_pool(temp_db, monkeypatch):
+    """Test queries reuse the workers of the shared pool"""
+    monkeypatch.setattr(scan, "SCAN_CHUNK_SIZE", 2)
+    table = load(temp_db)
+    assert table.query([], [("amount", True)]) == ITable.query(table, [], [("amount", True)])
+    executor = pool.shared_pool()
+    assert table.query([("status", "=", "closed")], []) == [("o3", ORDERS["o3"])]
+    assert pool.shared_pool() is executor
+
+
+def test_shared_pool_worker_crash(temp_db, monkeypatch):
+    """Test a worker crash breaks a single call, the next query runs on a new pool"""
+    monkeypatch.setattr(scan, "SCAN_CHUNK_SIZE", 2)
+    executor = pool.shared_pool()
+    with pytest.raises(BrokenProcessPool):
+        with pool.process_pool(None) as crashed:
+            crashed.submit(os._exit, 1).result()
+
+    table = load(temp_db)
+    assert table.query([("status", "=", "closed")], []) == [("o3", ORDERS["o3"])]
+    assert pool.shared_pool() is not executor
+
+    # Crashed outside of a call, the broken pool is replaced by the next one
+    executor = pool.shared_pool()
+    with pytest.raises(BrokenProcessPool):
+        executor.submit(os._exit, 1).result()
+    assert table.query([("status", "=", "closed")], []) == [("o3", ORDERS["o3"])]
+    assert pool.shared_pool() is not executor
+
+
+def test_query_endpoint(temp_db):
+    """Test query parameters and invalid queries"""
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        response = client.get("/query/ns/orders?filter=status=open&filter=amount<=10&sort=-amount,customer.name"
+                              "&limit=2&fields=customer")
+        assert response.status_code == 200
+        assert response.json() == [{"id": "o4", "data": {"customer": {"name": "Bob"}}},
+                                   {"id": "o1", "data": {"customer": {"name": "Zoe"}}}]
+        assert [record["id"] for record in client.get("/query/ns/orders").json()] == list(ORDERS)
+        assert client.get("/query/ns/orders?sort=,").status_code == 400
+        assert client.get("/query/ns/orders?filter=amount").status_code == 400
+        assert client.get("/query/ns/orders?limit=-1").status_code == 422
+    finally:
+        app.dependency_overrides.clear()
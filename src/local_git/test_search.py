@@ -0,0 +1,150 @@
+import tempfile
+
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from . import search
+from .db import TakocLocalDb
+from .search import SearchIndex, SearchIndexState, document, tokenize
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+
+def declare_search(table, search_meta: dict) -> None:
+    meta_file = table.records_dir / "takoc.yaml"
+    meta = yaml.safe_load(meta_file.read_text())
+    meta_file.write_text(yaml.dump({**meta, "search": search_meta}))
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with a table indexing the title and notes of its records"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="t", description="Table"))
+        table = namespace.load_table("t")
+        table.create_record("r1", {"title": "Quarterly report", "notes": ["late delivery", "customer called"]})
+        table.create_record("r2", {"title": "Delivery schedule", "owner": "report"})
+        declare_search(table, {"fields": ["title", "notes"]})
+        yield db
+
+
+def load(db):
+    return db.load_namespace("ns").load_table("t")
+
+
+def test_document():
+    """Test the selected strings are tokenized, through lists and nested members"""
+    assert tokenize("Café au-lait, 2 CUPS") == ["café", "au", "lait", "2", "cups"]
+    assert document({"a": "x y", "b": {"c": ["y"]}, "n": 1}, None) == (3, {"x": 1, "y": 2})
+    assert document({"a": "x y", "b": {"c": ["y"]}}, ["b.c"]) == (1, {"y": 1})
+
+
+def test_bm25():
+    """Test rarer terms, frequent terms and shorter records rank higher"""
+    docs = {"a": document("apple banana", None), "b": document("apple apple cherry", None),
+            "c": document("apple " + "filler " * 20, None)}
+    state = SearchIndexState.build(None, docs)
+    assert [record_id for record_id, _ in state.search("apple")] == ["b", "a", "c"]
+    assert [record_id for record_id, _ in state.search("cherry banana")][0] in ("a", "b")
+    assert state.search("apple", limit=1)[0][0] == "b"
+    assert state.search("missing ,") == []
+
+
+def test_updated_overlay(monkeypatch):
+    """Test writes share the built records and rank like an index built from scratch, before and after a merge"""
+    monkeypatch.setattr(SearchIndexState, "MAX_DELTA_DOCS", 4)
+    docs = {f"r{i}": document(f"apple banana {i}", None) for i in range(10)}
+    state = SearchIndexState.build(None, dict(docs))
+    merges = 0
+    for record_id, text in [("r1", "cherry"), ("r11", "apple cherry"), ("r2", None), ("r1", "apple"),
+                            ("r3", "banana banana"), ("r12", "cherry"), ("r12", None)]:
+        previous = state
+        doc = document(text, None) if text is not None else None
+        state = state.updated([(record_id, doc)])
+        if doc is None:
+            docs.pop(record_id, None)
+        else:
+            docs[record_id] = doc
+        assert len(state) == len(docs)
+        for query in ["apple", "banana", "cherry", "5"]:
+            assert state.search(query) == SearchIndexState.build(None, dict(docs)).search(query)
+        # The built records are only copied by the merge of a full overlay
+        if state._docs is not previous._docs:
+            merges += 1
+            assert len(previous._delta_docs) == SearchIndexState.MAX_DELTA_DOCS
+    assert merges == 1
+    assert state.content() == SearchIndexState.build(None, state.merged()._docs).content()
+
+
+def test_search(temp_db):
+    """Test the index is built on the first search and follows the writes"""
+    table = load(temp_db)
+    assert [record_id for record_id, _ in table.search("delivery")] == ["r2", "r1"]
+    assert table.search("report")[0][0] == "r1"
+
+    table.create_record("r3", {"title": "Report on delivery delays"})
+    table.update_record("r1", {"title": "Archived"})
+    table.delete_record("r2")
+    assert [record_id for record_id, _ in table.search("delivery")] == ["r3"]
+    assert [record_id for record_id, _ in table.search("archived")] == ["r1"]
+
+    # The appended file gives the same index once parsed again
+    state = SearchIndexState.parse((table.records_dir / SearchIndex.FILE_NAME).read_bytes())
+    assert state.search("delivery report") == table.search("delivery report")
+
+
+def test_search_compaction(temp_db, monkeypatch):
+    """Test the index file is rewritten with only the indexed records"""
+    monkeypatch.setattr(search, "COMPACT_MIN_BYTES", 0)
+    table = load(temp_db)
+    table.search("report")
+    for i in range(10):
+        table.update_record("r2", {"title": f"version {i}"})
+    index_file = table.records_dir / SearchIndex.FILE_NAME
+    assert len(index_file.read_bytes().splitlines()) < 1 + 2 + 10
+    assert table.search("version 9")[0][0] == "r2"
+    assert SearchIndexState.parse(index_file.read_bytes()).search("version 9") == table.search("version 9")
+
+
+def test_search_declaration(temp_db):
+    """Test tables without declaration cannot be searched, and a new declaration rebuilds the index"""
+    table = load(temp_db)
+    table.search("report")
+    declare_search(table, {})
+    table = load(temp_db)
+    assert [record_id for record_id, _ in table.search("report")] == ["r2", "r1"]
+
+    temp_db.load_namespace("ns").create_table(TableCreateRequest(name="plain", description="Table"))
+    with pytest.raises(ValueError):
+        temp_db.load_namespace("ns").load_table("plain").search("report")
+
+
+def test_search_import(temp_db):
+    """Test imported records are found"""
+    table = load(temp_db)
+    table.search("report")
+    table.import_records([b'{"id": "r3", "title": "imported report"}\n'], workers=0)
+    assert "r3" in [record_id for record_id, _ in table.search("imported")]
+
+
+def test_search_endpoint(temp_db):
+    """Test search results with their selected fields, and tables without index"""
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        response = client.get("/search/ns/t?q=delivery&fields=title")
+        assert response.status_code == 200
+        hits = response.json()
+        assert [(hit["id"], hit["data"]) for hit in hits] == [
+            ("r2", {"title": "Delivery schedule"}), ("r1", {"title": "Quarterly report"})]
+        assert hits[0]["score"] > hits[1]["score"] > 0
+        assert len(client.get("/search/ns/t?q=delivery&limit=1").json()) == 1
+
+        temp_db.load_namespace("ns").create_table(TableCreateRequest(name="plain", description="Table"))
+        assert client.get("/search/ns/plain?q=x").status_code == 400
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from .db import TakocLocalDb
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with an empty table"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        db.load_namespace("ns").create_table(TableCreateRequest(name="t", description="Table"))
+        yield db
+
+
+def file_sizes(table) -> int:
+    return sum(os.path.getsize(table.records_dir / (file_name + ".yaml")) for _, file_name in table.record_index)
+
+
+def test_stats(temp_db):
+    """Test the statistics follow creates, updates, deletes and imports"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    assert table.stats().count == 0
+
+    table.create_record("r1", {"value": 1})
+    table.create_record("r2", {"value": 2})
+    table.update_record("r1", {"value": "a longer value"})
+    table.delete_record("r2")
+    table.import_records([b'{"id": "r3"}\n{"id": "r4"}\n'], workers=0)
+
+    stats = table.stats()
+    assert (stats.count, stats.formats) == (3, {"yaml": 3})
+    assert stats.bytes == file_sizes(table)
+    assert stats.modified is not None
+
+    # Kept in the metadata file, read again by a new table instance
+    assert temp_db.load_namespace("ns").load_table("t").stats() == stats
+
+
+def test_stats_existing_table(temp_db):
+    """Test tables without statistics get them computed from the files, then kept up to date"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    table.create_record("r1", {"value": 1})
+    meta_file = table.records_dir / "takoc.yaml"
+    meta_file.write_text(yaml.dump({"records_format": "yaml"}))
+
+    table.create_record("r2", {"value": 2})
+    assert table.stats().count == 2
+    assert table.stats().bytes == file_sizes(table)
+
+    # Reads compute them without saving them, listings leave them out
+    meta_file.write_text(yaml.dump({"records_format": "yaml"}))
+    assert table.stats().count == 2
+    assert "stats" not in yaml.safe_load(meta_file.read_text())
+    assert temp_db.load_namespace("ns").get_table("t").stats is None
+    assert temp_db.load_namespace("ns").list_tables()[0].stats is None
+
+    assert table.build_stats().count == 2
+    assert yaml.safe_load(meta_file.read_text())["stats"]["count"] == 2
+    assert temp_db.load_namespace("ns").get_table("t").stats.count == 2
+
+
+def test_stats_repair(temp_db):
+    """Test replacing the records recomputes the statistics"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    table.create_record("r1", {"value": 1})
+    table.create_record("r2", {"value": 2})
+    table.replace_records(table.record_index.remove("r2"))
+    assert table.stats().count == 1
+
+
+def test_stats_endpoints(temp_db):
+    """Test the statistics are listed with the tables, and returned by the count and HEAD endpoints"""
+    table = temp_db.load_namespace("ns").load_table("t")
+    table.create_record("r1", {"value": 1})
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        assert client.get("/table/ns").json()[0]["stats"]["count"] == 1
+        assert client.get("/table/ns/t").json()["stats"]["bytes"] == file_sizes(table)
+        assert client.get("/table/ns/t/count").json() == {"count": 1}
+
+        response = client.head("/data/ns/t")
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == "1"
+        assert response.headers["X-Total-Bytes"] == str(file_sizes(table))
+        assert "Last-Modified" in response.headers
+        assert response.content == b""
+        assert client.head("/data/ns/missing").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_stats_json_metadata(temp_db):
+    """Test the metadata file is written back in its own format"""
+    table_dir = temp_db.load_namespace("ns").load_table("t").records_dir
+    meta = yaml.safe_load((table_dir / "takoc.yaml").read_text())
+    (table_dir / "takoc.yaml").unlink()
+    (table_dir / "takoc.json").write_text(json.dumps(meta))
+
+    table = temp_db.load_namespace("ns").load_table("t")
+    table.create_record("r1", {})
+    assert not (table_dir / "takoc.yaml").exists()
+    assert json.loads((table_dir / "takoc.json").read_text())["stats"]["count"] == 1
@@ -252,3 +252,157 @@ def test_delete_nonexistent_record(temp_namespace):
         table.delete_record("nonexistent_record")
 
     assert "not found" in str(excinfo.value)
+
+
+def test_concurrent_create_records(temp_namespace):
+    """Test concurrent creates do not lose records in the index"""
+    from concurrent.futures import ThreadPoolExecutor
+    from ..api.v1 import TableCreateRequest
+    namespace, _ = temp_namespace
+
+    namespace.create_table(TableCreateRequest(name="record_test", description="Record test table"))
+
+    def create(i):
+        namespace.load_table("record_test").create_record(f"record{i}", {"id": i})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(create, range(40)))
+
+    record_ids = namespace.load_table("record_test").list_records()
+    assert sorted(record_ids) == sorted(f"record{i}" for i in range(40))
+
+
+def test_record_file_name_differs_from_id(temp_namespace):
+    """Test records are read through the file name stored in the index"""
+    from ..api.v1 import TableCreateRequest
+    namespace, _ = temp_namespace
+
+    namespace.create_table(TableCreateRequest(name="record_test", description="Record test table"))
+    table = namespace.load_table("record_test")
+    table.create_record("a/b", {"value": 1})
+    assert (table.records_dir / "a_b.yaml").exists()
+    assert table.get_record("a/b") == {"value": 1}
+
+    table.update_record("a/b", {"value": 2})
+    assert table.get_record("a/b") == {"value": 2}
+    table.delete_record("a/b")
+    assert not (table.records_dir / "a_b.yaml").exists()
+
+
+def test_record_index():
+    """Test the compact index round-trips the records file and is never mutated"""
+    import pickle
+    from .table import RecordIndex
+    data = {"records": [{"id": "r1", "file": "r1"}, {"id": "a/b", "file": "a_b"}]}
+    index = RecordIndex.parse(data)
+    assert index.to_data() == data
+    assert index.ids == ["r1", "a/b"]
+    assert index.file_of("a/b") == "a_b"
+    assert index.file_of("r1") == "r1"
+    assert index.file_of("missing") is None
+
+    added = index.add("r2", "r2")
+    removed = added.remove("a/b")
+    assert len(index) == 2
+    assert "r2" in added and "r2" not in index
+    assert removed.to_data() == {"records": [{"id": "r1", "file": "r1"}, {"id": "r2", "file": "r2"}]}
+    assert pickle.loads(pickle.dumps(index)).to_data() == data
+    assert RecordIndex.parse(None).to_data() == {"records": []}
+
+
+def test_record_index_scan():
+    """Test range scans, and the sorted IDs carried over by the new indexes"""
+    from .table import RecordIndex
+    ids = ["2026-10/c2", "2026-09/c1", "2026-10/c1", "2026-11/c1", "2026-1"]
+    index = RecordIndex(ids)
+    assert index.scan("2026-10/") == ["2026-10/c1", "2026-10/c2"]
+    assert index.scan(start="2026-09/", end="2026-11/") == ["2026-09/c1", "2026-1", "2026-10/c1", "2026-10/c2"]
+    assert index.scan("2026-10/", start="2026-10/c2") == ["2026-10/c2"]
+    assert index.scan(reverse=True, limit=2) == ["2026-11/c1", "2026-10/c2"]
+    assert index.scan(limit=2) == ["2026-09/c1", "2026-1"]
+    assert index.scan("2027") == []
+    assert index.scan("\U0010ffff") == []
+
+    changed = index.add("2026-10/c0", "c0").extend([("2026-10/c9", "c9"), ("2025", "2025")]).remove("2026-10/c1")
+    assert changed.scan("2026-10/") == ["2026-10/c0", "2026-10/c2", "2026-10/c9"]
+    assert changed.scan() == sorted(changed.ids)
+    assert index.scan() == sorted(ids)
+
+
+def test_scan_records(temp_namespace):
+    """Test range listing through the table and the listing endpoint"""
+    from fastapi.testclient import TestClient
+    from ..api.v1 import TableCreateRequest
+    from ..api.v1_app import app, get_database
+    namespace, db = temp_namespace
+    namespace.create_table(TableCreateRequest(name="t", description="Table"))
+    table = namespace.load_table("t")
+    for record_id in ["b/2", "a/1", "b/1", "c/1"]:
+        table.create_record(record_id, {"id": record_id})
+    assert table.scan_records("b/") == ["b/1", "b/2"]
+    table.delete_record("b/1")
+    table.create_record("b/0", {"id": "b/0"})
+    assert table.scan_records("b/") == ["b/0", "b/2"]
+
+    app.dependency_overrides[get_database] = lambda: db
+    try:
+        client = TestClient(app)
+        assert client.get("/data/test_ns/t?prefix=b/&reverse=true").json() == ["b/2", "b/0"]
+        assert client.get("/data/test_ns/t?start=a&end=c&limit=2").json() == ["a/1", "b/0"]
+        assert client.get("/data/test_ns/t?prefix=c/&fields=id").json() == [{"id": "c/1", "data": {"id": "c/1"}}]
+        assert client.get("/data/test_ns/t?limit=-1").status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_hierarchical_record_endpoints(temp_namespace):
+    """Test records whose ID contains slashes are reachable over HTTP, encoded or not"""
+    from fastapi.testclient import TestClient
+    from ..api.v1 import TableCreateRequest
+    from ..api.v1_app import app, get_database
+    namespace, db = temp_namespace
+    namespace.create_table(TableCreateRequest(name="t", description="Table"))
+
+    app.dependency_overrides[get_database] = lambda: db
+    try:
+        client = TestClient(app)
+        assert client.post("/data/test_ns/t/2026-10%2Fc1", json={"name": "a"}).status_code == 201
+        assert client.post("/data/test_ns/t/2026-10/c2", json={"name": "b"}).status_code == 201
+        assert client.post("/data/test_ns/t/2026-11/c1", json={"name": "c"}).status_code == 201
+        assert client.get("/data/test_ns/t/2026-10%2Fc1").json() == {"name": "a"}
+        assert client.get("/data/test_ns/t/2026-10/c2?path=/name").json() == "b"
+        assert client.get("/data/test_ns/t?prefix=2026-10/").json() == ["2026-10/c1", "2026-10/c2"]
+
+        assert client.put("/data/test_ns/t/2026-10/c1", json={"name": "d"}).status_code == 200
+        assert client.put("/data/test_ns/t/2026-10/c1?path=/name", json="e").status_code == 200
+        assert client.patch("/data/test_ns/t/2026-10/c1", json={"size": 1}).json() == {"name": "e", "size": 1}
+        assert client.delete("/data/test_ns/t/2026-10/c2").status_code == 204
+        assert client.get("/data/test_ns/t/2026-10/c2").status_code == 404
+        assert client.get("/data/test_ns/t?prefix=2026-10/").json() == ["2026-10/c1"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_record_endpoints_reject_empty_ids(temp_namespace):
+    """Test an empty record ID or an ID with an empty segment is rejected, never stored under another name"""
+    from fastapi.testclient import TestClient
+    from ..api.v1 import TableCreateRequest
+    from ..api.v1_app import app, get_database
+    namespace, db = temp_namespace
+    namespace.create_table(TableCreateRequest(name="t", description="Table"))
+
+    app.dependency_overrides[get_database] = lambda: db
+    try:
+        client = TestClient(app)
+        assert client.post("/data/test_ns/t/", json={"name": "a"}).status_code == 422
+        for record_id in ["a//b", "a/", "a%2F%2Fb"]:
+            assert client.post(f"/data/test_ns/t/{record_id}", json={"name": "a"}).status_code == 422
+            assert client.get(f"/data/test_ns/t/{record_id}").status_code == 422
+            assert client.put(f"/data/test_ns/t/{record_id}", json={"name": "b"}).status_code == 422
+            assert client.patch(f"/data/test_ns/t/{record_id}", json={"size": 1}).status_code == 422
+            assert client.delete(f"/data/test_ns/t/{record_id}").status_code == 422
+        assert client.get("/data/test_ns/t").json() == []
+        assert sorted(path.name for path in namespace.load_table("t").records_dir.iterdir()
+                      if path.suffix == ".yaml") == ["records.yaml", "takoc.yaml"]
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,85 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from .db import TakocLocalDb
+from ..api.tracing import TRACER, Tracer
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+@pytest.fixture
+def temp_dir():
+    # Create temporary directory for testing
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        yield Path(tmp_dir)
+
+
+@pytest.fixture
+def tracer():
+    TRACER.configure(10)
+    yield TRACER
+    TRACER.configure(0)
+    TRACER.clear()
+
+
+def find(span, name):
+    """Depth-first search of a span by name"""
+    if span.name == name:
+        return span
+    for child in span.children:
+        if found := find(child, name):
+            return found
+    return None
+
+
+def test_span_tree(temp_dir, tracer):
+    """Test nested operations are recorded as a span tree with I/O counts"""
+    db = TakocLocalDb(db_root=str(temp_dir))
+    db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+    db.load_namespace("ns").create_table(TableCreateRequest(name="t", description="Table"))
+
+    with tracer.trace("GET", "/data/ns/t/r1") as trace:
+        table = db.load_namespace("ns").load_table("t")
+        table.create_record("r1", {"value": 1})
+        table.get_record("r1")
+
+    load_namespace = find(trace.root, "db.load_namespace")
+    assert find(load_namespace, "metadata.get_namespace") is not None
+    assert find(load_namespace, "files.file_info") is not None
+    create = find(trace.root, "table.create_record")
+    assert find(create, "files.write_file").counters["files_written"] == 1
+    totals = trace.root.total_counters()
+    assert totals["bytes_read"] > 0
+    assert totals["bytes_written"] > 0
+    assert tracer.get(trace.id) is trace
+    data = trace.to_data()
+    assert data.root.children[0].name == "db.load_namespace"
+
+
+def test_no_spans_outside_trace(temp_dir, tracer):
+    """Test operations outside a traced request are not recorded"""
+    db = TakocLocalDb(db_root=str(temp_dir))
+    db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+    assert tracer.traces() == []
+
+
+def test_ring_buffer():
+    """Test only the last traces are kept"""
+    tracer = Tracer()
+    tracer.configure(2)
+    for i in range(3):
+        with tracer.trace("GET", f"/{i}"):
+            pass
+    assert [trace.path for trace in tracer.traces()] == ["/1", "/2"]
+
+
+def test_should_trace():
+    """Test the trace header overrides the sample rate"""
+    tracer = Tracer()
+    tracer.configure(10, sample_rate=0.0)
+    assert tracer.should_trace("1")
+    assert not tracer.should_trace(None)
+    tracer.configure(10, sample_rate=1.0)
+    assert tracer.should_trace(None)
+    assert not tracer.should_trace("0")
@@ -0,0 +1,168 @@
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from .db import TakocLocalDb
+from .view import View
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+from ..api.v1_app import app, get_database
+
+TICKETS = {
+    "t1": {"title": "Printer", "owner": "alice", "status": "open"},
+    "t2": {"title": "Laptop", "owner": "bob", "status": "open"},
+    "t3": {"title": "Screen", "owner": "alice", "status": "closed"},
+    "t4": {"title": "Mouse", "status": "open"},
+}
+BY_OWNER = {"namespace": "ns", "name": "by_owner", "source": "ns.tickets", "group_by": "owner", "fields": ["title"],
+            "filter": ["status!=closed"]}
+
+
+@pytest.fixture
+def temp_db():
+    """Create a namespace with a table of tickets"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        db.namespaces.create_namespace(NamespaceCreateRequest(name="ns", description="Namespace"))
+        namespace = db.load_namespace("ns")
+        namespace.create_table(TableCreateRequest(name="tickets", description="Table"))
+        table = namespace.load_table("tickets")
+        for record_id, data in TICKETS.items():
+            table.create_record(record_id, data)
+        yield db
+
+
+def views(db):
+    return db.load_namespace("takoc").load_table("view")
+
+
+def load(db, name: str):
+    return db.load_namespace("ns").load_table(name)
+
+
+def content(table) -> dict:
+    return dict(table.iter_records())
+
+
+def assert_built(db, name: str):
+    """Test the view table holds the records of a build from scratch"""
+    meta = db.metadata.get_view("ns", name)
+    assert content(load(db, name)) == View(meta).build(load(db, "tickets").iter_records())
+
+
+def test_declare_view(temp_db):
+    """Test a declared view is materialised in a new table"""
+    views(temp_db).create_record("ns.by_owner", BY_OWNER)
+    assert views(temp_db).list_records() == ["ns.by_owner"]
+    assert views(temp_db).get_record("ns.by_owner") == BY_OWNER
+    assert content(load(temp_db, "by_owner")) == {
+        "alice": {"owner": "alice", "count": 1, "records": {"t1": {"title": "Printer"}}},
+        "bob": {"owner": "bob", "count": 1, "records": {"t2": {"title": "Laptop"}}},
+    }
+
+    with pytest.raises(ValueError):
+        views(temp_db).create_record("ns.by_owner", BY_OWNER)
+    with pytest.raises(ValueError):
+        views(temp_db).create_record("ns.tickets", {**BY_OWNER, "name": "tickets"})
+    with pytest.raises(ValueError):
+        views(temp_db).create_record("ns.other", BY_OWNER)
+    # Chains of views
+    with pytest.raises(ValueError):
+        views(temp_db).create_record("ns.chained", {**BY_OWNER, "name": "chained", "source": "ns.by_owner"})
+    for invalid in [{"source": "ns.missing"}, {"source": "takoc.table"}, {"filter": ["status"]}]:
+        with pytest.raises(ValueError):
+            views(temp_db).create_record("ns.invalid", {**BY_OWNER, "name": "invalid", **invalid})
+    assert views(temp_db).list_records() == ["ns.by_owner"]
+
+
+def test_view_writes(temp_db):
+    """Test the writes of the source update the groups of the view"""
+    views(temp_db).create_record("ns.by_owner", BY_OWNER)
+    tickets = load(temp_db, "tickets")
+
+    tickets.create_record("t5", {"title": "Keyboard", "owner": "carol", "status": "open"})
+    assert load(temp_db, "by_owner").get_record("carol")["records"] == {"t5": {"title": "Keyboard"}}
+    tickets.update_record("t1", {"title": "Printer", "owner": "bob", "status": "open"})
+    assert "alice" not in load(temp_db, "by_owner").list_records()
+    assert load(temp_db, "by_owner").get_record("bob")["count"] == 2
+    tickets.patch_record("t3", {"status": "open"})
+    tickets.update_record("t2", {"title": "Laptop", "owner": "bob", "status": "closed"})
+    tickets.delete_record("t5")
+    assert_built(temp_db, "by_owner")
+    assert content(load(temp_db, "by_owner")) == {
+        "bob": {"owner": "bob", "count": 1, "records": {"t1": {"title": "Printer"}}},
+        "alice": {"owner": "alice", "count": 1, "records": {"t3": {"title": "Screen"}}},
+    }
+
+    tickets.import_records([b'{"id": "t6", "title": "Cable", "owner": "alice", "status": "open"}\n'], workers=0)
+    assert_built(temp_db, "by_owner")
+    assert load(temp_db, "by_owner").get_record("alice")["count"] == 2
+
+
+def test_record_view(temp_db):
+    """Test views without group keep one record per matching source record"""
+    views(temp_db).create_record("ns.open", {"namespace": "ns", "name": "open", "source": "ns.tickets",
+                                             "filter": ["status=open"], "fields": ["owner"]})
+    assert content(load(temp_db, "open")) == {"t1": {"owner": "alice"}, "t2": {"owner": "bob"}, "t4": {}}
+
+    tickets = load(temp_db, "tickets")
+    tickets.update_record("t1", {"title": "Printer", "owner": "alice", "status": "closed"})
+    tickets.update_record("t3", {"title": "Screen", "owner": "carol", "status": "open"})
+    tickets.delete_record("t4")
+    assert content(load(temp_db, "open")) == {"t2": {"owner": "bob"}, "t3": {"owner": "carol"}}
+
+
+def test_redeclare_view(temp_db):
+    """Test a new declaration builds the view again, and a deleted view keeps its table but is no longer updated"""
+    views(temp_db).create_record("ns.by_owner", BY_OWNER)
+    views(temp_db).update_record("ns.by_owner", {**BY_OWNER, "group_by": "status", "filter": [], "fields": None})
+    assert load(temp_db, "by_owner").list_records() == ["open", "closed"]
+    assert load(temp_db, "by_owner").get_record("closed")["records"] == {"t3": TICKETS["t3"]}
+    assert_built(temp_db, "by_owner")
+
+    views(temp_db).delete_record("ns.by_owner")
+    assert temp_db.metadata.get_views() == []
+    load(temp_db, "tickets").delete_record("t3")
+    assert "closed" in load(temp_db, "by_owner").list_records()
+    with pytest.raises(ValueError):
+        views(temp_db).update_record("ns.by_owner", BY_OWNER)
+
+
+def test_view_errors(temp_db):
+    """Test source writes succeed when the view table is gone, its declaration is deleted with it"""
+    views(temp_db).create_record("ns.by_owner", BY_OWNER)
+    temp_db.load_namespace("ns").delete_table("by_owner")
+    load(temp_db, "tickets").create_record("t5", {"title": "Keyboard", "owner": "carol", "status": "open"})
+    assert "t5" in load(temp_db, "tickets").list_records()
+    assert temp_db.metadata.get_views() == []
+
+
+def test_delete_view_source(temp_db):
+    """Test deleting the source of a view deletes the view, a new table of the same name is not its source"""
+    views(temp_db).create_record("ns.by_owner", BY_OWNER)
+    namespace = temp_db.load_namespace("ns")
+    namespace.delete_table("tickets")
+    assert temp_db.metadata.get_views() == []
+    assert views(temp_db).list_records() == []
+
+    namespace.create_table(TableCreateRequest(name="tickets", description="Table"))
+    load(temp_db, "tickets").create_record("t1", {"title": "Keyboard", "owner": "carol", "status": "open"})
+    assert "carol" not in load(temp_db, "by_owner").list_records()
+
+    # Deleting a namespace deletes the views of its tables
+    views(temp_db).create_record("ns.by_status", {**BY_OWNER, "name": "by_status", "group_by": "status"})
+    temp_db.namespaces.delete_namespace("ns")
+    assert temp_db.metadata.get_views() == []
+
+
+def test_view_endpoint(temp_db):
+    """Test views are declared as records of the metadata namespace"""
+    app.dependency_overrides[get_database] = lambda: temp_db
+    try:
+        client = TestClient(app)
+        assert client.post("/data/takoc/view/ns.by_owner", json=BY_OWNER).status_code == 201
+        assert client.get("/data/takoc/view/ns.by_owner").json() == BY_OWNER
+        assert client.get("/data/ns/by_owner/alice").json()["count"] == 1
+        assert "view" in [table["name"] for table in client.get("/table/takoc").json()]
+    finally:
+        app.dependency_overrides.clear()
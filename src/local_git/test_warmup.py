@@ -0,0 +1,73 @@
+import tempfile
+import time
+
+import pytest
+
+from .cache import FileCache
+from .db import TakocLocalDb
+from ..api.v1 import NamespaceCreateRequest, TableCreateRequest
+
+
+@pytest.fixture
+def temp_db_root():
+    """Create a database with two namespaces and three tables"""
+    with tempfile.TemporaryDirectory(dir='.test') as tmp_dir:
+        db = TakocLocalDb(db_root=tmp_dir)
+        for ns_name, tables in [("ns1", ["t1", "t2"]), ("ns2", ["t3"])]:
+            db.namespaces.create_namespace(NamespaceCreateRequest(name=ns_name, description=""))
+            namespace = db.load_namespace(ns_name)
+            for table_name in tables:
+                namespace.create_table(TableCreateRequest(name=table_name, description=""))
+                table = namespace.load_table(table_name)
+                for i in range(5):
+                    table.create_record(f"r{i}", {"value": i})
+        # Files modified within the racy window are only cached by the database that wrote them
+        time.sleep(FileCache.RACY_NS / 1e9)
+        yield tmp_dir
+
+
+def test_warm_up_loads_all_tables(temp_db_root):
+    """Test warm-up caches metadata and record indexes of every table"""
+    db = TakocLocalDb(db_root=temp_db_root)
+    assert db.ready
+
+    warm_up = db.warm_up(workers=2, background=False)
+
+    assert db.ready
+    assert warm_up.progress == (3, 3)
+    # namespaces, 2 tables files, 3 table metadata and 3 record indexes
+    assert len(db.cache) == 9
+
+
+def test_warm_up_in_background(temp_db_root):
+    """Test readiness flips once the background warm-up is done"""
+    db = TakocLocalDb(db_root=temp_db_root)
+    warm_up = db.warm_up(workers=2)
+    assert warm_up.wait(timeout=10)
+    assert db.ready
+
+
+def test_preload_records(temp_db_root):
+    """Test the most recently modified records are loaded into the record cache"""
+    db = TakocLocalDb(db_root=temp_db_root, record_cache_size=100)
+    db.warm_up(workers=2, preload_records=2, background=False)
+    assert len(db.record_cache) == 6
+
+
+def test_preload_without_record_cache(temp_db_root):
+    """Test preloading is skipped when the record cache is disabled"""
+    db = TakocLocalDb(db_root=temp_db_root)
+    db.warm_up(preload_records=2, background=False)
+    assert db.record_cache is None
+
+
+def test_record_cache_is_bounded(temp_db_root):
+    """Test the record cache evicts the least recently used records"""
+    db = TakocLocalDb(db_root=temp_db_root, record_cache_size=3)
+    table = db.load_namespace("ns1").load_table("t1")
+    for i in range(5):
+        assert table.get_record(f"r{i}") == {"value": i}
+    assert len(db.record_cache) == 3
+
+    table.update_record("r4", {"value": 40})
+    assert table.get_record("r4") == {"value": 40}
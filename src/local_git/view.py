@@ -0,0 +1,243 @@
+"""
+Materialised views: tables derived from a source table, kept up to date by the writes of the source.
+
+A view is declared as a record of the `takoc.view` metadata table, whose ID is the `<namespace>.<table>` of the table
+the view is materialised in:
+
+    POST /data/takoc/view/crm.tickets_by_owner
+    {"namespace": "crm", "name": "tickets_by_owner", "source": "crm.tickets", "group_by": "owner",
+     "fields": ["title", "status"], "filter": ["status!=closed"]}
+
+The source records must match every filter, see `aggregate`, and only the selected `fields` are kept. Without
+`group_by`, the view holds one record per source record, with the same ID. With `group_by`, it holds one record per
+value of the field, with the value as ID, e.g. `alice`:
+
+    {"owner": "alice", "count": 2, "records": {"t1": {"title": ...}, "t2": {"title": ...}}}
+
+Source records without a value for the field are left out. Creates, updates and deletes of a source record write at
+most two view records, under the lock of the source table; imports and repairs of the source build the whole view
+again, writing only the view records that differ.
+"""
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Iterable
+
+from .metadata import ViewMetadata
+from ..api.aggregate import flatten, matches, parse_filter
+from ..api.fields import parse_fields, project
+
+if TYPE_CHECKING:
+    from .db import TakocLocalDb
+    from .table import Table
+
+logger = logging.getLogger(__name__)
+
+# View records written by a build above which the new records are imported by worker processes
+IMPORT_WORKERS_MIN_RECORDS = 1000
+
+# (record ID, old data, new data), data is None for a missing record
+Change = tuple[str, Any, Any]
+
+
+def _get(table: "Table", record_id: str) -> Any:
+    try:
+        return table.get_record(record_id)
+    except ValueError:
+        return None
+
+
+def _put(table: "Table", record_id: str, data: Any) -> None:
+    """Create or update a view record, unless it is unchanged"""
+    current = _get(table, record_id)
+    if current is None:
+        table.create_record(record_id, data)
+    elif current != data:
+        table.update_record(record_id, data)
+
+
+def _delete(table: "Table", record_id: str) -> None:
+    try:
+        table.delete_record(record_id)
+    except ValueError:
+        pass
+
+
+class View:
+    """Derivation of the records of a view from the records of its source"""
+
+    __slots__ = ("meta", "_filters", "_fields")
+
+    def __init__(self, meta: ViewMetadata):
+        """Initialize view
+
+        Raises:
+            ValueError: Invalid filter
+        """
+        self.meta = meta
+        self._filters = [parse_filter(text) for text in meta.filter]
+        self._fields = parse_fields(meta.fields) if meta.fields is not None else None
+
+    def key(self, record_id: str, data: Any) -> tuple[str, Any] | None:
+        """Get the view record ID of a source record and its group value, None if it is left out"""
+        if data is None:
+            return None
+        scalars = flatten(data) if self._filters or self.meta.group_by is not None else {}
+        if not all(matches(scalars.get(field), op, value) for field, op, value in self._filters):
+            return None
+        if self.meta.group_by is None:
+            return record_id, None
+        value = scalars.get(self.meta.group_by)
+        if value is None or value == "":
+            return None
+        return value if isinstance(value, str) else json.dumps(value), value
+
+    def select(self, data: Any) -> Any:
+        """Keep the fields of the view"""
+        return project(data, self._fields) if self._fields is not None else data
+
+    def build(self, records: Iterable[tuple[str, Any]]) -> dict[str, Any]:
+        """Derive the view records from all the source records
+
+        Returns:
+            View record ID -> data
+        """
+        content: dict[str, Any] = {}
+        for record_id, data in records:
+            key = self.key(record_id, data)
+            if key is None:
+                continue
+            if self.meta.group_by is None:
+                content[key[0]] = self.select(data)
+                continue
+            group = content.get(key[0])
+            if group is None:
+                group = content[key[0]] = {self.meta.group_by: key[1], "count": 0, "records": {}}
+            group["records"][record_id] = self.select(data)
+            group["count"] = len(group["records"])
+        return content
+
+    def apply(self, table: "Table", changes: list[Change]) -> None:
+        """Write the view records derived from changed source records
+
+        Args:
+            table: View table
+            changes: Changed source records
+        """
+        for record_id, old, new in changes:
+            old_key, new_key = self.key(record_id, old), self.key(record_id, new)
+            if self.meta.group_by is None:
+                if new_key is not None:
+                    _put(table, record_id, self.select(new))
+                else:
+                    _delete(table, record_id)
+                continue
+            if old_key is not None and (new_key is None or old_key[0] != new_key[0]):
+                group = _get(table, old_key[0])
+                if group is not None and record_id in group.get("records", {}):
+                    members = {member: data for member, data in group["records"].items() if member != record_id}
+                    if members:
+                        table.update_record(old_key[0], {**group, "count": len(members), "records": members})
+                    else:
+                        table.delete_record(old_key[0])
+            if new_key is not None:
+                group = _get(table, new_key[0])
+                members = dict(group["records"]) if group is not None and "records" in group else {}
+                members[record_id] = self.select(new)
+                _put(table, new_key[0], {self.meta.group_by: new_key[1], "count": len(members), "records": members})
+
+    def sync(self, table: "Table", content: dict[str, Any]) -> None:
+        """Write the differences between the view table and the records of a build
+
+        New records are imported in one batch, so a first build costs as much as an import.
+        """
+        current = set(table.list_records())
+        for record_id in current - content.keys():
+            table.delete_record(record_id)
+        created = []
+        for record_id, data in content.items():
+            if record_id in current:
+                _put(table, record_id, data)
+            else:
+                created.append(json.dumps({"id": record_id, "data": data}, ensure_ascii=False).encode("utf-8") + b"\n")
+        if created:
+            result = table.import_records(created, workers=None if len(created) > IMPORT_WORKERS_MIN_RECORDS else 0)
+            for error in result.errors:
+                logger.warning("View '%s' record not imported: %s", self.meta.table, error)
+
+
+def load_view_table(db: "TakocLocalDb", meta: ViewMetadata) -> "Table":
+    """Load the table of a view
+
+    Raises:
+        ValueError: Namespace or table not found
+    """
+    namespace = db.load_namespace(meta.namespace)
+    if namespace is None:
+        raise ValueError(f"Namespace '{meta.namespace}' not found")
+    return namespace.load_table(meta.name)
+
+
+def apply_views(db: "TakocLocalDb", views: list[ViewMetadata], changes: list[Change]) -> None:
+    """Write the changes of a source table to its views
+
+    A view that cannot be written is left out of date with a warning, and built again when it is declared again.
+    """
+    for meta in views:
+        try:
+            View(meta).apply(load_view_table(db, meta), changes)
+        except ValueError as e:
+            logger.warning("View '%s' not updated: %s", meta.table, e)
+
+
+def build_view(db: "TakocLocalDb", meta: ViewMetadata, source: "Table") -> None:
+    """Build a view from all the records of its source, must be called with the source table lock held
+
+    Raises:
+        ValueError: Invalid view or view table not found
+    """
+    view = View(meta)
+    view.sync(load_view_table(db, meta), view.build(source.iter_records()))
+
+
+def build_views(db: "TakocLocalDb", views: list[ViewMetadata], source: "Table") -> None:
+    """Build the views of a source table, e.g. after an import, must be called with the source table lock held"""
+    for meta in views:
+        try:
+            build_view(db, meta, source)
+        except ValueError as e:
+            logger.warning("View '%s' not built: %s", meta.table, e)
+
+
+def declare_view(db: "TakocLocalDb", meta: ViewMetadata, create: bool) -> None:
+    """Declare a new view in a new table, or replace a view, and build it from its source
+
+    Args:
+        db: Database
+        meta: View declaration
+        create: Create the view and its table, else replace an existing view
+
+    Raises:
+        ValueError: Invalid view, source table not found, or view table already exists
+    """
+    from ..api.v1 import TableCreateRequest
+
+    View(meta)
+    source_namespace, _, source_name = meta.source.partition(".")
+    if "takoc" in (meta.namespace, source_namespace):
+        raise ValueError("Views cannot be declared on the 'takoc' metadata namespace")
+    namespace = db.load_namespace(meta.namespace)
+    if namespace is None:
+        raise ValueError(f"Namespace '{meta.namespace}' not found")
+    source_namespace_obj = db.load_namespace(source_namespace)
+    if source_namespace_obj is None:
+        raise ValueError(f"Namespace '{source_namespace}' not found")
+    source = source_namespace_obj.load_table(source_name)
+
+    # Source writes wait for the view to be built
+    with db.lock(str(source.records_dir)):
+        if create and db.metadata.get_table(meta.namespace, meta.name) is not None:
+            raise ValueError(f"Table '{meta.name}' already exists in namespace '{meta.namespace}'")
+        db.metadata.put_view(meta, create)
+        if create:
+            namespace.create_table(TableCreateRequest(name=meta.name, description=f"View of {meta.source}"))
+        build_view(db, meta, source)
@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .db import TakocLocalDb
+from .table import Table
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """
+    Load the metadata and record indexes of every table into the cache.
+
+    Tables are loaded through the same path as requests, so a finished warm-up leaves every request warm.
+    """
+
+    def __init__(self, db: TakocLocalDb, workers: int = 8, preload_records: int = 0):
+        """Initialize warm-up
+
+        Args:
+            db: Database to warm up
+            workers: Number of tables loaded in parallel
+            preload_records: Number of most recently modified records per table to load into the record cache
+        """
+        self._db = db
+        self._workers = workers
+        self._preload_records = preload_records
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._total = 0
+        self._loaded = 0
+
+    @property
+    def done(self) -> bool:
+        """Whether the warm-up has finished"""
+        return self._done.is_set()
+
+    @property
+    def progress(self) -> tuple[int, int]:
+        """Get warm-up progress
+
+        Returns:
+            Tuple of (loaded tables, total tables)
+        """
+        return self._loaded, self._total
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait for the warm-up to finish
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the warm-up has finished
+        """
+        return self._done.wait(timeout)
+
+    def start(self) -> None:
+        """Run the warm-up on a background thread"""
+        threading.Thread(target=self.run, name="takoc-warm-up", daemon=True).start()
+
+    def run(self) -> None:
+        """Run the warm-up and block until it finishes"""
+        try:
+            metadata = self._db.metadata
+            tables = [(ns.name, table.name)
+                      for ns in metadata.get_namespaces()
+                      for table in metadata.get_tables(ns.name)]
+            self._total = len(tables)
+            logger.info("Warm-up started: %d tables", self._total)
+            with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="takoc-warm-up") as executor:
+                for _ in executor.map(lambda table: self._load_table(*table), tables):
+                    pass
+            logger.info("Warm-up finished: %d tables", self._total)
+        except Exception:
+            logger.exception("Warm-up failed, serving with a cold cache")
+        finally:
+            self._done.set()
+
+    def _load_table(self, namespace: str, name: str) -> None:
+        try:
+            namespace_obj = self._db.load_namespace(namespace)
+            table = namespace_obj.load_table(name) if namespace_obj else None
+            if table is not None:
+                table.list_records()
+                if self._preload_records > 0:
+                    self._preload(table)
+        except Exception:
+            logger.exception("Warm-up failed to load table '%s.%s'", namespace, name)
+
+        with self._lock:
+            self._loaded += 1
+            loaded = self._loaded
+        # Log about every tenth of the tables
+        if loaded == self._total or loaded % max(1, self._total // 10) == 0:
+            logger.info("Warm-up progress: %d/%d tables", loaded, self._total)
+
+    def _preload(self, table: Table) -> None:
+        """Load the most recently modified record files of a table into the record cache"""
+        records_dir = table.records_dir
+        with os.scandir(records_dir) as entries:
+            files = [(entry.stat().st_mtime_ns, entry.name) for entry in entries if entry.is_file()]
+        files.sort(reverse=True)
+
+        count = 0
+        for _, file_name in files:
+            record_file, ext = os.path.splitext(file_name)
+            # Skip the index files, the change log and the temporary files of in-flight writes
+            if record_file in table.RESERVED_FILES or ext not in (".yaml", ".yml", ".json") or file_name[0] == ".":
+                continue
+            table.load_record_file(record_file)
+            count += 1
+            if count >= self._preload_records:
+                break
@@ -0,0 +1,174 @@
+"""
+Polling watcher publishing the external edits of the database files, e.g. a git pull, as change events.
+
+Every poll stats the records file and the records directory of every table; the directory is only listed again when
+one of them changed. Adding, deleting or replacing a file changes its directory, so edits made by git or by editors
+writing a new file are seen, while a file rewritten in place is only seen once its directory changes.
+
+Files changed by the store itself are not reported again: a table with store changes since the previous poll is
+resynchronized silently, so an external edit of that table in the same interval is missed.
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+
+from .db import TakocLocalDb
+from .file_io import Files
+
+logger = logging.getLogger(__name__)
+
+RECORD_EXTENSIONS = (".yaml", ".yml", ".json")
+
+
+# State of a table at the last listing: ((directory mtime, records file stat), record ID -> file name,
+# record file name -> (mtime, size))
+TableState = tuple[tuple, dict[str, str], dict[str, tuple[int, int]]]
+
+
+def _version(records_dir: Path) -> tuple:
+    try:
+        dir_stat = os.stat(records_dir)
+    except OSError:
+        return ()
+    info = Files(dir=records_dir, read_only=True).file_info("records")
+    try:
+        stat = os.stat(info[0]) if info is not None else None
+    except OSError:
+        stat = None
+    return dir_stat.st_mtime_ns, (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+
+
+def _list_files(records_dir: Path) -> dict[str, tuple[int, int]]:
+    files = {}
+    try:
+        with os.scandir(records_dir) as entries:
+            for entry in entries:
+                name, ext = os.path.splitext(entry.name)
+                if ext in RECORD_EXTENSIONS and not entry.name.startswith(".") and entry.is_file():
+                    stat = entry.stat()
+                    files[name] = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        pass
+    return files
+
+
+class ChangeWatcher:
+    """Poll the database files on a background thread while the change bus has subscribers"""
+
+    def __init__(self, db: TakocLocalDb, interval: float = 2.0):
+        """Initialize watcher
+
+        Args:
+            db: Database to watch
+            interval: Seconds between two polls
+        """
+        self._db = db
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._namespaces: set[str] | None = None
+        self._tables: dict[str, set[str]] = {}
+        self._table_states: dict[tuple[str, str], TableState] = {}
+        self._store_changes: dict[tuple[str, str | None], int] = {}
+
+    def start(self) -> None:
+        """Start the background thread, no-op if already started"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="takoc-change-watcher", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop the background thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Failed to poll the database files for changes")
+
+    def poll(self) -> int:
+        """Compare the files with the previous poll and publish the external edits
+
+        The first poll after the bus gets subscribers only takes a snapshot.
+
+        Returns:
+            Number of published events
+        """
+        bus = self._db.changes
+        if not bus.has_subscribers:
+            # Nobody listens, the next subscriber starts from a fresh snapshot
+            self._namespaces = None
+            self._tables.clear()
+            self._table_states.clear()
+            return 0
+        first = self._namespaces is None
+        events: list[tuple] = []
+
+        def publish(op: str, namespace: str, table: str | None = None, record_id: str | None = None) -> None:
+            events.append((op, namespace, table, record_id))
+
+        metadata = self._db.metadata
+        namespaces = {namespace.name for namespace in metadata.get_namespaces()}
+        for name in namespaces - (self._namespaces or set()):
+            publish("create", name)
+        for name in (self._namespaces or set()) - namespaces:
+            publish("delete", name)
+            self._tables.pop(name, None)
+        self._namespaces = namespaces
+
+        for namespace in namespaces:
+            tables = {table.name for table in metadata.get_tables(namespace)}
+            previous = self._tables.get(namespace, set())
+            for name in tables - previous:
+                if namespace in self._tables:
+                    publish("create", namespace, name)
+            for name in previous - tables:
+                publish("delete", namespace, name)
+                self._table_states.pop((namespace, name), None)
+            self._tables[namespace] = tables
+            namespace_obj = self._db.load_namespace(namespace)
+            for name in tables:
+                try:
+                    self._poll_table(namespace_obj.load_table(name), publish)
+                except (ValueError, OSError) as e:
+                    logger.warning("Cannot watch table %s/%s: %s", namespace, name, e)
+
+        # Counted after listing the files, so a store change seen by the listing is always counted
+        store_changes = bus.store_changes()
+        changed_by_store = {key for key, count in store_changes.items() if self._store_changes.get(key) != count}
+        self._store_changes = store_changes
+        if first:
+            return 0
+        events = [event for event in events if (event[1], event[2]) not in changed_by_store]
+        for event in events:
+            bus.publish(*event, source="external")
+        return len(events)
+
+    def _poll_table(self, table, publish) -> None:
+        key = (table.namespace, table.name)
+        state = self._table_states.get(key)
+        version = _version(table.records_dir)
+        if state is not None and state[0] == version:
+            return
+        index = {record_id: file_name for record_id, file_name in table.record_index}
+        files = _list_files(table.records_dir)
+        self._table_states[key] = (version, index, files)
+        if state is None:
+            return
+        _, old_index, old_files = state
+        for record_id, file_name in index.items():
+            if record_id not in old_index:
+                publish("create", *key, record_id)
+            elif old_index[record_id] != file_name or old_files.get(file_name) != files.get(file_name):
+                publish("update", *key, record_id)
+        for record_id in old_index.keys() - index.keys():
+            publish("delete", *key, record_id)